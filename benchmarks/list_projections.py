@@ -0,0 +1,121 @@
+"""
+Cost of one page of the book and author lists at paginate_by 100, with the rows loaded as model
+instances (as before) and as slim rows (catalog.projections): time to fetch the page and render
+its row template, queries, bytes of column values fetched, and memory allocated (peak, and kept
+by the rows of the page) according to tracemalloc.
+
+    python benchmarks/list_projections.py --books 2000 --paginate-by 100 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(directory):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.sqlite3'
+    os.environ['DJANGO_DEBUG'] = ''  # Cached template loader, as in production.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    import django
+    django.setup()
+
+
+def seed(books):
+    from django.core.management import call_command
+    from catalog.models import Author, Book
+
+    call_command('migrate', verbosity=0)
+    Author.objects.bulk_create(
+        [Author(first_name=f'First {num}', last_name=f'Last {num}') for num in range(books // 10 or 1)])
+    authors = list(Author.objects.all())
+    # Summaries of the maximum length, as in a real catalog.
+    Book.objects.bulk_create(
+        [Book(title=f'Book {num}', summary='x' * 1000, isbn=f'{num:013d}', author=authors[num % len(authors)])
+         for num in range(books)], batch_size=500)
+
+
+def fetched_bytes(queries):
+    """
+    Runs the queries again and returns the size of the values they return.
+    """
+    from django.db import connection
+
+    size = 0
+    with connection.cursor() as cursor:
+        for query in queries:
+            cursor.execute(query['sql'])
+            size += sum(len(str(value).encode()) for row in cursor.fetchall() for value in row if value is not None)
+    return size
+
+
+def measure(queryset, row_template, context_name, paginate_by, repeat):
+    from django.db import connection, reset_queries
+    from django.template import loader
+    from django.test.utils import CaptureQueriesContext
+
+    template = loader.get_template(row_template)
+
+    def page():
+        rows = list(queryset[paginate_by:2 * paginate_by])
+        html = ''.join(template.render({context_name: row}) for row in rows)
+        return rows, html
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page()
+        times.append(time.perf_counter() - start)
+    with CaptureQueriesContext(connection) as context:
+        page()
+    queries = context.captured_queries
+    reset_queries()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rows, _ = page()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ms': statistics.median(times) * 1000,
+        'queries': len(queries),
+        'fetched KB': fetched_bytes(queries) / 1024,
+        'peak KB': (peak - baseline) / 1024,
+        'kept KB': (current - baseline) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--paginate-by', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(directory)
+        seed(args.books)
+        from catalog.models import Author, Book
+        from catalog.projections import AuthorRow, BookRow, project
+
+        cases = [
+            ('books, models', Book.objects.order_by('pk'), 'catalog/rows/book.html', 'book'),
+            ('books, rows', project(Book.objects.order_by('pk'), BookRow), 'catalog/rows/book.html', 'book'),
+            ('authors, models', Author.objects.all(), 'catalog/rows/author.html', 'author'),
+            ('authors, rows', project(Author.objects.all(), AuthorRow), 'catalog/rows/author.html', 'author'),
+        ]
+        print(f'Page of {args.paginate_by} rows, {args.books} books')
+        results = [(name, measure(queryset, template, context_name, args.paginate_by, args.repeat))
+                   for name, queryset, template, context_name in cases]
+        print(f"{'':16}" + ''.join(f'{column:>12}' for column in results[0][1]))
+        for name, result in results:
+            print(f'{name:16}' + ''.join(f'{value:>12.1f}' for value in result.values()))
+
+
+if __name__ == '__main__':
+    main()
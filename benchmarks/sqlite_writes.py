@@ -0,0 +1,116 @@
+"""
+Multi-process write benchmark of the SQLite tuning profile (DJANGO_SQLITE_TUNING).
+
+Several processes renew loans (read a BookInstance and update its due date in an atomic block,
+like renew_book_librarystaff) against a fresh SQLite file, once with the default settings and
+once with the tuning profile. Prints the committed transactions per second and the number of
+"database is locked" errors of each run.
+
+    python benchmarks/sqlite_writes.py --processes 8 --transactions 200
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+COPIES = 200
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    import django
+    django.setup()
+
+
+def seed():
+    from django.core.management import call_command
+    from catalog.models import Author, Book, BookInstance
+
+    call_command('migrate', verbosity=0)
+    author = Author.objects.create(first_name='Bench', last_name='Mark')
+    Book.objects.bulk_create(
+        [Book(title=f'Book {num}', summary='Summary', isbn=f'{num:013d}', author=author) for num in range(20)])
+    # bulk_create() doesn't set the primary keys on SQLite.
+    books = list(Book.objects.all())
+    BookInstance.objects.bulk_create(
+        [BookInstance(book=books[num % 20], imprint='Imprint', status='o', due_back=datetime.date.today())
+         for num in range(COPIES)])
+
+
+def renew_loans(transactions):
+    from django.db import OperationalError, connection, transaction
+    from catalog.models import BookInstance
+
+    ids = list(BookInstance.objects.values_list('id', flat=True))
+    committed = locked = 0
+    for _ in range(transactions):
+        try:
+            with transaction.atomic():
+                copy = BookInstance.objects.get(pk=random.choice(ids))
+                copy.due_back = copy.due_back + datetime.timedelta(days=1)
+                copy.save(update_fields=['due_back'])
+            committed += 1
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+    connection.close()
+    return committed, locked
+
+
+def run(processes, transactions):
+    """
+    Runs one benchmark in this process, configured by the environment (see main()).
+    """
+    setup_django()
+    from django.db import connections
+    seed()
+    connections.close_all()
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(renew_loans, [transactions] * processes)
+    elapsed = time.perf_counter() - start
+
+    committed = sum(result[0] for result in results)
+    locked = sum(result[1] for result in results)
+    print(json.dumps({'committed': committed, 'locked': locked, 'seconds': elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--transactions', type=int, default=200, help='Transactions per process.')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.processes, args.transactions)
+        return
+
+    print(f'{args.processes} processes x {args.transactions} loan renewals')
+    for profile, tuning in (('default', ''), ('tuned', '1')):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL=f'sqlite:///{directory}/bench.sqlite3', DJANGO_SQLITE_TUNING=tuning,
+                       DJANGO_SLOW_QUERY_THRESHOLD_MS='0', DJANGO_REQUEST_PROFILING='')
+            output = subprocess.run(
+                [sys.executable, __file__, '--run', '--processes', str(args.processes),
+                 '--transactions', str(args.transactions)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:>8}: {result['committed'] / result['seconds']:8.1f} tx/s committed, "
+              f"{result['locked']} 'database is locked' errors, {result['seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Cold start of the processes: wall time and import time (python -X importtime) of
+`manage.py check` with and without the admin (DJANGO_ADMIN), and of the import of the WSGI
+application; then the memory of the gunicorn workers started with and without --preload: RSS,
+PSS (the shared pages counted once across the processes sharing them) and private memory, from
+/proc/<pid>/smaps_rollup (Linux only).
+
+    python benchmarks/startup.py --runs 5 --workers 4
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def import_time(stderr):
+    """
+    Total import time in seconds of an importtime report: the cumulative times of the top-level imports.
+    """
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and not line.startswith('import time: self'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  '):
+                total += int(cumulative)
+    return total / 1e6
+
+
+def cold_start(argv, environ, runs):
+    walls, imports = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', *argv], cwd=BASE_DIR,
+                                env={**os.environ, **environ}, capture_output=True, text=True, check=True)
+        walls.append(time.perf_counter() - start)
+        imports.append(import_time(result.stderr))
+    return statistics.median(walls), statistics.median(imports)
+
+
+def memory(pid):
+    """
+    Returns the RSS, PSS and private memory of the process, in MB.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def gunicorn_workers(workers, preload, timeout=60):
+    """
+    Starts gunicorn, waits until its workers are up and returns the memory of each (see memory()).
+    """
+    argv = [sys.executable, '-m', 'gunicorn', 'locallibrary.wsgi', '--workers', str(workers),
+            '--bind', f'127.0.0.1:{free_port()}'] + (['--preload'] if preload else [])
+    server = subprocess.Popen(argv, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        booted = 0
+        deadline = time.monotonic() + timeout
+        while booted < workers:
+            line = server.stderr.readline()
+            if not line or time.monotonic() > deadline:
+                raise RuntimeError('gunicorn did not start its workers')
+            booted += 'Booting worker' in line
+        # The workers load the application after logging that they boot.
+        time.sleep(2)
+        return [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'cold start (median)':40}{'wall s':>10}{'imports s':>12}")
+    for label, argv, environ in (
+            ('manage.py check', ['manage.py', 'check'], {}),
+            ('manage.py check, DJANGO_ADMIN=', ['manage.py', 'check'], {'DJANGO_ADMIN': ''}),
+            ('import locallibrary.wsgi', ['-c', 'import locallibrary.wsgi'], {})):
+        wall, imports = cold_start(argv, environ, args.runs)
+        print(f'{label:40}{wall:>10.3f}{imports:>12.3f}')
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print('gunicorn is not installed: no worker memory measurements.')
+        return
+    print()
+    print(f"{'gunicorn, ' + str(args.workers) + ' workers, MB per worker':40}{'RSS':>10}{'PSS':>12}{'private':>10}")
+    for preload in (False, True):
+        rss, pss, private = zip(*gunicorn_workers(args.workers, preload))
+        label = 'with --preload' if preload else 'without --preload'
+        print(f'{label:40}{statistics.mean(rss):>10.1f}{statistics.mean(pss):>12.1f}{statistics.mean(private):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
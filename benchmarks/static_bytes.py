@@ -0,0 +1,68 @@
+"""
+Bytes transferred by a cold load of the home page (the HTML and the stylesheets and scripts it
+references), per Accept-Encoding, and the caching headers of the assets. Run after
+`python manage.py collectstatic`; the pages are requested with the Django test client against
+a temporary database.
+
+    python benchmarks/static_bytes.py
+"""
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ASSET_RE = re.compile(r'<(?:link[^>]+href|script[^>]+src)="([^"]+)"')
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def setup_django(directory):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.sqlite3'
+    os.environ['DJANGO_DEBUG'] = ''  # Fingerprinted URLs and caching headers, as in production.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def transferred(client, url, encoding):
+    response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return size, response
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(directory)
+        from django.conf import settings
+        from django.test import Client
+
+        settings.ALLOWED_HOSTS.append('testserver')
+        client = Client()
+        html = client.get('/catalog/').content.decode()
+        assets = ASSET_RE.findall(html)
+        external = [url for url in assets if not url.startswith(settings.STATIC_URL)]
+
+        print(f"{'':48}" + ''.join(f'{encoding:>10}' for encoding in ENCODINGS) + '  cache-control')
+        totals = dict.fromkeys(ENCODINGS, 0)
+        for url in ['/catalog/'] + [url for url in assets if url not in external]:
+            sizes = []
+            for encoding in ENCODINGS:
+                size, response = transferred(client, url, encoding)
+                totals[encoding] += size
+                sizes.append(size)
+            print(f'{url[-48:]:48}' + ''.join(f'{size:>10}' for size in sizes)
+                  + f"  {response.get('Cache-Control', '')}")
+        print(f"{'total':48}" + ''.join(f'{totals[encoding]:>10}' for encoding in ENCODINGS))
+        if external:
+            print('Not counted, loaded from other hosts:', ', '.join(external))
+
+
+if __name__ == '__main__':
+    main()
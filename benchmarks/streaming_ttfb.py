@@ -0,0 +1,100 @@
+"""
+Time to first byte and total time of the "All borrowed" page with a large page size, rendered
+whole (the default) and streamed (DJANGO_STREAMING_LISTS, catalog.streaming), uncompressed and
+gzip-compressed (catalog.middleware.CompressionMiddleware). The requests go through the Django
+test client against a temporary database; the first byte is the first non-empty chunk of the body.
+
+    python benchmarks/streaming_ttfb.py --copies 2000 --paginate-by 1000 --repeat 10
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(directory):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.sqlite3'
+    os.environ['DJANGO_DEBUG'] = ''  # Cached template loader, as in production.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    import django
+    django.setup()
+
+
+def seed(copies):
+    from django.contrib.auth.models import Permission, User
+    from django.core.management import call_command
+    from catalog.models import Author, Book, BookInstance
+
+    call_command('migrate', verbosity=0)
+    librarian = User.objects.create_user(username='librarian', password='bench', is_staff=True)
+    librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+    author = Author.objects.create(first_name='Bench', last_name='Mark')
+    Book.objects.bulk_create(
+        [Book(title=f'Book {num}', summary='Summary', isbn=f'{num:013d}', author=author) for num in range(50)])
+    # bulk_create() doesn't set the primary keys on SQLite.
+    books = list(Book.objects.all())
+    BookInstance.objects.bulk_create(
+        [BookInstance(book=books[num % 50], imprint='Imprint', status='o', borrower=librarian,
+                      due_back=datetime.date.today() + datetime.timedelta(days=num % 30))
+         for num in range(copies)], batch_size=500)
+    return librarian
+
+
+def measure(client, url, encoding):
+    """
+    Returns (time to first byte, total time) of one request, in seconds.
+    """
+    start = time.perf_counter()
+    response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+    assert response.status_code == 200, response.status_code
+    if not response.streaming:
+        ttfb = time.perf_counter() - start
+        return ttfb, ttfb
+    ttfb = None
+    for chunk in response.streaming_content:
+        if chunk and ttfb is None:
+            ttfb = time.perf_counter() - start
+    return ttfb, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--copies', type=int, default=2000)
+    parser.add_argument('--paginate-by', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(directory)
+        from django.conf import settings
+        from django.test import Client, override_settings
+        from catalog.views import LoanedBooksAllListView
+
+        settings.ALLOWED_HOSTS.append('testserver')
+        LoanedBooksAllListView.paginate_by = args.paginate_by
+        client = Client()
+        client.force_login(seed(args.copies))
+        url = '/catalog/borrowed/'
+
+        print(f'{args.paginate_by} rows per page, median of {args.repeat} requests (ms)')
+        print(f"{'':22}{'first byte':>12}{'total':>10}")
+        for streaming in (False, True):
+            for encoding in ('identity', 'gzip'):
+                with override_settings(STREAMING_LISTS=streaming):
+                    measure(client, url, encoding)  # Warm up the template and URL caches.
+                    timings = [measure(client, url, encoding) for _ in range(args.repeat)]
+                label = f"{'streamed' if streaming else 'whole'}, {encoding}"
+                ttfb = statistics.median(timing[0] for timing in timings)
+                total = statistics.median(timing[1] for timing in timings)
+                print(f'{label:22}{ttfb * 1000:>12.1f}{total * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
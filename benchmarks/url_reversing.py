@@ -0,0 +1,103 @@
+"""
+Render time of a 1,000-row list with two links per row (book detail and renewal), reversed with:
+
+- {% url %} and the regex url() patterns catalog/urls.py used to have,
+- {% url %} and the current path() patterns,
+- get_absolute_url() and {% url_for %}, the cached URL builder (catalog.reversing).
+
+No database is needed: the rows are unsaved model instances.
+
+    python benchmarks/url_reversing.py --rows 1000 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+import types
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ROW_TEMPLATES = {
+    'reverse': "<a href=\"{% url 'book-detail' book.pk %}\">{{ book.title }}</a> "
+               "<a href=\"{% url 'renew-book-librarystaff' copy.id %}\">Renew</a>",
+    'url_for': "<a href=\"{{ book.get_absolute_url }}\">{{ book.title }}</a> "
+               "<a href=\"{% url_for 'renew-book-librarystaff' copy.id %}\">Renew</a>",
+}
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    import django
+    django.setup()
+
+
+def regex_urlconf():
+    """
+    The catalog URL patterns as they were written with url() before path converters.
+    """
+    from django.urls import include, re_path
+    from catalog import views
+
+    catalog = types.ModuleType('regex_catalog_urls')
+    catalog.urlpatterns = [
+        re_path(r'^$', views.index, name='index'),
+        re_path(r'^books/$', views.BookListView.as_view(), name='books'),
+        re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
+        re_path(r'^authors/$', views.AuthorListView.as_view(), name='authors'),
+        re_path(r'^author/(?P<pk>\d+)$', views.AuthorDetailView.as_view(), name='author-detail'),
+        re_path(r'^book/(?P<pk>[-\w]+)/renew/$', views.renew_book_librarystaff, name='renew-book-librarystaff'),
+    ]
+    root = types.ModuleType('regex_root_urls')
+    root.urlpatterns = [re_path(r'^catalog/', include(catalog))]
+    return root
+
+
+def render(row_template, rows, repeat, urlconf=None):
+    from django.template import Context, Template
+    from django.urls import set_urlconf
+
+    template = Template('{% load catalog_urls %}{% for book, copy in rows %}<li>' + row_template + '</li>{% endfor %}')
+    set_urlconf(urlconf)
+    try:
+        template.render(Context({'rows': rows}))  # Warm up the caches.
+        start = time.perf_counter()
+        for _ in range(repeat):
+            html = template.render(Context({'rows': rows}))
+        return (time.perf_counter() - start) / repeat, html
+    finally:
+        set_urlconf(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from catalog.models import Book, BookInstance
+
+    rows = []
+    for num in range(1, args.rows + 1):
+        book = Book(pk=num, title=f'Book {num}')
+        rows.append((book, BookInstance(id=uuid.uuid4(), book=book)))
+
+    runs = [
+        ('{% url %}, regex url() patterns', ROW_TEMPLATES['reverse'], regex_urlconf()),
+        ('{% url %}, path() patterns', ROW_TEMPLATES['reverse'], None),
+        ('cached url_for', ROW_TEMPLATES['url_for'], None),
+    ]
+    outputs = set()
+    print(f'{args.rows} rows, 2 links per row, mean of {args.repeat} renders')
+    for label, row_template, urlconf in runs:
+        seconds, html = render(row_template, rows, args.repeat, urlconf)
+        outputs.add(html)
+        print(f'{label:>34}: {seconds * 1000:8.2f} ms')
+    assert len(outputs) == 1, 'The renders differ'
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Author, Genre, Language, Book, BookInstance
+from .models import Author, Genre, Language, Book, BookInstance, Task
 
 # Register your models here.
 #admin.site.register(Book)
@@ -50,6 +50,13 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'run_at', 'attempts', 'finished')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'created', 'finished', 'last_error')
+
+
 
 # SUPERUSER l: professor, p: library2021
 # Library Members: john_reader, johnpassword
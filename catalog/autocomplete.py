@@ -0,0 +1,201 @@
+"""
+In-memory prefix indexes of the book titles and author names for the autocomplete endpoint.
+
+Each index keeps every name once, lowercased, and its keys as (name number, offset) pairs in
+arrays sorted by the text from the offset on: a lookup is one binary search and a scan of the
+matching range. Titles are also keyed from the start of each of their words ("monte" finds
+"The Count of Monte Cristo"). The indexes are built on first use and updated by the Book and
+Author signal receivers in catalog.signals; a version number in the default cache makes the
+other processes rebuild theirs (see catalog.versioned).
+"""
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+
+from django.db import router
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+from catalog.models import Author, Book
+from catalog.versioned import VersionedIndex
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    The labels of some ids, searchable by the prefixes of their keys.
+
+    load() keeps each label and its normalized text once, ordered by id; a key is an offset in
+    the text (its start, with every_word also the start of each word), stored as the number of
+    the text and the offset in two arrays sorted by the key heads. The key strings are only sliced
+    while searching. Later changes go to a short sorted list of (key, id) and a set of the removed
+    numbers, merged into the arrays once MAX_CHANGES of them piled up.
+    """
+    # Characters of the keys the arrays are sorted by; a longer prefix is checked while scanning.
+    SORT_LENGTH = 32
+    MAX_CHANGES = 1000
+
+    def __init__(self, every_word=False):
+        self.every_word = every_word
+        self.load([])
+
+    def offsets(self, text):
+        if not text:
+            return []
+        if not self.every_word:
+            return [0]
+        offsets, position = [], 0
+        for word in text.split(' '):
+            offsets.append(position)
+            position += len(word) + 1
+        return offsets
+
+    def keys(self, label):
+        text = normalize(label)
+        return [text[offset:] for offset in self.offsets(text)]
+
+    def load(self, rows):
+        """
+        Replaces the entries with (id, label) rows.
+        """
+        rows = sorted(rows)
+        self.ids = array('q', (pk for pk, _ in rows))
+        self.labels = [label for _, label in rows]
+        self.texts = [normalize(label) for label in self.labels]
+        numbers, offsets, heads = array('I'), array('I'), []
+        for number, text in enumerate(self.texts):
+            for offset in self.offsets(text):
+                numbers.append(number)
+                offsets.append(offset)
+                heads.append(text[offset:offset + self.SORT_LENGTH])
+        order = sorted(range(len(numbers)), key=heads.__getitem__)
+        del heads
+        self.numbers = array('I', map(numbers.__getitem__, order))
+        self.key_offsets = array('I', map(offsets.__getitem__, order))
+        self.removed = set()
+        self.added = {}
+        self.changes = []
+
+    def items(self):
+        """
+        Yields the (id, label) pairs of the index.
+        """
+        for number, pk in enumerate(self.ids):
+            if number not in self.removed:
+                yield pk, self.labels[number]
+        yield from self.added.items()
+
+    def add(self, pk, label):
+        self.remove(pk)
+        self.added[pk] = label
+        for key in self.keys(label):
+            insort(self.changes, (key, pk))
+        self._compact()
+
+    def remove(self, pk):
+        label = self.added.pop(pk, None)
+        if label is not None:
+            for key in self.keys(label):
+                del self.changes[bisect_left(self.changes, (key, pk))]
+        number = bisect_left(self.ids, pk)
+        if number < len(self.ids) and self.ids[number] == pk:
+            self.removed.add(number)
+        self._compact()
+
+    def search(self, prefix, limit=10):
+        """
+        Returns up to limit (id, label) pairs whose keys start with prefix, in key order (of the
+        first SORT_LENGTH characters).
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        for _, pk, label in merge(self._loaded_matches(prefix), self._changed_matches(prefix)):
+            if len(results) == limit:
+                break
+            if pk not in seen:
+                seen.add(pk)
+                results.append((pk, label))
+        return results
+
+    def _head(self, number, offset, length=None):
+        return self.texts[number][offset:offset + (length or self.SORT_LENGTH)]
+
+    def _loaded_matches(self, prefix):
+        head = prefix[:self.SORT_LENGTH]
+        low, high = 0, len(self.numbers)
+        while low < high:
+            middle = (low + high) // 2
+            if self._head(self.numbers[middle], self.key_offsets[middle], len(head)) < head:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, len(self.numbers)):
+            number, offset = self.numbers[position], self.key_offsets[position]
+            if self._head(number, offset, len(head)) != head:
+                break
+            key = self.texts[number][offset:]
+            if number not in self.removed and key.startswith(prefix):
+                yield key, self.ids[number], self.labels[number]
+
+    def _changed_matches(self, prefix):
+        for position in range(bisect_left(self.changes, (prefix,)), len(self.changes)):
+            key, pk = self.changes[position]
+            if not key.startswith(prefix):
+                break
+            yield key, pk, self.added[pk]
+
+    def _compact(self):
+        if len(self.changes) + len(self.removed) > self.MAX_CHANGES:
+            self.load(list(self.items()))
+
+
+class Autocomplete(VersionedIndex):
+    """
+    The book title and author name indexes of this process.
+    """
+    version_key = 'catalog:autocomplete-version'
+
+    def __init__(self):
+        super().__init__()
+        self.books = PrefixIndex(every_word=True)
+        self.authors = PrefixIndex()
+
+    def build(self, using=None):
+        if using is None:
+            using = router.db_for_read(Book)
+        version = self.read_version()
+        books = Book.objects.using(using).values_list('id', 'title')
+        authors = Author.objects.using(using).annotate(
+            name=Concat('last_name', Value(', '), 'first_name')).values_list('id', 'name')
+        with self._lock:
+            self.books.load(books.iterator())
+            self.authors.load(authors.iterator())
+            self.loaded(version)
+
+    def search(self, kind, prefix, limit=10):
+        """
+        Returns the (id, label) pairs of the books or authors (kind) matching prefix.
+        """
+        self.ensure_current()
+        with self._lock:
+            return getattr(self, kind).search(prefix, limit)
+
+    def update(self, kind, pk, label=None):
+        """
+        Adds, renames or (with label None) removes a book or author.
+        """
+        def update():
+            index = getattr(self, kind)
+            if label is None:
+                index.remove(pk)
+            else:
+                index.add(pk, label)
+        self._apply(update)
+
+
+index = Autocomplete()
@@ -0,0 +1,7 @@
+"""
+Database backends used by the catalog project.
+
+They extend the Django backends of the same name with an optional in-process connection pool
+(DATABASES[alias]['POOL']) and health checks of persistent connections
+(DATABASES[alias]['CONN_HEALTH_CHECKS']).
+"""
@@ -0,0 +1,155 @@
+"""
+In-process connection pool and connection health checks shared by the catalog backends.
+"""
+import os
+import threading
+from collections import deque
+
+from django.db.utils import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of raw DB-API connections of one database alias.
+
+    At most max_size connections are open at once (idle or in use); a thread asking for a
+    connection while all of them are in use waits up to timeout seconds.
+    """
+
+    def __init__(self, max_size, timeout=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, connect, check=None):
+        """
+        Returns an idle connection (passing the optional health check) or a new one from connect().
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(f'No database connection available in the pool after {self.timeout}s.')
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    break
+                if check is None or check(connection):
+                    with self._lock:
+                        self.reused += 1
+                    return connection
+                self._discard(connection)
+
+            connection = connect()
+            with self._lock:
+                self.created += 1
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard=False):
+        """
+        Gives a connection back to the pool, or closes it if it is not reusable.
+        """
+        if discard:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        self._slots.release()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+
+def get_pool(alias, max_size, timeout):
+    """
+    Returns the pool of a database alias in the current process (connections are never shared
+    with forked children).
+    """
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(max_size, timeout)
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    DatabaseWrapper mixin taking connections from a ConnectionPool when DATABASES[alias]['POOL']
+    has a MAX_SIZE, and giving them back instead of closing them. It also implements
+    CONN_HEALTH_CHECKS: a persistent connection is checked once per request before being reused.
+    """
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE') or self.is_pool_disabled():
+            return None
+        return get_pool(self.alias, options['MAX_SIZE'], options.get('TIMEOUT', 30))
+
+    def is_pool_disabled(self):
+        return False
+
+    def is_raw_connection_usable(self, connection):
+        """
+        Health check of an idle connection of the pool.
+        """
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        check = self.is_raw_connection_usable if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+        return pool.acquire(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params), check)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        discard = self.errors_occurred
+        try:
+            # Don't hand an open transaction over to the next user of the connection.
+            connection.rollback()
+        except Exception:
+            discard = True
+        pool.release(connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Called when a request starts and finishes: check the connection again before reusing it.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done and not self.in_atomic_block
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')):
+            self.health_check_done = True
+            if not self.is_usable():
+                # Makes _close() discard the connection instead of giving it back to the pool.
+                self.errors_occurred = True
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,20 @@
+from django.db.backends.postgresql import base
+
+from catalog.backends.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    PostgreSQL backend with the optional connection pool and connection health checks.
+
+    Behind pgbouncer in transaction pooling mode set DISABLE_SERVER_SIDE_CURSORS, so that
+    QuerySet.iterator() does not use server-side cursors, which live across transactions.
+    """
+
+    def is_raw_connection_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
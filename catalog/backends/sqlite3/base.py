@@ -0,0 +1,37 @@
+from django.db.backends.sqlite3 import base
+
+from catalog.backends.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    SQLite backend with the optional connection pool and a production tuning profile:
+
+    - DATABASES[alias]['PRAGMAS'] are applied to every connection (e.g. journal_mode=WAL so
+      readers don't block the writer, synchronous=NORMAL, mmap_size, cache_size, busy_timeout);
+    - with DATABASES[alias]['TRANSACTION_MODE'] = 'IMMEDIATE', atomic blocks start with
+      BEGIN IMMEDIATE: the write lock is taken upfront and waits busy_timeout for other writers,
+      instead of failing with "database is locked" when a read transaction upgrades to a write.
+    """
+
+    def is_pool_disabled(self):
+        # Closing the connection of an in-memory database destroys it, Django keeps it open.
+        return self.is_in_memory_db()
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        pragmas = self.settings_dict.get('PRAGMAS') or {}
+        if pragmas:
+            cursor = self.connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {name} = {value}')
+            finally:
+                cursor.close()
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        if mode:
+            self.cursor().execute(f'BEGIN {mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,300 @@
+"""
+In-memory bitmap index of the books, for the faceted filters of the book list.
+
+Every set of books (the books of a genre, of a language, having an available copy) is stored as
+a Python int used as a bitmap: bit n is set when the book with id n is in the set. Combining
+filters is then a few bitwise AND/OR of machine words, and only the ids of the requested page
+are read from the result before fetching those rows.
+
+The index of a process is built lazily, on first use, and kept current by the signal receivers
+in catalog.signals (see catalog.versioned). They only queue the changes (the bits to set or
+clear, the books whose availability to read again): a bitmap is a copy of up to (highest id / 8)
+bytes, so the queued changes are applied on next use of the index, each bitmap changed being
+copied once whatever the number of books changed. Changes bypassing the signals
+(QuerySet.update(), bulk_create()) need a call to invalidate().
+Enabled by settings.BITMAP_INDEX.
+"""
+import sys
+from array import array
+from collections import defaultdict
+
+from django.db import router
+
+from catalog.models import Book, BookInstance, Genre, Language
+from catalog.versioned import VersionedIndex
+
+VERSION_KEY = 'catalog:bitmap-index-version'
+
+
+def popcount(bitmap):
+    """
+    Returns the number of bits set.
+    """
+    if hasattr(bitmap, 'bit_count'):  # Python 3.10+
+        return bitmap.bit_count()
+    return bin(bitmap).count('1')
+
+
+def from_ids(ids):
+    """
+    Returns the bitmap of some ids (in one allocation, rather than an int per id).
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for book_id in ids:
+        bits[book_id >> 3] |= 1 << (book_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def set_bits(bitmap, changes):
+    """
+    Returns the bitmap with the bits of changes ({id: present}) set or cleared, in one copy.
+    """
+    if not changes:
+        return bitmap
+    bits = bytearray(bitmap.to_bytes((max(bitmap.bit_length(), max(changes) + 1) + 7) // 8, 'little'))
+    for book_id, present in changes.items():
+        if present:
+            bits[book_id >> 3] |= 1 << (book_id & 7)
+        else:
+            bits[book_id >> 3] &= ~(1 << (book_id & 7)) & 0xff
+    return int.from_bytes(bits, 'little')
+
+
+def ids(bitmap, offset=0, limit=None):
+    """
+    Returns the ids of the bits set, in ascending order, skipping the first offset ones.
+    Whole 64-bit words are skipped by their bit counts.
+    """
+    words = array('Q', bitmap.to_bytes((bitmap.bit_length() + 63) // 64 * 8, 'little'))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    result = []
+    for index, word in enumerate(words):
+        if not word:
+            continue
+        bits = popcount(word)
+        if offset >= bits:
+            offset -= bits
+            continue
+        while word:
+            low = word & -word
+            if offset:
+                offset -= 1
+            else:
+                result.append(index * 64 + low.bit_length() - 1)
+                if limit is not None and len(result) >= limit:
+                    return result
+            word ^= low
+    return result
+
+
+class BitmapIndex(VersionedIndex):
+    """
+    Bitmaps of the books per genre, per language and of the books with an available copy.
+    """
+    version_key = VERSION_KEY
+
+    def __init__(self):
+        super().__init__()
+        # The queued changes: (attribute, key or None) of a bitmap -> {book id: present}, and the
+        # books whose availability to read again, by database.
+        self._changes = defaultdict(dict)
+        self._availability = defaultdict(set)
+
+    def build(self, using=None):
+        if using is None:
+            # One database for all the reads, rather than a replica per query.
+            using = router.db_for_read(Book)
+        version = self.read_version()
+        genre_books, language_books = {}, {}
+        through = Book._meta.get_field('genre').remote_field.through
+        for genre_id, book_id in through.objects.using(using).values_list('genre_id', 'book_id').iterator():
+            genre_books.setdefault(genre_id, []).append(book_id)
+        book_ids = []
+        for book_id, language_id in Book.objects.using(using).values_list('id', 'language_id').iterator():
+            book_ids.append(book_id)
+            if language_id is not None:
+                language_books.setdefault(language_id, []).append(book_id)
+        available = BookInstance.objects.using(using).filter(status__exact='a', book__isnull=False).values_list(
+            'book_id', flat=True).distinct()
+
+        with self._lock:
+            self.books = from_ids(book_ids)
+            self.genres = {genre_id: from_ids(books) for genre_id, books in genre_books.items()}
+            self.languages = {language_id: from_ids(books) for language_id, books in language_books.items()}
+            self.available = from_ids(available.iterator())
+            self.genre_names = dict(Genre.objects.using(using).values_list('id', 'name'))
+            self.language_names = dict(Language.objects.using(using).values_list('id', 'name'))
+            self._changes.clear()
+            self._availability.clear()
+            self.loaded(version)
+
+    def ensure_current(self):
+        """
+        Builds the index if it was never built or was changed by another process, else applies the
+        queued changes.
+        """
+        super().ensure_current()
+        self._flush()
+
+    def _flush(self):
+        """
+        Applies the queued changes, reading the availability of the books queued first.
+        """
+        with self._lock:
+            availability, self._availability = self._availability, defaultdict(set)
+        for using, book_ids in availability.items():
+            available = set(BookInstance.objects.using(using).filter(
+                book_id__in=book_ids, status__exact='a').values_list('book_id', flat=True).distinct())
+            with self._lock:
+                self._changes[('available', None)].update((book_id, book_id in available) for book_id in book_ids)
+        with self._lock:
+            if self.built:
+                for (attribute, key), changes in self._changes.items():
+                    if key is None:
+                        setattr(self, attribute, set_bits(getattr(self, attribute), changes))
+                    else:
+                        bitmaps = getattr(self, attribute)
+                        bitmaps[key] = set_bits(bitmaps.get(key, 0), changes)
+            self._changes.clear()
+
+    # Updates from catalog.signals.
+
+    def update_book(self, book_id, language_id, previous_language_id=None):
+        def update():
+            self._changes[('books', None)][book_id] = True
+            if previous_language_id is not None and previous_language_id != language_id:
+                self._changes[('languages', previous_language_id)][book_id] = False
+            if language_id is not None:
+                self._changes[('languages', language_id)][book_id] = True
+        self._apply(update)
+
+    def remove_book(self, book_id):
+        def update():
+            self._changes[('books', None)][book_id] = False
+            self._changes[('available', None)][book_id] = False
+            for attribute in ('genres', 'languages'):
+                for key in getattr(self, attribute):
+                    self._changes[(attribute, key)][book_id] = False
+        self._apply(update)
+
+    def update_genres(self, pairs, present):
+        """
+        Adds or removes the (book_id, genre_id) pairs.
+        """
+        def update():
+            for book_id, genre_id in pairs:
+                self._changes[('genres', genre_id)][book_id] = present
+        self._apply(update)
+
+    def update_availability(self, book_id, using=None):
+        """
+        Reads whether the book has an available copy again, in the database using, on next use.
+        """
+        def update():
+            self._availability[using].add(book_id)
+        if book_id is not None:
+            self._apply(update)
+
+    def update_name(self, model, pk, name):
+        """
+        Renames (or, with name None, removes) a genre or language.
+        """
+        def update():
+            attribute, names = ('genres', self.genre_names) if model is Genre else ('languages', self.language_names)
+            bitmaps = getattr(self, attribute)
+            if name is None:
+                names.pop(pk, None)
+                bitmaps.pop(pk, None)
+                self._changes.pop((attribute, pk), None)
+            else:
+                names[pk] = name
+        self._apply(update)
+
+    # Queries.
+
+    def _facet_bitmap(self, facet, values, using):
+        if facet == 'genre':
+            bitmaps = [self.genres.get(value, 0) for value in values]
+        elif facet == 'language':
+            bitmaps = [self.languages.get(value, 0) for value in values]
+        elif facet == 'available':
+            bitmaps = [self.available]
+        else:
+            # Authors have few books each: their bitmaps are built per request from the author_id index.
+            return from_ids(Book.objects.using(using).filter(**{f'{facet}__in': values}).values_list(
+                'id', flat=True))
+        result = 0
+        for bitmap in bitmaps:
+            result |= bitmap
+        return result
+
+    def match(self, selected, exclude=None, using=None):
+        """
+        Returns the bitmap of the books matching the selected facet values (see catalog.facets),
+        ignoring the facet exclude.
+        """
+        self._flush()
+        result = self.books
+        for facet, values in selected.items():
+            if values and facet != exclude:
+                result &= self._facet_bitmap(facet, values, using)
+        return result
+
+    def counts(self, selected, using=None):
+        """
+        Like catalog.facets.counts() for the genre, language and availability facets.
+        """
+        self._flush()
+        with self._lock:
+            genre_books = self.match(selected, exclude='genre', using=using)
+            language_books = self.match(selected, exclude='language', using=using)
+            result = {
+                'genre': {genre_id: (self.genre_names.get(genre_id, str(genre_id)), popcount(genre_books & bitmap))
+                          for genre_id, bitmap in self.genres.items()},
+                'language': {language_id: (self.language_names.get(language_id, str(language_id)),
+                                           popcount(language_books & bitmap))
+                             for language_id, bitmap in self.languages.items()},
+                'available': {1: ('Available', popcount(self.match(selected, exclude='available', using=using)
+                                                        & self.available))},
+            }
+        for facet in result:
+            result[facet] = {value: row for value, row in result[facet].items() if row[1]}
+        return result
+
+
+class BitmapBookList:
+    """
+    The books of a bitmap, in the order of their ids, as a sequence the paginator can slice:
+    only the rows of the requested page are fetched.
+    """
+    model = Book
+    ordered = True
+
+    def __init__(self, bitmap, queryset):
+        self.bitmap = bitmap
+        self.queryset = queryset
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = popcount(self.bitmap)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        limit = None if index.stop is None else max(index.stop - start, 0)
+        page_ids = ids(self.bitmap, start, limit)
+        books = self.queryset.in_bulk(page_ids)
+        return [books[book_id] for book_id in page_ids if book_id in books]
+
+
+index = BitmapIndex()
@@ -0,0 +1,87 @@
+"""
+Request coalescing ("single flight") of the cache misses.
+
+When a cached value is missing, e.g. a page just invalidated, every request needing it would
+compute it at the same time and hit the database together. get_or_compute() lets one of them
+compute it while the others wait for its result: the threads of a process wait on the one
+computing and get its value or its exception, and the processes take turns with a lock key added
+to the default cache (atomic cache.add()), the others polling the cache until the value appears.
+Should the computing process die or take longer than lock_timeout, the waiting ones compute the
+value themselves.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from catalog import metrics
+
+_missing = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _missing
+        self.error = None
+
+
+_flights_lock = threading.Lock()
+_flights = {}
+
+
+def get_or_compute(key, compute, timeout, lock_timeout=10, poll_interval=0.05, name='default'):
+    """
+    Returns the value of key in the default cache, or caches compute() for timeout seconds and
+    returns it, computing it once for all the concurrent callers. The lookups are counted as hits
+    or misses of the cache name (metrics.CACHE_REQUESTS).
+    """
+    value = cache.get(key, _missing)
+    metrics.CACHE_REQUESTS.inc(cache=name, result='miss' if value is _missing else 'hit')
+    if value is not _missing:
+        return value
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        # The leader always ends (its own waits are bounded by lock_timeout): computing here too
+        # would hit the database again with the very request that failed or is slow.
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = _compute_once(key, compute, timeout, lock_timeout, poll_interval)
+        return flight.value
+    except BaseException as error:
+        flight.error = error
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _compute_once(key, compute, timeout, lock_timeout, poll_interval):
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, lock_timeout):
+        # Another process is computing it.
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            value = cache.get(key, _missing)
+            if value is not _missing:
+                return value
+            if cache.get(lock_key) is None:
+                break
+        return compute()
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
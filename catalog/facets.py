@@ -0,0 +1,146 @@
+"""
+Faceted filters of the book list: genre, language, author and availability.
+
+The selected values come from the query string (?genre=1&genre=2&language=3&available=1).
+Values of one facet are ORed, facets are ANDed. The count of each facet value is the number of
+books it would match combined with the selection of the other facets, and the counts come from
+one query (a UNION ALL of one grouped, filtered count per facet). Only the authors of the most
+books (settings.FACET_AUTHOR_LIMIT) and the selected ones are listed, from a second query.
+"""
+from django.conf import settings
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Concat
+from django.utils.http import urlencode
+
+from catalog.models import Book, BookInstance
+
+FACETS = ('genre', 'language', 'author', 'available')
+TITLES = {'genre': 'Genre', 'language': 'Language', 'author': 'Author', 'available': 'Availability'}
+
+
+def parse(params):
+    """
+    Returns the selected values of every facet (facet -> set of ids) from a QueryDict.
+    """
+    selected = {}
+    for facet in FACETS:
+        values = set()
+        for value in params.getlist(facet):
+            try:
+                values.add(int(value))
+            except ValueError:
+                pass
+        if facet == 'available':
+            values &= {1}
+        selected[facet] = values
+    return selected
+
+
+def _available_copy():
+    return Exists(BookInstance.objects.filter(book=OuterRef('pk'), status__exact='a'))
+
+
+def _condition(facet, values):
+    if facet == 'genre':
+        through = Book._meta.get_field('genre').remote_field.through
+        return Q(pk__in=through.objects.filter(genre_id__in=values).values('book_id'))
+    if facet == 'available':
+        return Q(pk__in=BookInstance.objects.filter(status__exact='a').values('book_id'))
+    return Q(**{f'{facet}__in': values})
+
+
+def _conditions(selected, exclude=None):
+    condition = Q()
+    for facet, values in selected.items():
+        if values and facet != exclude:
+            condition &= _condition(facet, values)
+    return condition
+
+
+def filter_books(queryset, selected):
+    """
+    Restricts a Book queryset to the selected facet values.
+    """
+    return queryset.filter(_conditions(selected))
+
+
+def counts(selected, using=None, only=FACETS):
+    """
+    Returns facet -> {value: (label, count)} for the values matching at least one book,
+    for the facets in only. Read from the database using, by default the one the router chooses.
+    """
+    value_fields = {
+        'genre': (F('genre'), F('genre__name')),
+        'language': (F('language'), F('language__name')),
+        'author': (F('author'), Concat('author__last_name', Value(', '), 'author__first_name')),
+        'available': (Case(When(_available_copy(), then=Value(1)), default=Value(0)), Value('Available')),
+    }
+    branches = {}
+    for facet in only:
+        value, label = value_fields[facet]
+        books = Book.objects.using(using).order_by().filter(_conditions(selected, exclude=facet))
+        branches[facet] = (
+            books.annotate(facet=Value(facet), value=value, label=label).filter(value__isnull=False)
+            .values('facet', 'value', 'label').annotate(count=Count('pk', distinct=True))
+        )
+
+    rows = []
+    authors = branches.pop('author', None)
+    if branches:
+        branches = list(branches.values())
+        rows.extend(branches[0].union(*branches[1:], all=True) if len(branches) > 1 else branches[0])
+    if authors is not None:
+        # The selected authors first, then the others by number of books; a query of its own, the
+        # branches of a UNION can't be limited.
+        limit = settings.FACET_AUTHOR_LIMIT
+        chosen = selected.get('author', set())
+        top = list(authors.order_by(
+            Case(When(value__in=chosen, then=Value(0)), default=Value(1)), '-count', 'label', 'value',
+        )[:len(chosen) + limit])
+        rows.extend(row for row in top if row['value'] in chosen)
+        rows.extend([row for row in top if row['value'] not in chosen][:limit])
+
+    result = {facet: {} for facet in only}
+    for row in rows:
+        if row['facet'] != 'available' or row['value'] == 1:
+            result[row['facet']][row['value']] = (row['label'], row['count'])
+    return result
+
+
+def options(selected, facet_counts):
+    """
+    Returns the facets for the template: [(title, [option, ...]), ...] where every option is
+    a dictionary with the label, count, selected flag and the query string toggling it. The
+    authors are ordered by count, the other values by label.
+    """
+    facets = []
+    for facet in FACETS:
+        choices = dict(facet_counts[facet])
+        for value in selected[facet] - choices.keys():
+            choices[value] = ('Available' if facet == 'available' else str(value), 0)
+        facet_options = [
+            {
+                'label': label,
+                'count': count,
+                'selected': value in selected[facet],
+                'query': query_string(selected, toggle=(facet, value)),
+            }
+            for value, (label, count) in sorted(
+                choices.items(), key=lambda item: (-item[1][1] if facet == 'author' else 0, item[1][0] or '', item[0]))
+        ]
+        facets.append((TITLES[facet], facet_options))
+    return facets
+
+
+def query_string(selected, toggle=None):
+    """
+    Returns the query string of the selection, with the value toggle = (facet, value)
+    added or removed.
+    """
+    params = []
+    for facet in FACETS:
+        values = set(selected[facet])
+        if toggle and toggle[0] == facet:
+            values ^= {toggle[1]}
+        params.extend((facet, value) for value in sorted(values))
+    return urlencode(params)
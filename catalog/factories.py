@@ -0,0 +1,218 @@
+"""
+Synthetic libraries for the performance work, e.g. `manage.py seed_library --books 1000000`.
+
+The rows come from generators seeded with a number, so the same seed (and day) gives the same
+library; they are written with bulk_create() a batch at a time, the genre links and borrowers
+included. Only the ids of the authors and users are kept (8 bytes each, in arrays), the books and
+their copies being generated and written batch by batch: the memory doesn't grow with the
+number of books.
+
+bulk_create() sends no signals: seed_library() adds the copies of each batch to the LoanSummary
+table itself (new rows for the new books, deltas for the borrowers, due dates and genres), then
+drops the in-memory indexes (catalog.bitmaps, catalog.autocomplete) and the cached home page
+counts. It reads the ids of the new rows back as the ones above the previous highest id, so
+nothing else should insert rows meanwhile.
+"""
+import datetime
+import random
+import uuid
+from array import array
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+
+from catalog import autocomplete, bitmaps, loan_summary, pages
+from catalog.models import Author, Book, BookInstance, Genre, Language, LoanSummary
+
+GENRES = ['Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'History', 'Biography', 'Poetry', 'Reference']
+LANGUAGES = ['English', 'French', 'German', 'Spanish', 'Russian', 'Japanese']
+FIRST_NAMES = ['Anna', 'Boris', 'Clara', 'David', 'Elena', 'Frank', 'Greta', 'Hugo', 'Irina', 'Jules', 'Kate', 'Leo',
+               'Maria', 'Nikolai', 'Olga', 'Pierre', 'Rosa', 'Sergei', 'Tanya', 'Victor']
+LAST_NAMES = ['Adams', 'Bauer', 'Chekhov', 'Dumas', 'Eliot', 'Fischer', 'Gogol', 'Hugo', 'Ibsen', 'Joyce', 'Kafka',
+              'Lermontov', 'Mann', 'Nabokov', 'Orwell', 'Pushkin', 'Rilke', 'Scott', 'Tolstoy', 'Verne', 'Woolf']
+TITLE_WORDS = ['Shadow', 'River', 'Winter', 'Garden', 'Stone', 'Night', 'Silver', 'Empire', 'Letters', 'Storm',
+               'Journey', 'House', 'Secret', 'Fire', 'City', 'Sea', 'Crown', 'Mirror', 'Forest', 'Song']
+PUBLISHERS = ['Penguin', 'Vintage', 'Gallimard', 'Suhrkamp', 'Eksmo', 'Shinchosha', 'Anagrama', 'Faber']
+
+# How the copies are spread over the statuses: mostly available or on loan.
+STATUS_WEIGHTS = {'a': 50, 'o': 30, 'm': 10, 'r': 10}
+
+# The time of the first ordered copy id (2020-01-01), one millisecond further per copy.
+ORDERED_ID_EPOCH_MILLIS = 1577836800000
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class LibraryFactory:
+    """
+    Generates the unsaved rows of a library; each kind of row has its own random sequence, so
+    generating more users doesn't change the books.
+    """
+
+    def __init__(self, seed=0, today=None):
+        self.seed = seed
+        self.today = today or datetime.date.today()
+        self.password = make_password('password', salt=f'seed{seed}')
+        # The copies are generated a batch of books at a time, on one sequence.
+        self.copies_random = self.random('copies')
+        self.copies_made = 0
+
+    def random(self, kind):
+        return random.Random(f'{self.seed}:{kind}')
+
+    def authors(self, count):
+        rng = self.random('authors')
+        for _ in range(count):
+            born = datetime.date(1800, 1, 1) + datetime.timedelta(days=rng.randrange(200 * 365))
+            died = born + datetime.timedelta(days=rng.randrange(30 * 365, 90 * 365)) if rng.random() < 0.6 else None
+            yield Author(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                         date_of_birth=born, date_of_death=died if died and died < self.today else None)
+
+    def users(self, count):
+        for number in range(count):
+            yield User(username=f'seed{self.seed}-reader{number}', email=f'reader{number}@example.com',
+                       password=self.password)
+
+    def books(self, count, author_ids, language_ids, genre_ids):
+        """
+        Yields (book, ids of its genres) pairs.
+        """
+        rng = self.random('books')
+        for number in range(count):
+            title = ' '.join(rng.sample(TITLE_WORDS, rng.randint(1, 3)))
+            isbn = f'978{number:010d}'
+            book = Book(title=f'The {title}', summary=f'A synthetic book about {title.lower()}.', isbn=isbn,
+                        author_id=author_ids[rng.randrange(len(author_ids))] if author_ids else None,
+                        language_id=rng.choice(language_ids))
+            yield book, rng.sample(genre_ids, rng.randint(1, 3))
+
+    def copies(self, book_ids, count, user_ids):
+        """
+        Yields count copies of each book; the next call continues with the next copies.
+        """
+        rng = self.copies_random
+        statuses, weights = zip(*STATUS_WEIGHTS.items())
+        for book_id in book_ids:
+            for _ in range(count):
+                status = rng.choices(statuses, weights)[0]
+                borrower_id = due_back = None
+                if status == 'o':
+                    due_back = self.today + datetime.timedelta(days=rng.randint(-14, 28))
+                    if user_ids:
+                        borrower_id = user_ids[rng.randrange(len(user_ids))]
+                yield BookInstance(id=self.copy_id(rng, self.copies_made), book_id=book_id,
+                                   imprint=f'{rng.choice(PUBLISHERS)}, {rng.randint(1950, 2020)}',
+                                   status=status, due_back=due_back, borrower_id=borrower_id)
+                self.copies_made += 1
+
+    def copy_id(self, rng, number):
+        """
+        A random UUID from the sequence of rng, or an ordered one with settings.ORDERED_UUIDS.
+        """
+        if settings.ORDERED_UUIDS:
+            millis = ORDERED_ID_EPOCH_MILLIS + number
+            return uuid.UUID(int=millis << 80 | 0x7 << 76 | 0b10 << 62 | rng.getrandbits(62))
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _insert(model, objects, using):
+    """
+    bulk_create()s objects and returns their ids, read back where the backend doesn't set them
+    (SQLite with Django 3.2).
+    """
+    manager = model._default_manager.using(using)
+    last = manager.aggregate(last=Max('pk'))['last'] or 0
+    manager.bulk_create(objects, batch_size=len(objects))
+    if objects[0].pk is not None:
+        return [obj.pk for obj in objects]
+    return list(manager.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+
+def _insert_all(model, objects, batch_size, using):
+    ids = array('q')
+    for batch in batched(objects, batch_size):
+        with transaction.atomic(using=using):
+            ids.extend(_insert(model, batch, using))
+    return ids
+
+
+def _named(model, names, using):
+    ids = []
+    for name in names:
+        obj = model.objects.using(using).filter(name=name).first() or model.objects.using(using).create(name=name)
+        ids.append(obj.pk)
+    return ids
+
+
+def _summarize(books, book_ids, copies, using):
+    """
+    Adds the copies of a batch of new books, given as (book, genre ids) pairs, to the LoanSummary
+    table: the rows of the books are new, the others get the deltas of the batch.
+    """
+    genres = {book_id: genre_ids for book_id, (_, genre_ids) in zip(book_ids, books)}
+    titles = {book_id: book.title for book_id, (book, _) in zip(book_ids, books)}
+    book_rows, deltas = defaultdict(int), defaultdict(int)
+    for copy in copies:
+        for row in loan_summary.contributions(copy.book_id, copy.borrower_id, copy.status, copy.due_back,
+                                              genres[copy.book_id]):
+            (book_rows if row[0] == LoanSummary.BOOK else deltas)[row] += 1
+    LoanSummary.objects.using(using).bulk_create(
+        [LoanSummary(dimension=dimension, key=key, status=status, label=titles[int(key)][:200], count=count)
+         for (dimension, key, status), count in book_rows.items()],
+        batch_size=len(book_rows) or 1,
+    )
+    loan_summary.apply_deltas(deltas, using)
+
+
+def seed_library(books, copies_per_book, authors=None, users=None, seed=0, batch_size=1000,
+                 using=DEFAULT_DB_ALIAS, today=None, refresh_summary=True, progress=None):
+    """
+    Adds a library of books with copies_per_book copies each, by authors (default: a fifth of the
+    books) and borrowed by users (default: a tenth). The LoanSummary table is kept current unless
+    refresh_summary is False (`manage.py refresh_loan_summary` then). progress(books written) is
+    called after each batch. Returns the numbers of rows added, by kind.
+    """
+    factory = LibraryFactory(seed, today)
+    authors = max(1, books // 5) if authors is None else authors
+    users = max(1, books // 10) if users is None else users
+    genre_ids = _named(Genre, GENRES, using)
+    language_ids = _named(Language, LANGUAGES, using)
+    author_ids = _insert_all(Author, factory.authors(authors), batch_size, using)
+    user_ids = _insert_all(User, factory.users(users), batch_size, using)
+
+    through = Book._meta.get_field('genre').remote_field.through
+    counts = {'authors': len(author_ids), 'users': len(user_ids), 'books': 0, 'genre links': 0, 'copies': 0}
+    for batch in batched(factory.books(books, author_ids, language_ids, genre_ids), batch_size):
+        with transaction.atomic(using=using):
+            book_ids = _insert(Book, [book for book, _ in batch], using)
+            links = [through(book_id=book_id, genre_id=genre_id)
+                     for book_id, (_, genres) in zip(book_ids, batch) for genre_id in genres]
+            through.objects.using(using).bulk_create(links, batch_size=batch_size)
+            batch_copies = list(factory.copies(book_ids, copies_per_book, user_ids))
+            BookInstance.objects.using(using).bulk_create(batch_copies, batch_size=batch_size)
+            if refresh_summary:
+                _summarize(batch, book_ids, batch_copies, using)
+        counts['books'] += len(book_ids)
+        counts['genre links'] += len(links)
+        counts['copies'] += len(batch_copies)
+        if progress:
+            progress(counts['books'])
+
+    bitmaps.index.invalidate()
+    autocomplete.index.invalidate()
+    cache.delete(pages.INDEX_COUNTS_KEY)
+    return counts
+
@@ -2,26 +2,125 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime
 from django import forms
+from django.urls import reverse_lazy
+
+from catalog import loan_policy
+from catalog.models import Author, Book
 
 
 class RenewBookForm(forms.Form):
     """
-    Form for library staff to renew books.
+    Form for library staff to renew books, within the period of the copy (catalog.loan_policy).
     """
-    renewal_date = forms.DateField(
-        help_text='Enter a date between now and 4 weeks (default 3).')
+    renewal_date = forms.DateField()
 
+    def __init__(self, *args, period=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.period = period or loan_policy.policy.default
+        self.fields['renewal_date'].help_text = 'Enter a date between now and {} (default {}).'.format(
+            *_durations(self.period.max_renewal_days, self.period.renewal_days))
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
+        today = datetime.date.today()
 
         # Check date is not in past
-        if data < datetime.date.today():
+        if data < today:
             raise ValidationError(_('Invalid date - renewal in past'))
 
-        # Check date is in range library staff allowed to change (+4 weeks)
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+        # Check date is in range library staff allowed to change (+4 weeks by default)
+        if data > self.period.latest_renewal(today):
+            raise ValidationError(_('Invalid date - renewal more than %(limit)s ahead'),
+                                  params={'limit': _durations(self.period.max_renewal_days)[0]})
 
         return data
 
+
+def _durations(days, *others):
+    """
+    Formats numbers of days, as weeks if they all are whole weeks: (28, 21) -> '4 weeks', '3'.
+    """
+    if all(number % 7 == 0 for number in (days, *others)):
+        unit, days, others = 'week', days // 7, [number // 7 for number in others]
+    else:
+        unit = 'day'
+    return (f'{days} {unit}{"" if days == 1 else "s"}', *map(str, others))
+
+
+class AutocompleteInput(forms.TextInput):
+    """
+    Text input suggesting the existing book titles or author names (kind 'book' or 'author')
+    from the autocomplete endpoint, e.g. to notice duplicates.
+    """
+    template_name = 'catalog/widgets/autocomplete_input.html'
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs'].update({
+            'autocomplete': 'off',
+            'list': f"{context['widget']['attrs']['id']}_list",
+            'data-autocomplete-url': reverse_lazy('autocomplete'),
+            'data-autocomplete-kind': self.kind,
+        })
+        return context
+
+
+class AutocompleteSelect(forms.TextInput):
+    """
+    Widget of a ModelChoiceField choosing the book or author (kind 'book' or 'author') by typing
+    its name, instead of a <select> listing every row: only the current choice is fetched.
+    """
+    template_name = 'catalog/widgets/autocomplete_select.html'
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ''
+        queryset = getattr(getattr(self, 'choices', None), 'queryset', None)
+        if value not in (None, '') and queryset is not None:
+            try:
+                label = str(queryset.filter(pk=value).first() or '')
+            except (ValueError, TypeError):
+                pass
+        context['widget'].update({'label': label, 'url': reverse_lazy('autocomplete'), 'kind': self.kind})
+        return context
+
+
+class BookForm(forms.ModelForm):
+    """
+    Form for library staff to create or update a book.
+    """
+
+    class Meta:
+        model = Book
+        fields = '__all__'
+        widgets = {
+            'title': AutocompleteInput('book'),
+            'author': AutocompleteSelect('author'),
+        }
+
+
+class AuthorForm(forms.ModelForm):
+    """
+    Form for library staff to create or update an author.
+    """
+
+    class Meta:
+        model = Author
+        fields = '__all__'
+        widgets = {
+            'last_name': AutocompleteInput('author'),
+        }
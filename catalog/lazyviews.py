@@ -0,0 +1,84 @@
+"""
+Views imported on their first request.
+
+Every manage.py command imports the URLconf (system checks, reverse()), and importing
+catalog.views brings in the forms, reports, task queue... that the commands and workers never
+use. In the URLconfs, views = LazyModule('catalog.views') stands for the module: views.index and
+views.BookListView.as_view() are LazyView placeholders, importing the view when first called.
+
+The web server imports them all up front with load_all() (see locallibrary.wsgi): the workers
+forked by gunicorn --preload share the imported code, and no request pays for the import.
+"""
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.module_loading import import_string
+
+
+class LazyView:
+    """
+    The view at the dotted path, imported when first called. initkwargs, if not None, are the
+    arguments of as_view() of a class-based view.
+    """
+
+    def __init__(self, path, initkwargs=None):
+        self.path = path
+        self.initkwargs = initkwargs
+        self._view = None
+        # Names of the view, as seen by ResolverMatch and reverse() by dotted path.
+        self.__module__, self.__name__ = path.rsplit('.', 1)
+        self.__qualname__ = self.__name__
+
+    def as_view(self, **initkwargs):
+        return LazyView(self.path, initkwargs)
+
+    def resolve(self):
+        """
+        Returns the view, importing it on first use.
+        """
+        if self._view is None:
+            view = import_string(self.path)
+            self._view = view if self.initkwargs is None else view.as_view(**self.initkwargs)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.resolve()(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # Attributes of the view read by the middleware, e.g. csrf_exempt.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f'<LazyView {self.path}>'
+
+
+class LazyModule:
+    """
+    Stands for the views module at the dotted path, without importing it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return LazyView(f'{self.path}.{name}')
+
+
+def load_all(urlconf=None):
+    """
+    Imports all the lazy views of the URLconf. Returns their number.
+    """
+    def views(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from views(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and isinstance(pattern.callback, LazyView):
+                yield pattern.callback
+
+    loaded = 0
+    for view in views(get_resolver(urlconf).url_patterns):
+        view.resolve()
+        loaded += 1
+    return loaded
@@ -0,0 +1,148 @@
+"""
+The append-only circulation log (LoanEvent).
+
+catalog.signals turns the saves of book copies into checkout, return and renewal events. While
+a request is handled (catalog.middleware.LoanEventMiddleware) the events are buffered and written
+with a single bulk_create() at the end of the request; elsewhere (shell, management commands)
+they are written right away. Events of a transaction are only recorded once it is committed.
+
+On PostgreSQL the log is partitioned by month: create the partitions ahead of time with
+`manage.py loan_event_partitions`.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from catalog.models import LoanEvent
+
+logger = logging.getLogger('catalog.loan_events')
+
+# (event, database alias) pairs waiting for the end of the current request, None outside requests.
+_pending = ContextVar('pending_loan_events', default=None)
+
+
+def changes(previous, instance):
+    """
+    Returns the LoanEvent entries for a book copy saved with the state instance, previous being
+    the values of book_id, borrower_id, status and due_back before the save (None for new copies).
+    """
+    now = timezone.now()
+    was_on_loan = previous is not None and previous['status'] == 'o'
+    on_loan = instance.status == 'o'
+
+    def event(kind, book_id, borrower_id, due_back):
+        return LoanEvent(created=now, kind=kind, copy_id=instance.pk, book_id=book_id, borrower_id=borrower_id,
+                         due_back=due_back)
+
+    events = []
+    if was_on_loan and (not on_loan or previous['borrower_id'] != instance.borrower_id):
+        events.append(event(LoanEvent.RETURN, previous['book_id'], previous['borrower_id'], previous['due_back']))
+        was_on_loan = False
+    if on_loan and not was_on_loan:
+        events.append(event(LoanEvent.CHECKOUT, instance.book_id, instance.borrower_id, instance.due_back))
+    elif on_loan and previous['due_back'] != instance.due_back:
+        events.append(event(LoanEvent.RENEW, instance.book_id, instance.borrower_id, instance.due_back))
+    return events
+
+
+def record(events, using=DEFAULT_DB_ALIAS):
+    """
+    Adds the events to the buffer of the current request, or writes them if there is none.
+    """
+    pending = _pending.get()
+    if pending is None:
+        write([(event, using) for event in events])
+    else:
+        pending.extend((event, using) for event in events)
+
+
+def write(pending):
+    """
+    Inserts the buffered (event, database alias) pairs, one bulk_create() per database.
+    """
+    by_database = defaultdict(list)
+    for event, using in pending:
+        by_database[using].append(event)
+    for using, events in by_database.items():
+        LoanEvent.objects.using(using).bulk_create(events, batch_size=500)
+
+
+@contextmanager
+def buffered():
+    """
+    Buffers the events recorded in the block and writes them when it exits.
+    """
+    token = _pending.set([])
+    try:
+        yield
+    finally:
+        pending = _pending.get()
+        _pending.reset(token)
+        if pending:
+            try:
+                write(pending)
+            except Exception:
+                # The loans themselves are saved already: don't turn the response into an error.
+                logger.exception('Could not write %d loan events', len(pending))
+
+
+def circulation_by_month(start=None, end=None, using=DEFAULT_DB_ALIAS, chunk_size=2000):
+    """
+    Yields the circulation per title per month, ordered by month and title: dictionaries with
+    month, book_id, title, checkouts, renewals and returns. The aggregation runs in the database
+    and the rows are fetched in chunks (with a server-side cursor on PostgreSQL), so the log is
+    never loaded into memory. start and end (datetimes) bound the events, which lets PostgreSQL
+    skip the partitions of other months.
+    """
+    events = LoanEvent.objects.using(using).order_by()
+    if start is not None:
+        events = events.filter(created__gte=start)
+    if end is not None:
+        events = events.filter(created__lt=end)
+    rows = events.annotate(month=TruncMonth('created')).values('month', 'book_id', 'book__title').annotate(
+        checkouts=Count('id', filter=Q(kind=LoanEvent.CHECKOUT)),
+        renewals=Count('id', filter=Q(kind=LoanEvent.RENEW)),
+        returns=Count('id', filter=Q(kind=LoanEvent.RETURN)),
+    ).order_by('month', 'book__title', 'book_id')
+    for row in rows.iterator(chunk_size=chunk_size):
+        row['title'] = row.pop('book__title')
+        yield row
+
+
+def _month_start(day, months=0):
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_monthly_partitions(using=DEFAULT_DB_ALIAS, months_ahead=3, start=None):
+    """
+    Creates the missing monthly partitions of the log on PostgreSQL, from the month of start
+    (default: today) to months_ahead months later. Returns the names of the partitions created.
+    Rows of months without a partition go to catalog_loanevent_default; a partition can't be
+    created for a month having rows there, so run this (e.g. daily) before the months begin.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+    first = _month_start(start or datetime.date.today())
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relname FROM pg_class WHERE relname LIKE 'catalog_loanevent_y%%'")
+        existing = {name for name, in cursor.fetchall()}
+        for offset in range(months_ahead + 1):
+            lower, upper = _month_start(first, offset), _month_start(first, offset + 1)
+            name = f'catalog_loanevent_y{lower:%Y}m{lower:%m}'
+            if name in existing:
+                continue
+            cursor.execute(
+                f'CREATE TABLE {connection.ops.quote_name(name)} PARTITION OF catalog_loanevent '
+                f'FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+            created.append(name)
+    return created
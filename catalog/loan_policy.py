@@ -0,0 +1,216 @@
+"""
+Loan policy: how far a copy on loan may be renewed, the renewal proposed, and when it is overdue.
+
+settings.LOAN_POLICY has the default periods and a list of rules overriding some of them for the
+books of some genres or languages, or for the copies borrowed by members of some groups (by
+name); the first rule matching a copy applies. The rules are compiled, on first use in a process,
+into dicts from the genre, language and group ids to the rule, so finding the period of a copy
+is a dict lookup per genre and group whatever the number of rules (period_for()). The same
+policy applies to whole querysets of copies, in Python (periods_of()) or in SQL: renewal_days(),
+max_renewal_days() and overdue() are expressions to annotate or filter the copies with.
+
+Adding, renaming or deleting a genre, language or group makes every process compile the rules
+again, with a version number in the default cache (see catalog.versioned).
+"""
+import datetime
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db.models import BooleanField, Case, Exists, ExpressionWrapper, IntegerField, OuterRef, Q, Value, When
+from django.dispatch import receiver
+
+from catalog.models import Book, Genre, Language
+from catalog.versioned import VersionedIndex
+
+VERSION_KEY = 'catalog:loan-policy-version'
+
+# What a rule can match, by name.
+MATCHES = {'genre': Genre, 'language': Language, 'group': Group}
+
+GenreLinks = Book._meta.get_field('genre').remote_field.through
+GroupLinks = User._meta.get_field('groups').remote_field.through
+
+
+class Period(namedtuple('Period', ['renewal_days', 'max_renewal_days', 'grace_days'])):
+    """
+    The periods of a loan, in days: the renewal proposed, the longest renewal allowed, and the
+    delay after the due date before the copy is overdue.
+    """
+    __slots__ = ()
+
+    def proposed_renewal(self, today):
+        return today + datetime.timedelta(days=self.renewal_days)
+
+    def latest_renewal(self, today):
+        return today + datetime.timedelta(days=self.max_renewal_days)
+
+    def overdue_before(self, today):
+        """
+        Returns the due date from which a copy is not overdue yet.
+        """
+        return today - datetime.timedelta(days=self.grace_days)
+
+    def is_overdue(self, due_back, today):
+        return due_back is not None and due_back < self.overdue_before(today)
+
+
+DEFAULT_PERIOD = Period(renewal_days=21, max_renewal_days=28, grace_days=0)
+
+
+class LoanPolicy(VersionedIndex):
+    """
+    The rules of settings.LOAN_POLICY, compiled into lookup tables by id.
+    """
+    version_key = VERSION_KEY
+
+    def build(self, using=None):
+        version = self.read_version()
+        config = settings.LOAN_POLICY
+        default = DEFAULT_PERIOD._replace(**config.get('default', {}))
+        periods, matches = [], []
+        tables = {match: {} for match in MATCHES}
+        for rule in config.get('rules', ()):
+            rule = dict(rule)
+            matched = [match for match in MATCHES if match in rule]
+            if len(matched) != 1:
+                raise ImproperlyConfigured(f'The LOAN_POLICY rule {rule!r} must match one of: {", ".join(MATCHES)}.')
+            match = matched[0]
+            names = rule.pop(match)
+            if isinstance(names, str):
+                names = [names]
+            ids = list(MATCHES[match].objects.using(using).filter(name__in=names).values_list('pk', flat=True))
+            index = len(periods)
+            periods.append(default._replace(**rule))
+            matches.append((match, ids))
+            for pk in ids:
+                # The first rule wins.
+                tables[match].setdefault(pk, index)
+        periods.append(default)
+
+        with self._lock:
+            self.periods = periods
+            self.matches = matches
+            self.genres, self.languages, self.groups = tables['genre'], tables['language'], tables['group']
+            self.loaded(version)
+
+    @property
+    def default(self):
+        self.ensure_current()
+        return self.periods[-1]
+
+    def period_for(self, genre_ids=(), language_id=None, group_ids=()):
+        """
+        Returns the period of a copy of a book of some genres and language, borrowed by a member
+        of some groups.
+        """
+        self.ensure_current()
+        return self._lookup(genre_ids, language_id, group_ids)
+
+    def _lookup(self, genre_ids, language_id, group_ids):
+        index = len(self.periods) - 1
+        for genre_id in genre_ids:
+            index = min(index, self.genres.get(genre_id, index))
+        index = min(index, self.languages.get(language_id, index))
+        for group_id in group_ids:
+            index = min(index, self.groups.get(group_id, index))
+        return self.periods[index]
+
+    def period_of(self, copy, using=None):
+        """
+        Returns the period of a copy (a BookInstance). Only the genres, language or groups some
+        rule is about are read: without rules, no query.
+        """
+        self.ensure_current()
+        genre_ids, language_id, group_ids = (), None, ()
+        if self.genres and copy.book_id:
+            genre_ids = GenreLinks.objects.using(using).filter(book_id=copy.book_id).values_list('genre_id', flat=True)
+        if self.languages and copy.book_id:
+            language_id = Book.objects.using(using).filter(pk=copy.book_id).values_list(
+                'language_id', flat=True).first()
+        if self.groups and copy.borrower_id:
+            group_ids = GroupLinks.objects.using(using).filter(user_id=copy.borrower_id).values_list(
+                'group_id', flat=True)
+        return self._lookup(genre_ids, language_id, group_ids)
+
+    def periods_of(self, queryset):
+        """
+        Returns the periods of a queryset of copies, by copy id, in at most three queries.
+        """
+        self.ensure_current()
+        genres, groups = defaultdict(list), defaultdict(list)
+        if self.genres:
+            for book_id, genre_id in GenreLinks.objects.using(queryset.db).filter(
+                    book_id__in=queryset.values('book_id')).values_list('book_id', 'genre_id').iterator():
+                genres[book_id].append(genre_id)
+        if self.groups:
+            for user_id, group_id in GroupLinks.objects.using(queryset.db).filter(
+                    user_id__in=queryset.values('borrower_id')).values_list('user_id', 'group_id').iterator():
+                groups[user_id].append(group_id)
+        rows = queryset.values_list('pk', 'book_id', 'book__language_id', 'borrower_id')
+        return {
+            pk: self._lookup(genres.get(book_id, ()), language_id, groups.get(borrower_id, ()))
+            for pk, book_id, language_id, borrower_id in rows.iterator()
+        }
+
+    def is_overdue(self, copy, today=None):
+        if copy.due_back is None:
+            return False
+        today = today or datetime.date.today()
+        self.ensure_current()
+        if len({period.grace_days for period in self.periods}) == 1:
+            return self.periods[-1].is_overdue(copy.due_back, today)
+        return self.period_of(copy).is_overdue(copy.due_back, today)
+
+    # SQL expressions over BookInstance rows.
+
+    def _conditions(self):
+        for index, (match, ids) in enumerate(self.matches):
+            if not ids:
+                continue
+            if match == 'genre':
+                condition = Exists(GenreLinks.objects.filter(book_id=OuterRef('book_id'), genre_id__in=ids))
+            elif match == 'language':
+                condition = Exists(Book.objects.filter(pk=OuterRef('book_id'), language_id__in=ids))
+            else:
+                condition = Exists(GroupLinks.objects.filter(user_id=OuterRef('borrower_id'), group_id__in=ids))
+            yield index, condition
+
+    def _case(self, value, output_field):
+        """
+        Returns the expression of value(period) for the period of each row.
+        """
+        self.ensure_current()
+        whens = [When(condition, then=value(self.periods[index])) for index, condition in self._conditions()]
+        if not whens:
+            return value(self.periods[-1])
+        return Case(*whens, default=value(self.periods[-1]), output_field=output_field)
+
+    def renewal_days(self):
+        return self._case(lambda period: Value(period.renewal_days, output_field=IntegerField()), IntegerField())
+
+    def max_renewal_days(self):
+        return self._case(lambda period: Value(period.max_renewal_days, output_field=IntegerField()),
+                          IntegerField())
+
+    def overdue(self, today=None):
+        """
+        Returns whether each copy is overdue on today (by default, the day the expression is
+        made), e.g. to annotate a list of loans once rather than asking every copy.
+        """
+        today = today or datetime.date.today()
+        return self._case(
+            lambda period: ExpressionWrapper(Q(due_back__lt=period.overdue_before(today)),
+                                             output_field=BooleanField()),
+            BooleanField())
+
+
+policy = LoanPolicy()
+
+
+@receiver(setting_changed)
+def reset_loan_policy(setting, **kwargs):
+    if setting == 'LOAN_POLICY':
+        policy.built = False
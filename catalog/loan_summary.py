@@ -0,0 +1,141 @@
+"""
+Maintenance of the LoanSummary aggregates.
+
+The signal receivers in catalog.signals apply the change of every saved or deleted book copy
+(and of book genre changes) as deltas. QuerySet.update() and bulk_create() don't send signals:
+run `manage.py refresh_loan_summary` after such bulk changes (--full rebuilds the table).
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, F
+
+from catalog.models import Book, BookInstance, Genre, LoanSummary
+
+
+def contributions(book_id, borrower_id, status, due_back, genre_ids):
+    """
+    Returns the LoanSummary rows (dimension, key, status) a book copy counts in.
+    """
+    rows = []
+    if borrower_id is not None:
+        rows.append((LoanSummary.BORROWER, str(borrower_id), status))
+    if book_id is not None:
+        rows.append((LoanSummary.BOOK, str(book_id), status))
+    if due_back is not None:
+        rows.append((LoanSummary.DUE_DATE, due_back.isoformat(), status))
+    for genre_id in genre_ids:
+        rows.append((LoanSummary.GENRE, str(genre_id), status))
+    return rows
+
+
+def genre_ids(book_id, using):
+    """
+    Returns the ids of the genres of a book.
+    """
+    if book_id is None:
+        return []
+    through = Book._meta.get_field('genre').remote_field.through
+    return list(through.objects.using(using).filter(book_id=book_id).values_list('genre_id', flat=True))
+
+
+def _label(dimension, key, using):
+    """
+    Label of a new LoanSummary row, so the report doesn't have to join other tables.
+    """
+    if dimension == LoanSummary.BORROWER:
+        label = User.objects.using(using).filter(pk=key).values_list('username', flat=True).first()
+    elif dimension == LoanSummary.BOOK:
+        label = Book.objects.using(using).filter(pk=key).values_list('title', flat=True).first()
+    elif dimension == LoanSummary.GENRE:
+        label = Genre.objects.using(using).filter(pk=key).values_list('name', flat=True).first()
+    else:
+        label = key
+    return (label or key)[:200]
+
+
+def apply_deltas(deltas, using):
+    """
+    Adds the deltas ((dimension, key, status) -> delta) to the LoanSummary rows.
+    """
+    with transaction.atomic(using=using):
+        for (dimension, key, status), delta in deltas.items():
+            if not delta:
+                continue
+            rows = LoanSummary.objects.using(using).filter(dimension=dimension, key=key, status=status)
+            if rows.update(count=F('count') + delta):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    LoanSummary.objects.using(using).create(
+                        dimension=dimension, key=key, status=status, label=_label(dimension, key, using), count=delta)
+            except IntegrityError:
+                # Created concurrently since the update above.
+                rows.update(count=F('count') + delta)
+
+
+def diff(old_rows, new_rows):
+    """
+    Returns the deltas turning the contributions old_rows into new_rows.
+    """
+    deltas = defaultdict(int)
+    for row in old_rows:
+        deltas[row] -= 1
+    for row in new_rows:
+        deltas[row] += 1
+    return deltas
+
+
+def compute(using=DEFAULT_DB_ALIAS):
+    """
+    Computes all the LoanSummary rows from the BookInstance table:
+    (dimension, key, status) -> (label, count).
+    """
+    copies = BookInstance.objects.using(using).order_by()
+    groupings = (
+        (LoanSummary.BORROWER, copies.filter(borrower__isnull=False), 'borrower_id', 'borrower__username'),
+        (LoanSummary.BOOK, copies.filter(book__isnull=False), 'book_id', 'book__title'),
+        (LoanSummary.DUE_DATE, copies.filter(due_back__isnull=False), 'due_back', 'due_back'),
+        (LoanSummary.GENRE, copies.filter(book__genre__isnull=False), 'book__genre', 'book__genre__name'),
+    )
+    rows = {}
+    for dimension, queryset, key_field, label_field in groupings:
+        for row in queryset.values(key_field, label_field, 'status').annotate(copies=Count('id')).iterator():
+            key = row[key_field].isoformat() if dimension == LoanSummary.DUE_DATE else str(row[key_field])
+            label = key if dimension == LoanSummary.DUE_DATE else row[label_field][:200]
+            rows[(dimension, key, row['status'])] = (label, row['copies'])
+    return rows
+
+
+def refresh(using=DEFAULT_DB_ALIAS, full=False):
+    """
+    Brings the LoanSummary table in line with the BookInstance table. Only the rows that differ
+    are written, unless full is set: the table is then emptied and rebuilt.
+    Returns the number of rows written.
+    """
+    rows = compute(using)
+    with transaction.atomic(using=using):
+        summaries = LoanSummary.objects.using(using)
+        if full:
+            summaries.all().delete()
+            summaries.bulk_create(
+                [LoanSummary(dimension=dimension, key=key, status=status, label=label, count=count)
+                 for (dimension, key, status), (label, count) in rows.items()],
+                batch_size=1000,
+            )
+            return len(rows)
+
+        written = 0
+        for summary in summaries.select_for_update():
+            label, count = rows.pop((summary.dimension, summary.key, summary.status), (summary.label, 0))
+            if summary.count != count or summary.label != label:
+                summary.count, summary.label = count, label
+                summary.save(update_fields=['count', 'label'])
+                written += 1
+        summaries.bulk_create(
+            [LoanSummary(dimension=dimension, key=key, status=status, label=label, count=count)
+             for (dimension, key, status), (label, count) in rows.items()],
+            batch_size=1000,
+        )
+        return written + len(rows)
@@ -0,0 +1,69 @@
+"""
+Email sent in the background: with EMAIL_BACKEND set to QueuedEmailBackend, sending a message
+queues a send_email task, and the worker (`manage.py run_worker`) delivers it with
+settings.QUEUED_EMAIL_BACKEND. Views (e.g. password resets) don't wait for the mail server, and
+messages are retried while it is down.
+"""
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from catalog.taskqueue import task
+
+
+def serialize(message):
+    """
+    Returns the JSON serializable fields of an EmailMessage (or EmailMultiAlternatives).
+    """
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise TypeError('Only (filename, content, mimetype) attachments can be queued.')
+        filename, content, mimetype = attachment
+        if isinstance(content, bytes):
+            attachments.append([filename, base64.b64encode(content).decode('ascii'), mimetype, True])
+        else:
+            attachments.append([filename, content, mimetype, False])
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': message.extra_headers,
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
+
+
+def deserialize(data):
+    message = EmailMultiAlternatives(
+        data['subject'], data['body'], data['from_email'], data['to'], data['bcc'], cc=data['cc'],
+        reply_to=data['reply_to'], headers=data['headers'],
+        alternatives=[tuple(alternative) for alternative in data['alternatives']])
+    for filename, content, mimetype, encoded in data['attachments']:
+        message.attach(filename, base64.b64decode(content) if encoded else content, mimetype)
+    return message
+
+
+@task(max_attempts=8, retry_delay=60)
+def send_email(data):
+    """
+    Delivers a queued message with settings.QUEUED_EMAIL_BACKEND.
+    """
+    get_connection(settings.QUEUED_EMAIL_BACKEND).send_messages([deserialize(data)])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend queuing a send_email task per message.
+    """
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            send_email.enqueue(serialize(message))
+        return len(email_messages)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the "readers who borrowed this also borrowed" recommendations '
+            'from the loan history (run it nightly).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=5, help='Number of recommendations per book.')
+        parser.add_argument('--max-basket', type=int, default=500,
+                            help='Skip the readers who borrowed more books than this.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = recommendations.build(using=options['database'], top=options['top'],
+                                        max_basket=options['max_basket'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} recommendations written in {time.perf_counter() - start:.2f}s.'))
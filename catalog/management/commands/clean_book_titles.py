@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from catalog import autocomplete, pages
+from catalog.factories import batched
+from catalog.models import Book, LoanSummary
+from catalog.parallel import ParallelCommand
+
+
+class Command(ParallelCommand):
+    help = ('Collapses the whitespace of the book titles and strips the summaries, '
+            'in parallel by ranges of ids.')
+    model = Book
+    batch_size = 500
+
+    def process(self, queryset, options):
+        processed, books = 0, []
+        for pk, title, summary in queryset.values_list('id', 'title', 'summary').iterator():
+            processed += 1
+            clean_title, clean_summary = ' '.join(title.split()), summary.strip()
+            if (clean_title, clean_summary) != (title, summary):
+                books.append(Book(id=pk, title=clean_title, summary=clean_summary))
+        for batch in batched(books, self.batch_size):
+            queryset.bulk_update(batch, ['title', 'summary'])
+            self.changed(batch, queryset.db)
+        return processed, len(books)
+
+    def changed(self, books, using):
+        """
+        Does what the post_save receivers of catalog.signals do for the books, which bulk_update()
+        bypassed: the loan summary labels and the cached book pages.
+        """
+        titles = {str(book.pk): book.title for book in books}
+        LoanSummary.objects.using(using).filter(dimension=LoanSummary.BOOK, key__in=titles).update(
+            label=Case(*(When(key=key, then=Value(title)) for key, title in titles.items()), default='label'))
+        if settings.BOOK_PAGE_CACHE_TIMEOUT:
+            book_ids = [book.pk for book in books]
+            transaction.on_commit(lambda: pages.invalidate_books(book_ids), using=using)
+
+    def finish(self, changed, options):
+        if changed:
+            # bulk_update() bypassed the signals keeping the title index current.
+            autocomplete.index.invalidate()
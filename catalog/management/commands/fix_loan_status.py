@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from catalog import bitmaps, loan_summary, pages
+from catalog.models import BookInstance
+from catalog.parallel import ParallelCommand
+
+
+class Command(ParallelCommand):
+    help = ('Fixes the loan fields of the book copies, in parallel by ranges of ids: copies on loan '
+            'without a borrower are made available, other copies lose their borrower and due date.')
+    model = BookInstance
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the copies to fix.')
+
+    def process(self, queryset, options):
+        # Bulk updates: no LoanEvent is logged, these are corrections rather than returns.
+        fixes = [
+            (queryset.filter(status__exact='o', borrower__isnull=True), {'status': 'a', 'due_back': None}),
+            (queryset.exclude(status__exact='o').filter(Q(borrower__isnull=False) | Q(due_back__isnull=False)),
+             {'borrower': None, 'due_back': None}),
+        ]
+        if options['dry_run']:
+            return queryset.count(), sum(copies.count() for copies, _ in fixes)
+        changed, book_ids = 0, set()
+        for copies, values in fixes:
+            book_ids.update(copies.values_list('book_id', flat=True).distinct())
+            changed += copies.update(**values)
+        if book_ids and settings.BOOK_PAGE_CACHE_TIMEOUT:
+            # The pages list the copies with their status and due date.
+            transaction.on_commit(lambda: pages.invalidate_books(book_ids), using=queryset.db)
+        return queryset.count(), changed
+
+    def finish(self, changed, options):
+        if changed and not options['dry_run']:
+            # The updates bypassed the signals maintaining these.
+            loan_summary.refresh(using=options['database'])
+            bitmaps.index.invalidate()
+            cache.delete(pages.INDEX_COUNTS_KEY)  # The number of available copies.
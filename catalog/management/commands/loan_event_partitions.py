@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from catalog import loan_events
+
+
+class Command(BaseCommand):
+    help = ('Creates the monthly partitions of the loan event log on PostgreSQL, '
+            'for the current month and the following ones. Run it regularly (e.g. daily).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='Number of months to create ahead.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if connections[options['database']].vendor != 'postgresql':
+            self.stdout.write('The loan event log is only partitioned on PostgreSQL.')
+            return
+        created = loan_events.create_monthly_partitions(using=options['database'], months_ahead=options['months'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partitions created.'))
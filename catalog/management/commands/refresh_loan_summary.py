@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog import loan_summary
+
+
+class Command(BaseCommand):
+    help = ('Brings the LoanSummary aggregates in line with the book copies, '
+            'e.g. after bulk updates that bypassed the signals.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Empty and rebuild the whole table.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = loan_summary.refresh(using=options['database'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} loan summary rows written in {time.perf_counter() - start:.2f}s.'))
@@ -0,0 +1,149 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from catalog import replay
+from catalog.management.commands.warm_cache import server_name
+
+# The test clients of each thread of the pool, by user (None for the anonymous requests).
+_local = threading.local()
+
+
+class Command(BaseCommand):
+    help = ('Replays a trace of requests (JSON lines, e.g. the catalog.profiling log) at the pace it was '
+            'recorded or faster, and compares the latency of each route with the recorded one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace', help='JSON lines file of the requests.')
+        parser.add_argument('--speedup', type=float, default=1.0,
+                            help='Replay the trace this many times faster; 0 sends the requests as fast as '
+                                 'the workers go.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent requests; 0 makes them one by one in this thread.')
+        parser.add_argument('--limit', type=int, help='Replay the first requests of the trace only.')
+        parser.add_argument('--methods', default='GET,HEAD',
+                            help='Methods to replay (the others have no body in the trace).')
+        parser.add_argument('--base-url',
+                            help='Send the requests to a running server (e.g. http://localhost:8000) rather than '
+                                 'render them in this process. Its users are logged in with sessions saved here, '
+                                 'so it must share the database.')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds per request, with --base-url.')
+
+    def handle(self, *args, **options):
+        methods = tuple(method.strip().upper() for method in options['methods'].split(','))
+        try:
+            requests = list(replay.read_trace(options['trace'], methods))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        if options['limit'] is not None:
+            requests = requests[:options['limit']]
+        if not requests:
+            raise CommandError(f'No {"/".join(methods)} requests in {options["trace"]}.')
+
+        users = self.users({request.user for request in requests} - {None})
+        if options['base_url']:
+            base_url = options['base_url'].rstrip('/')
+            cookies = {name: self.session_cookie(user) for name, user in users.items()}
+            send = lambda request: self.send_http(base_url, request, cookies, options['timeout'])  # noqa: E731
+        else:
+            send = lambda request: self.send_local(request, users)  # noqa: E731
+
+        start = time.perf_counter()
+        results = list(replay.replay(requests, send, options['speedup'], options['workers']))
+        elapsed = time.perf_counter() - start
+        self.report(replay.summarize(results), requests, elapsed, options['speedup'])
+
+    def users(self, names):
+        """
+        The users of the trace existing here, by name; the others are replayed anonymously.
+        """
+        User = get_user_model()
+        users = {user.get_username(): user for user in User._default_manager.filter(
+            **{f'{User.USERNAME_FIELD}__in': names})}
+        if len(users) < len(names):
+            self.stdout.write(self.style.WARNING(
+                f'{len(names) - len(users)} of the {len(names)} users of the trace are unknown here, '
+                f'their requests are anonymous.'))
+        return users
+
+    def send_local(self, request, users):
+        """
+        Renders the request in this process, as its user. Returns its status.
+        """
+        clients = getattr(_local, 'clients', None)
+        if clients is None:
+            clients = _local.clients = {}
+        user = users.get(request.user)
+        client = clients.get(user)
+        if client is None:
+            client = clients[user] = Client(SERVER_NAME=server_name())
+            if user is not None:
+                client.force_login(user)
+        response = client.generic(request.method, request.url, secure=settings.SECURE_SSL_REDIRECT)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        response.close()
+        return response.status_code
+
+    def session_cookie(self, user):
+        """
+        Returns the cookie of a new session of user, as Client.force_login() makes.
+        """
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def send_http(self, base_url, request, cookies, timeout):
+        headers = {'Cookie': cookies[request.user]} if request.user in cookies else {}
+        http_request = urllib.request.Request(base_url + request.url, method=request.method, headers=headers)
+        try:
+            with urllib.request.urlopen(http_request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+        except OSError as error:
+            return str(error)
+
+    def report(self, routes, requests, elapsed, speedup):
+        def ms(value):
+            return '-' if value is None else f'{value:.1f}'
+
+        columns = ('count', 'errors', 'p50 ms', 'p95 ms', 'max ms', 'rec p50', 'rec p95', 'ratio')
+        self.stdout.write(f'{"route":<40}' + ''.join(f'{column:>9}' for column in columns))
+        for stats in routes:
+            ratio = stats.ratio()
+            values = (
+                stats.count, stats.errors,
+                ms(replay.percentile(stats.replayed, 0.5)), ms(replay.percentile(stats.replayed, 0.95)),
+                ms(max(stats.replayed)),
+                ms(replay.percentile(stats.recorded, 0.5)), ms(replay.percentile(stats.recorded, 0.95)),
+                '-' if ratio is None else f'{ratio:.2f}',
+            )
+            line = f'{stats.route:<40}' + ''.join(f'{value:>9}' for value in values)
+            self.stdout.write(self.style.WARNING(line) if stats.errors else line)
+            if stats.status_changes:
+                self.stdout.write(f'  {stats.status_changes} requests with another status than recorded')
+
+        count = sum(stats.count for stats in routes)
+        errors = sum(stats.errors for stats in routes)
+        lag = max(stats.lag for stats in routes)
+        times = [request.time for request in requests if request.time is not None]
+        recorded = ''
+        if speedup and len(times) == len(requests) and max(times) > min(times):
+            target = len(requests) * speedup / (max(times) - min(times))
+            recorded = f', {target:.1f} requests/s wanted'
+        self.stdout.write(f'{count} requests in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.1f} requests/s'
+                          f'{recorded}), max lag {lag * 1000:.0f}ms.')
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(f'{count - errors} requests replayed, {errors} errors.'))
@@ -0,0 +1,108 @@
+import datetime
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+from catalog import taskqueue
+
+# Set by the main process to make the worker processes exit after their current task.
+_stop = None
+
+
+def _init_process(stop):
+    global _stop
+    _stop = stop
+    # Ctrl+C reaches the whole process group: let the main process stop the workers cleanly.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def work(stop, using, burst, poll_interval):
+    """
+    Runs the tasks due until stop is set (or, with burst, until there are none left).
+    Returns the number of tasks that succeeded and failed.
+    """
+    worker = taskqueue.worker_name()
+    succeeded = failed = 0
+    while not stop.is_set():
+        close_old_connections()
+        result = taskqueue.run_next(worker, using)
+        if result is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+        elif result:
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def _work_in_process(using, burst, poll_interval):
+    try:
+        return work(_stop, using, burst, poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Runs the background tasks (catalog.taskqueue) in a pool of worker processes, '
+            'and queues the periodic tasks of settings.TASK_SCHEDULE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Number of worker processes; 0 runs the tasks in this process.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between two looks at the queue while it is empty.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using, burst, poll_interval = options['database'], options['burst'], options['poll_interval']
+        start = time.perf_counter()
+        self.housekeeping(using)
+        if options['processes'] <= 0:
+            succeeded, failed = work(threading.Event(), using, burst, poll_interval)
+        else:
+            succeeded, failed = self.run_pool(options['processes'], using, burst, poll_interval)
+        self.stdout.write(self.style.SUCCESS(
+            f'{succeeded} tasks done, {failed} failed in {time.perf_counter() - start:.2f}s.'))
+
+    def run_pool(self, processes, using, burst, poll_interval):
+        # The worker processes are forked: each opens its own database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        try:
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_process,
+                                     initargs=(stop,)) as pool:
+                futures = [pool.submit(_work_in_process, using, burst, poll_interval) for _ in range(processes)]
+                self.stdout.write(f'{processes} worker processes started.')
+                try:
+                    while True:
+                        done, not_done = wait(futures, timeout=poll_interval * 10, return_when=FIRST_EXCEPTION)
+                        if not not_done or any(future.exception() for future in done):
+                            break
+                        self.housekeeping(using)
+                except KeyboardInterrupt:
+                    self.stdout.write('Stopping after the current tasks...')
+                # Also stops the other workers when one of them failed (e.g. lost the database).
+                stop.set()
+                results = [future.result() for future in futures]
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        return sum(result[0] for result in results), sum(result[1] for result in results)
+
+    def housekeeping(self, using):
+        close_old_connections()
+        queued = taskqueue.schedule(using=using)
+        requeued = taskqueue.requeue_stale(datetime.timedelta(seconds=settings.TASK_TIMEOUT), using=using)
+        taskqueue.purge(datetime.timedelta(seconds=settings.TASK_RESULT_TTL), using=using)
+        if queued or requeued:
+            self.stdout.write(f'{queued} periodic tasks queued, {requeued} stale tasks queued again.')
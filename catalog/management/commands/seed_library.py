@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.factories import seed_library
+
+
+class Command(BaseCommand):
+    help = ('Adds a synthetic library (authors, books with their genres, copies, borrowers) for the '
+            'performance work. The same --seed gives the same library.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, required=True)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--authors', type=int, help='Number of authors (default: a fifth of the books).')
+        parser.add_argument('--users', type=int, help='Number of borrowers (default: a tenth of the books).')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random data; the borrowers are named after it, so seed each '
+                                 'database once per seed.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Books written per transaction.')
+        parser.add_argument('--skip-summary', action='store_true',
+                            help="Don't add the copies to the LoanSummary table, a few queries per batch "
+                                 "(run `manage.py refresh_loan_summary` later).")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['books'] < 0 or options['copies_per_book'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--books and --copies-per-book must be positive, --batch-size at least 1.')
+        start = time.perf_counter()
+
+        def progress(books):
+            if options['verbosity'] > 1 or books == options['books']:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{books} of {options["books"]} books written in {elapsed:.1f}s.')
+
+        counts = seed_library(
+            options['books'], options['copies_per_book'], authors=options['authors'], users=options['users'],
+            seed=options['seed'], batch_size=options['batch_size'], using=options['database'],
+            refresh_summary=not options['skip_summary'], progress=progress,
+        )
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{", ".join(f"{count} {kind}" for kind, count in counts.items())} added in {elapsed:.2f}s '
+            f'({rows / max(elapsed, 1e-9):.0f} rows/s).'))
@@ -0,0 +1,78 @@
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.slow_queries import read_log
+
+# Plan lines showing a full table scan (SQLite "SCAN table", PostgreSQL "Seq Scan on table").
+TABLE_SCAN_RE = re.compile(r'^(?:SCAN (?:TABLE )?(?P<sqlite>\w+)|.*Seq Scan on (?P<postgresql>\w+))')
+
+
+class Command(BaseCommand):
+    help = 'Reports the slow query log grouped by SQL fingerprint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help='Slow query log file (default: SLOW_QUERY_LOG).')
+        parser.add_argument('--sort', choices=['total', 'avg', 'count'], default='total')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--table', default=None,
+                            help='Only report queries scanning this table (e.g. catalog_bookinstance).')
+        parser.add_argument('--clear', action='store_true', help='Empty the log after reporting.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        if not os.path.exists(path):
+            raise CommandError(f'No slow query log at {path}.')
+
+        groups = {}
+        for entry in read_log(path):
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'callers': {},
+                'templates': set(),
+                'plan': entry['plan'],
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            if entry['stack']:
+                caller = entry['stack'][-1]
+                group['callers'][caller] = group['callers'].get(caller, 0) + 1
+            group['templates'].update(entry['templates'])
+            group['plan'] = entry['plan'] or group['plan']
+
+        for group in groups.values():
+            group['avg_ms'] = group['total_ms'] / group['count']
+            group['scans'] = sorted({match.group('sqlite') or match.group('postgresql')
+                                     for match in map(TABLE_SCAN_RE.match, group['plan']) if match})
+
+        report = list(groups.values())
+        if options['table']:
+            report = [group for group in report if options['table'] in group['scans']]
+        sort_key = {'total': 'total_ms', 'avg': 'avg_ms', 'count': 'count'}[options['sort']]
+        report.sort(key=lambda group: group[sort_key], reverse=True)
+
+        for group in report[:options['limit']]:
+            self.stdout.write(self.style.SQL_KEYWORD(group['fingerprint']))
+            self.stdout.write(
+                f"  count={group['count']} total={group['total_ms']:.1f}ms "
+                f"avg={group['avg_ms']:.1f}ms max={group['max_ms']:.1f}ms")
+            if group['scans']:
+                self.stdout.write(self.style.WARNING(f"  table scan: {', '.join(group['scans'])}"))
+            for caller, count in sorted(group['callers'].items(), key=lambda item: item[1], reverse=True)[:3]:
+                self.stdout.write(f'  called from {caller} ({count}x)')
+            if group['templates']:
+                self.stdout.write(f"  templates: {', '.join(sorted(group['templates']))}")
+            for line in group['plan']:
+                self.stdout.write(f'  plan: {line}')
+            self.stdout.write('')
+
+        self.stdout.write(f'{len(report)} fingerprints, {sum(group["count"] for group in report)} slow queries.')
+
+        if options['clear']:
+            open(path, 'w').close()
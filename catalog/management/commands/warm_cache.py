@@ -0,0 +1,161 @@
+import math
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test import Client
+from django.urls import Resolver404, resolve
+
+from catalog import pages
+from catalog.models import Author, Book
+from catalog.reversing import url_for
+from catalog.views import AuthorListView, BookListView
+
+# The test client of each thread of the pool.
+_local = threading.local()
+
+
+def default_urls(list_pages, top_books):
+    """
+    The home page, the first list_pages pages of the book and author lists and the pages of the
+    top_books books with the most copies.
+    """
+    urls = [url_for('index')]
+    for name, view, model in (('books', BookListView, Book), ('authors', AuthorListView, Author)):
+        count = min(list_pages, math.ceil(model.objects.count() / view.paginate_by))
+        urls += [url_for(name)] + [f'{url_for(name)}?page={page}' for page in range(2, count + 1)]
+    books = (Book.objects.annotate(copies=Count('bookinstance')).order_by('-copies', 'pk')
+             .values_list('pk', flat=True)[:top_books])
+    return urls + [url_for('book-detail', pk) for pk in books]
+
+
+def resolve_url(url):
+    try:
+        return resolve(urlsplit(url).path)
+    except Resolver404:
+        return None
+
+
+def server_name():
+    for host in settings.ALLOWED_HOSTS:
+        if host not in ('*', '') and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Requests the most visited pages, so that their cached parts (catalog.pages) and the '
+            'in-memory indexes are ready before the first users arrive (run it after a deploy).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='Paths to request instead of the default list.')
+        parser.add_argument('--urls-file', help='File with one path to request per line.')
+        parser.add_argument('--pages', type=int, default=3, help='Pages of the book and author lists.')
+        parser.add_argument('--top-books', type=int, default=50,
+                            help='Number of book pages, the books with the most copies first.')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Number of concurrent requests; 0 makes them one by one in this thread.')
+        parser.add_argument('--base-url',
+                            help='Request the pages from the running site (e.g. https://example.com) rather '
+                                 'than render them in this process: also warms the memory of its workers.')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds per request, with --base-url.')
+
+    def handle(self, *args, **options):
+        urls = list(options['urls'])
+        if options['urls_file']:
+            with open(options['urls_file']) as urls_file:
+                urls += [line.strip() for line in urls_file if line.strip() and not line.startswith('#')]
+        if not urls:
+            urls = default_urls(options['pages'], options['top_books'])
+        if options['base_url']:
+            base_url = options['base_url'].rstrip('/')
+            fetch = lambda url: self.fetch_http(base_url + url, options['timeout'])  # noqa: E731
+        else:
+            if isinstance(caches['default'], LocMemCache):
+                self.stdout.write(self.style.WARNING(
+                    'The default cache is in the memory of this process, out of reach of the site workers: '
+                    'use --base-url, or a cache shared by the processes.'))
+            fetch = self.fetch_local
+
+        start = time.perf_counter()
+        durations, failed = [], []
+        for url, (status, seconds) in self.fetch_all(fetch, urls, options['threads']):
+            durations.append(seconds)
+            if status != 200:
+                failed.append((url, status))
+        elapsed = time.perf_counter() - start
+
+        for url, status in sorted(failed):
+            self.stderr.write(f'{url}: {status}')
+        self.stdout.write(
+            f'{len(urls)} pages in {elapsed:.2f}s ({len(urls) / max(elapsed, 1e-9):.1f} pages/s), '
+            f'median {statistics.median(durations) * 1000:.0f}ms, max {max(durations) * 1000:.0f}ms per page.')
+        self.report_cache_fill(urls, local=not options['base_url'])
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f'{len(urls) - len(failed)} pages warmed, {len(failed)} failed.'))
+
+    def fetch_all(self, fetch, urls, threads):
+        """
+        Yields (url, (status, seconds)) as the requests finish.
+        """
+        if threads <= 0:
+            for url in urls:
+                yield url, fetch(url)
+            return
+        with ThreadPoolExecutor(threads) as pool:
+            futures = {pool.submit(fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def fetch_local(self, url):
+        """
+        Renders url in this process. Returns its status and the seconds taken.
+        """
+        client = getattr(_local, 'client', None)
+        if client is None:
+            client = _local.client = Client(SERVER_NAME=server_name())
+        start = time.perf_counter()
+        response = client.get(url, secure=settings.SECURE_SSL_REDIRECT)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        response.close()
+        return response.status_code, time.perf_counter() - start
+
+    def fetch_http(self, url, timeout):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        except OSError as error:
+            status = str(error)
+        return status, time.perf_counter() - start
+
+    def report_cache_fill(self, urls, local):
+        in_memory = isinstance(caches['default'], LocMemCache)
+        if in_memory and not local:
+            # The caches of the workers are out of reach.
+            return
+        fill = []
+        if settings.INDEX_COUNTS_CACHE_TIMEOUT:
+            fill.append(f'home page counts {"cached" if cache.get(pages.INDEX_COUNTS_KEY) else "missing"}')
+        if settings.BOOK_PAGE_CACHE_TIMEOUT:
+            book_ids = [match.kwargs['pk'] for match in map(resolve_url, urls)
+                        if match and match.url_name == 'book-detail']
+            cached = cache.get_many([pages.book_detail_key(book_id, False) for book_id in book_ids])
+            fill.append(f'{len(cached)} of {len(book_ids)} book pages cached')
+        if in_memory:
+            fill.append(f'{len(caches["default"]._cache)} entries in the cache')
+        if fill:
+            self.stdout.write('Cache fill: ' + ', '.join(fill) + '.')
@@ -0,0 +1,370 @@
+"""
+Small instrumentation API exported in the Prometheus text format on /metrics.
+
+Counters and histograms live in memory in each process. When METRICS_DIR is set every process
+also writes its samples to its own file in that directory (at most every METRICS_FLUSH_INTERVAL
+seconds, at the latest that long after a sample, and at exit), and /metrics sums the files up, so
+the numbers cover all gunicorn workers whichever worker answers the scrape. The files of the
+processes gone (recycled or restarted workers) are merged into archive.json at the next scrape,
+as prometheus_client's multiprocess mode does: the totals never go down, which Prometheus would
+take for a counter reset.
+
+/metrics answers the staff users, and the scrapers sending settings.METRICS_TOKEN as a bearer
+token (`Authorization: Bearer <token>`).
+
+Usage inside views:
+
+    from catalog import metrics
+
+    metrics.CACHE_REQUESTS.inc(cache='book-detail', result='hit')
+    with metrics.VIEW_SECTION.time(section='index-counts'):
+        ...
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The samples of the processes gone, in the metrics directory.
+ARCHIVE = 'archive.json'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Another user's process.
+        return True
+    return True
+
+
+def _read_samples(path):
+    """
+    Returns the samples of a metrics file, {} if it is being written.
+    """
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except ValueError:
+        return {}
+    return {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in data}
+
+
+def _write_samples(path, samples):
+    data = [[name, [list(pair) for pair in labels], value] for (name, labels), value in samples.items()]
+    with open(f'{path}.tmp', 'w') as fp:
+        json.dump(data, fp)
+    # os.replace is atomic, readers see either the old or the new file.
+    os.replace(f'{path}.tmp', path)
+
+
+def _sort_key(item):
+    # Orders samples by name and labels, histogram buckets by their numeric bound.
+    (name, labels), value = item
+    bound = float(dict(labels).get('le', 0))
+    return name, tuple(pair for pair in labels if pair[0] != 'le'), bound
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        label_str = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+        return f'{name}{{{label_str}}} {_format_value(value)}'
+    return f'{name} {_format_value(value)}'
+
+
+class Registry:
+    """
+    Holds the samples of this process and knows how to merge them with other processes.
+    """
+
+    def __init__(self, directory=None, flush_interval=None, ident=None):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+        self._values = {}
+        self._directory = directory
+        self._flush_interval = flush_interval
+        self._ident = ident
+        self._pid = os.getpid()
+        self._started = time.time()
+        self._last_flush = 0.0
+        self._dirty = False
+        self._timer = None
+        atexit.register(self._flush_pending)
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return getattr(settings, 'METRICS_DIR', None)
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+
+    def _filename(self):
+        ident = self._ident or f'{self._pid}-{int(self._started * 1000)}'
+        return os.path.join(self.directory, f'{ident}.json')
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Registers a callable returning (name, type, documentation, [(labels, value), ...]) tuples,
+        computed in the scraping process only (e.g. gauges read from the database).
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def _check_fork(self):
+        # A forked worker (gunicorn --preload) must not report the samples of its parent twice.
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._values = {}
+            self._started = time.time()
+            self._last_flush = 0.0
+            self._dirty = False
+            self._timer = None
+
+    def add(self, samples):
+        """
+        Adds amounts to samples: an iterable of (sample name, labels, amount).
+        """
+        with self._lock:
+            self._check_fork()
+            for name, labels, amount in samples:
+                key = (name, labels)
+                self._values[key] = self._values.get(key, 0) + amount
+            self._dirty = True
+            if not self.directory:
+                return
+            wait = self._last_flush + self.flush_interval - time.monotonic()
+            if wait <= 0:
+                self._flush_locked()
+            elif self._timer is None:
+                # Written even if no other sample comes, e.g. in an idle worker.
+                self._timer = threading.Timer(wait, self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_pending(self):
+        # From the timer or at exit: the samples not written yet, if the directory still exists.
+        with self._lock:
+            self._timer = None
+            if self._dirty and self.directory and os.path.isdir(self.directory) and os.getpid() == self._pid:
+                self._flush_locked()
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self._lock:
+            self._check_fork()
+            self._flush_locked()
+
+    def _flush_locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_samples(self._filename(), self._values)
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+    def _lock_directory(self, operation):
+        lock = open(os.path.join(self.directory, 'archive.lock'), 'w')
+        fcntl.flock(lock, operation)
+        return lock
+
+    def _archive(self, filename):
+        """
+        Adds the samples of the file of a process gone to the archive, and removes the file.
+        """
+        with self._lock_directory(fcntl.LOCK_EX):
+            path = os.path.join(self.directory, filename)
+            archive_path = os.path.join(self.directory, ARCHIVE)
+            if not os.path.exists(path):
+                # Archived by another worker meanwhile.
+                return
+            totals = _read_samples(archive_path) if os.path.exists(archive_path) else {}
+            for key, value in _read_samples(path).items():
+                totals[key] = totals.get(key, 0) + value
+            _write_samples(archive_path, totals)
+            os.remove(path)
+
+    def values(self):
+        """
+        Returns the samples summed over all processes writing to the metrics directory, those of
+        the processes gone included.
+        """
+        if not self.directory:
+            with self._lock:
+                return dict(self._values)
+
+        self.flush()
+        for filename in os.listdir(self.directory):
+            pid = filename.split('-', 1)[0]
+            if filename.endswith('.json') and pid.isdigit() and not _process_alive(int(pid)):
+                self._archive(filename)
+        totals = {}
+        # Not while another worker moves samples to the archive.
+        with self._lock_directory(fcntl.LOCK_SH):
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    samples = _read_samples(os.path.join(self.directory, filename))
+                except OSError:
+                    continue
+                for key, value in samples.items():
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    def exposition(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        values = self.values()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for (name, labels), value in sorted(values.items(), key=_sort_key):
+                if metric.owns(name):
+                    lines.append(_format_sample(name, labels, value))
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector(values):
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(_format_sample(name, tuple(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """
+    Base class of the metric types. Labels are passed as keyword arguments.
+    """
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def owns(self, sample_name):
+        return sample_name == self.name
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add([(self.name, self._labels(labels), amount)])
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def owns(self, sample_name):
+        return sample_name in (f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count')
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # Buckets are stored cumulatively, as they are exposed.
+        samples = [(f'{self.name}_bucket', labels + (('le', _format_value(bound)),), 1)
+                   for bound in self.buckets if value <= bound]
+        samples.append((f'{self.name}_sum', labels, value))
+        samples.append((f'{self.name}_count', labels, 1))
+        self.registry.add(samples)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+REQUEST_LATENCY = Histogram(
+    'catalog_request_duration_seconds', 'Request latency by URL name.', ['url_name', 'method'])
+DB_QUERIES = Counter(
+    'catalog_db_queries_total', 'Database queries executed, by URL name.', ['url_name'])
+CACHE_REQUESTS = Counter(
+    'catalog_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result'])
+VIEW_SECTION = Histogram(
+    'catalog_view_section_duration_seconds', 'Time spent in instrumented sections of the views.', ['section'])
+
+
+@REGISTRY.register_collector
+def cache_hit_ratio(values):
+    """
+    Hit ratio per cache, computed from the summed cache request counters.
+    """
+    lookups = {}
+    for (name, labels), value in values.items():
+        if name == CACHE_REQUESTS.name:
+            labels = dict(labels)
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            if labels['result'] == 'hit':
+                hits += value
+            lookups[labels['cache']] = (hits, total + value)
+    samples = [((('cache', cache),), hits / total) for cache, (hits, total) in sorted(lookups.items()) if total]
+    yield 'catalog_cache_hit_ratio', 'gauge', 'Ratio of cache lookups that were hits.', samples
+
+
+@REGISTRY.register_collector
+def loans(values):
+    """
+    Active and overdue loans, read from the database by the scraping process.
+    """
+    from django.db.models import Count, Q
+    from catalog.loan_policy import policy
+    from catalog.models import BookInstance
+
+    counts = BookInstance.objects.filter(status__exact='o').alias(overdue=policy.overdue()).aggregate(
+        active=Count('id'),
+        overdue=Count('id', filter=Q(overdue=True)),
+    )
+    yield 'catalog_loans_active', 'gauge', 'Book copies currently on loan.', [((), counts['active'])]
+    yield 'catalog_loans_overdue', 'gauge', 'Book copies on loan past their due date.', [((), counts['overdue'])]
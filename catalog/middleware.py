@@ -0,0 +1,396 @@
+"""
+Middleware used by the catalog application.
+"""
+import cProfile
+import fnmatch
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.template import base as template_base
+from django.utils.cache import patch_vary_headers
+from django.utils.text import slugify
+
+from catalog import loan_events, metrics
+from catalog.ratelimit import RateLimit, client_id
+from catalog.routers import pin_to_primary
+
+try:
+    import brotli
+except ImportError:  # Optional, only gzip is used without it.
+    brotli = None
+
+logger = logging.getLogger('catalog.profiling')
+
+# The profile of the request currently handled by this thread (if sampled).
+_local = threading.local()
+
+
+class RequestProfile:
+    """
+    Timings collected while handling a single request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_sql = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.view_started = None
+        self.view_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper: counts and times every query.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            self.slowest_sql = max(self.slowest_sql, duration)
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+        if self.view_started is not None:
+            # Time spent in Python code of the view (template rendering is reported separately).
+            self.view_time = self.total_time - (self.view_started - self.started) - self.template_time
+
+    def server_timing(self):
+        """
+        Returns the value of the Server-Timing header (durations in milliseconds).
+        """
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries, slowest {self.slowest_sql * 1000:.2f}ms"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'view;dur={self.view_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'slowest_sql_ms': round(self.slowest_sql * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+def _install_template_timer():
+    """
+    Wraps Template.render once so the outermost template render of a profiled request is timed.
+    Nested renders ({% include %} etc.) are already covered by the outermost one.
+    """
+    original_render = template_base.Template.render
+    if getattr(original_render, 'profiled', False):
+        return
+
+    def render(self, context):
+        profile = getattr(_local, 'profile', None)
+        if profile is None or profile.template_depth:
+            return original_render(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.template_depth -= 1
+
+    render.profiled = True
+    template_base.Template.render = render
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in middleware (REQUEST_PROFILING setting) recording the number of queries, SQL, template
+    and view time for a sample of requests. The timings are sent back as a Server-Timing header
+    and logged as a JSON line to the 'catalog.profiling' logger. Requests slower than
+    REQUEST_PROFILING_CPROFILE_THRESHOLD_MS are run under cProfile and dumped to
+    REQUEST_PROFILING_DUMP_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        self.cprofile_threshold = settings.REQUEST_PROFILING_CPROFILE_THRESHOLD_MS
+        self.dump_dir = settings.REQUEST_PROFILING_DUMP_DIR
+        _install_template_timer()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        started = time.time()
+        profile = RequestProfile()
+        profiler = self._start_profiler()
+        _local.profile = profile
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+            if profiler is not None:
+                profiler.disable()
+        profile.finish()
+
+        response['Server-Timing'] = profile.server_timing()
+        # Also a trace of the requests, to replay with `manage.py replay_requests`.
+        user = getattr(request, 'user', None)
+        record = {
+            'time': round(started, 3),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'user': user.get_username() if user is not None and user.is_authenticated else None,
+            'status': response.status_code,
+        }
+        record.update(profile.as_dict())
+        logger.info(json.dumps(record))
+
+        if profiler is not None and profile.total_time * 1000 >= self.cprofile_threshold:
+            self._dump_profile(profiler, request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(_local, 'profile', None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def _start_profiler(self):
+        if not self.cprofile_threshold:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process (e.g. a concurrent request).
+            return None
+        return profiler
+
+    def _dump_profile(self, profiler, request):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        filename = f'{int(time.time() * 1000)}-{os.getpid()}-{request.method}-{slugify(request.path) or "root"}.prof'
+        path = os.path.join(self.dump_dir, filename)
+        profiler.dump_stats(path)
+        logger.info(json.dumps({'method': request.method, 'path': request.path, 'cprofile': path}))
+
+
+class _QueryCounter:
+    """
+    Database execute wrapper counting the queries of a request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency histogram and the number of database queries of each request,
+    labelled by URL name (see catalog.metrics).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        url_name = (match.view_name if match else None) or 'unresolved'
+        metrics.REQUEST_LATENCY.observe(duration, url_name=url_name, method=request.method)
+        if counter.queries:
+            metrics.DB_QUERIES.inc(counter.queries, url_name=url_name)
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Gives read-your-writes consistency when DATABASE_REPLICAS are configured: reads of unsafe
+    requests (POST etc.) go to the primary database, and so do the reads of the following
+    requests of the same client for REPLICA_STICKY_SECONDS (remembered in a cookie, so it works
+    whichever worker answers).
+    """
+    cookie_name = 'primary_db_pin'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = settings.REPLICA_STICKY_SECONDS
+
+    def __call__(self, request):
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        if not unsafe and self.cookie_name not in request.COOKIES:
+            return self.get_response(request)
+
+        with pin_to_primary():
+            response = self.get_response(request)
+        if unsafe and self.sticky_seconds:
+            response.set_cookie(self.cookie_name, '1', max_age=self.sticky_seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+class LoanEventMiddleware:
+    """
+    Buffers the LoanEvent entries recorded while handling a request and writes them with
+    a single bulk_create() at its end (see catalog.loan_events).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with loan_events.buffered():
+            return self.get_response(request)
+
+
+class StaticPreloadMiddleware:
+    """
+    Adds a `Link: <...>; rel=preload` header for the STATIC_PRELOAD assets to HTML pages, so
+    that the browser (or an HTTP/2 proxy sending 103 Early Hints) can start fetching the
+    stylesheets before parsing the page.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_PRELOAD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._header = None
+
+    def header(self):
+        if self._header is None:
+            # The fingerprinted URLs only change on deploy, with a new process.
+            self._header = ', '.join(
+                f'<{staticfiles_storage.url(path)}>; rel=preload; as={kind}'
+                for path, kind in settings.STATIC_PRELOAD)
+        return self._header
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.status_code == 200 and 'Link' not in response
+                and response.get('Content-Type', '').startswith('text/html')):
+            response['Link'] = self.header()
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Answers 429 Too Many Requests to the clients requesting the pages of RATE_LIMITS faster than
+    their limit (see catalog.ratelimit). The limits are keyed by patterns of URL names, e.g.
+    'admin:*_changelist': all the pages matching a pattern share the same buckets.
+    """
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMIT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limits = [(pattern, RateLimit(pattern, rate, burst))
+                       for pattern, (rate, burst) in settings.RATE_LIMITS.items()]
+        self.proxies = settings.RATE_LIMIT_PROXIES
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        for pattern, limit in self.limits:
+            if fnmatch.fnmatchcase(view_name, pattern):
+                retry_after = limit.hit(client_id(request, self.proxies))
+                if retry_after:
+                    response = HttpResponse('Too many requests, please retry later.\n', status=429,
+                                            content_type='text/plain')
+                    response['Retry-After'] = str(retry_after)
+                    return response
+                return None
+        return None
+
+
+_accepts_brotli = re.compile(r'\bbr\b')
+
+# Types worth compressing; images, archives etc. are compressed already.
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        # Flushed for every chunk, so that streamed pages still arrive progressively.
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses the text responses with Brotli, when the client accepts it and the package is
+    installed, or gzip. Responses smaller than COMPRESSION_MIN_LENGTH are sent as they are: they
+    fit in a few packets anyway and compressing them costs more time than it saves. Streamed
+    responses (of unknown length) are always compressed, chunk by chunk.
+    """
+    brotli_quality = 5
+
+    def __init__(self, get_response):
+        if not settings.RESPONSE_COMPRESSION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.min_length = settings.COMPRESSION_MIN_LENGTH
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if (brotli is None or response.has_header('Content-Encoding')
+                or not _accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = _brotli_sequence(response.streaming_content, self.brotli_quality)
+            del response['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_alter_bookinstance_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('borrower', 'Borrower'), ('book', 'Book'), ('due_date', 'Due date'), ('genre', 'Genre')], max_length=10)),
+                ('key', models.CharField(help_text='Id of the borrower, book or genre, or ISO due date', max_length=64)),
+                ('label', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['dimension', 'key', 'status'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='author',
+            options={'ordering': ['last_name'], 'permissions': (('can_mark_returned', 'Create an Author'),)},
+        ),
+        migrations.AlterField(
+            model_name='author',
+            name='date_of_death',
+            field=models.DateField(blank=True, null=True, verbose_name='died'),
+        ),
+        migrations.AddConstraint(
+            model_name='loansummary',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'status'), name='unique_loan_summary_row'),
+        ),
+    ]
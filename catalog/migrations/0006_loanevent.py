@@ -0,0 +1,71 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+PARTITIONED_TABLE_SQL = [
+    'DROP TABLE catalog_loanevent',
+    # The partition key has to be part of the primary key.
+    '''CREATE TABLE catalog_loanevent (
+        id bigserial NOT NULL,
+        created timestamp with time zone NOT NULL,
+        kind varchar(8) NOT NULL,
+        copy_id uuid NOT NULL,
+        due_back date NULL,
+        book_id bigint NULL,
+        borrower_id integer NULL,
+        PRIMARY KEY (id, created)
+    ) PARTITION BY RANGE (created)''',
+    'CREATE INDEX loanevent_created_idx ON catalog_loanevent (created)',
+    'CREATE INDEX loanevent_book_created_idx ON catalog_loanevent (book_id, created)',
+    # Catches the rows of months without a partition (see `manage.py loan_event_partitions`).
+    'CREATE TABLE catalog_loanevent_default PARTITION OF catalog_loanevent DEFAULT',
+]
+
+
+def partition_by_month(apps, schema_editor):
+    """
+    On PostgreSQL (11+) the log is a table partitioned by range of `created`, one partition per month.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in PARTITIONED_TABLE_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0005_loansummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('kind', models.CharField(choices=[('checkout', 'Checkout'), ('return', 'Return'), ('renew', 'Renewal')], max_length=8)),
+                ('copy_id', models.UUIDField(help_text='Id of the BookInstance')),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('book', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+                ('borrower', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['created'], name='loanevent_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['book', 'created'], name='loanevent_book_created_idx'),
+        ),
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
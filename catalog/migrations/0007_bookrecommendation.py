@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_loanevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.PositiveIntegerField(help_text='Number of readers who borrowed both books')),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='catalog.book')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.book')),
+            ],
+            options={
+                'ordering': ['book', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookrecommendation',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='unique_book_recommendation_rank'),
+        ),
+    ]
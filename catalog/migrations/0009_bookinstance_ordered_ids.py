@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:36
+
+import catalog.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Only the Python default of BookInstance.id changes: the column and the existing ids (hence the
+    renewal URLs) are kept. The state-only operation avoids the copy of the whole table SQLite
+    would make to alter the primary key.
+    """
+
+    dependencies = [
+        ('catalog', '0008_task'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bookinstance',
+                    name='id',
+                    field=models.UUIDField(default=catalog.ids.new_copy_id, help_text='Unique ID for this particular book across whole library', primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -1,8 +1,9 @@
-from datetime import date
 from django.db import models
 from django.contrib.auth.models import User
-from django.urls import reverse
-import uuid  # Required for unique book instances
+from django.utils import timezone
+
+from catalog.ids import new_copy_id
+from catalog.reversing import url_for
 
 
 # Create your models here.
@@ -57,7 +58,7 @@ class Book(models.Model):
         """
         Returns the url to access a particular book instance.
         """
-        return reverse('book-detail', args=[str(self.id)])
+        return url_for('book-detail', self.id)
 
     def display_genre(self):
         """
@@ -72,7 +73,7 @@ class BookInstance(models.Model):
     """
     Model representing a specific copy of a book (i.e. that can be borrowed from the library).
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Unique ID for this particular book across whole library')
+    id = models.UUIDField(primary_key=True, default=new_copy_id, help_text='Unique ID for this particular book across whole library')
     book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True)
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
@@ -108,9 +109,11 @@ class BookInstance(models.Model):
 
     @property
     def is_overdue(self):
-        if self.due_back and date.today() > self.due_back:
-            return True
-        return False
+        # Annotated on the lists of loans (catalog.loan_policy), else worked out for this copy.
+        if 'overdue' in self.__dict__:
+            return bool(self.overdue)
+        from catalog.loan_policy import policy
+        return policy.is_overdue(self)
 
 class Author(models.Model):
     """
@@ -125,7 +128,7 @@ class Author(models.Model):
         """
         Returns the url to access a particular author instance.
         """
-        return reverse('author-detail', args=[str(self.id)])
+        return url_for('author-detail', self.id)
 
 
     def __str__(self):
@@ -137,3 +140,141 @@ class Author(models.Model):
     class Meta:
         ordering = ['last_name']
         permissions = (('can_mark_returned', 'Create an Author'),)
+
+
+class LoanSummary(models.Model):
+    """
+    Model representing materialized loan aggregates: the number of book copies with a given status
+    per borrower, book, due date and genre. It is maintained incrementally from BookInstance changes
+    (see catalog.signals) and rebuilt by `manage.py refresh_loan_summary --full`.
+    """
+    BORROWER = 'borrower'
+    BOOK = 'book'
+    DUE_DATE = 'due_date'
+    GENRE = 'genre'
+    DIMENSIONS = (
+        (BORROWER, 'Borrower'),
+        (BOOK, 'Book'),
+        (DUE_DATE, 'Due date'),
+        (GENRE, 'Genre'),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSIONS)
+    key = models.CharField(max_length=64, help_text='Id of the borrower, book or genre, or ISO due date')
+    label = models.CharField(max_length=200)
+    status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['dimension', 'key', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'status'], name='unique_loan_summary_row'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_dimension_display()} {self.label}: {self.count} {self.get_status_display()}'
+
+
+class LoanEvent(models.Model):
+    """
+    Model representing an entry of the append-only circulation log: a checkout, return or renewal
+    of a book copy. The entries are buffered and written in bulk at the end of the request
+    (see catalog.loan_events); they are never updated.
+    """
+    CHECKOUT = 'checkout'
+    RETURN = 'return'
+    RENEW = 'renew'
+    KINDS = (
+        (CHECKOUT, 'Checkout'),
+        (RETURN, 'Return'),
+        (RENEW, 'Renewal'),
+    )
+
+    created = models.DateTimeField(default=timezone.now)
+    kind = models.CharField(max_length=8, choices=KINDS)
+    # No foreign key constraints: the history outlives deleted copies, books and users.
+    copy_id = models.UUIDField(help_text='Id of the BookInstance')
+    book = models.ForeignKey('Book', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                             null=True, related_name='+')
+    borrower = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                 null=True, blank=True, related_name='+')
+    due_back = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['created'], name='loanevent_created_idx'),
+            models.Index(fields=['book', 'created'], name='loanevent_book_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('LoanEvent entries are append-only.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.created:%Y-%m-%d %H:%M} {self.get_kind_display()} {self.copy_id}'
+
+
+class BookRecommendation(models.Model):
+    """
+    Model representing one of the top "readers who borrowed this also borrowed" books of a book,
+    precomputed by `manage.py build_recommendations` (see catalog.recommendations).
+    """
+    # Looked up by the (book, rank) unique index.
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField(help_text='Number of readers who borrowed both books')
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_book_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.recommended_id} ({self.score})'
+
+
+class Task(models.Model):
+    """
+    Model representing a job of the background task queue: a call of a function decorated with
+    catalog.taskqueue.task, run by `manage.py run_worker` (see catalog.taskqueue).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200, help_text='Dotted path of the task function')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=7, choices=STATUSES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now, help_text='Not run before this time')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Set on the runs of periodic tasks, so that each run is queued once whatever the number of workers.
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # The workers only look for queued tasks.
+            models.Index(fields=['run_at'], condition=models.Q(status='queued'), name='task_queued_run_at_idx'),
+            models.Index(fields=['status', 'finished'], name='task_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
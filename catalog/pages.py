@@ -0,0 +1,61 @@
+"""
+Cached parts of the pages.
+
+The counts of the home page are cached for settings.INDEX_COUNTS_CACHE_TIMEOUT seconds, and just
+expire. With settings.BOOK_PAGE_CACHE_TIMEOUT, the main part of the book page (details, copies,
+recommendations) is cached rendered, for the staff and for the other users; the rest of the page
+(the sidebar with the user name...) is rendered for every request. The catalog.signals receivers
+drop it when the book, its copies, genres or author change; the recommendations are rebuilt in
+bulk and show up once it expires. A part missing is computed once for all the concurrent
+requests (catalog.coalescing), and `manage.py warm_cache` fills them after a deploy.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from catalog import coalescing
+from catalog.models import Author, Book, BookInstance, Genre
+
+INDEX_COUNTS_KEY = 'catalog:index-counts'
+
+
+def _count():
+    return {
+        'num_books': Book.objects.count(),  # Метод all() применён по умолчанию
+        'num_instances': BookInstance.objects.count(),
+        # Доступные книги (статус = 'а')
+        'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+        'num_authors': Author.objects.count(),
+        'num_genres': Genre.objects.count(),
+    }
+
+
+def index_counts():
+    """
+    Returns the numbers of books, copies, available copies, authors and genres.
+    """
+    if not settings.INDEX_COUNTS_CACHE_TIMEOUT:
+        return _count()
+    return coalescing.get_or_compute(INDEX_COUNTS_KEY, _count, settings.INDEX_COUNTS_CACHE_TIMEOUT,
+                                     name='index-counts')
+
+
+def book_detail_key(book_id, staff):
+    return f'catalog:book-detail:{book_id}:{"staff" if staff else "public"}'
+
+
+def book_detail(book, also_borrowed, is_staff):
+    """
+    Returns the rendered main part of the page of book, as seen by the staff or the other users:
+    it is cached for all of them, so it only knows which.
+    """
+    def render():
+        return render_to_string('catalog/fragments/book_detail.html',
+                                {'book': book, 'also_borrowed': also_borrowed, 'is_staff': is_staff})
+
+    return coalescing.get_or_compute(book_detail_key(book.pk, is_staff), render,
+                                     settings.BOOK_PAGE_CACHE_TIMEOUT, name='book-detail')
+
+
+def invalidate_books(book_ids):
+    cache.delete_many([book_detail_key(book_id, staff) for book_id in book_ids for staff in (False, True)])
@@ -0,0 +1,255 @@
+"""
+Framework of the maintenance commands going over a whole table in parallel (status fixes,
+cleanups, backfills after a migration).
+
+The table is split into primary key ranges: ranges of partition_size ids for integer keys
+(Book, Author), and ranges of UUID prefixes for BookInstance: 16 ** prefix_length ranges of the
+hex digits following the prefix common to all the ids. Random ids have no common prefix and are
+spread evenly; time-ordered ids (catalog.ids) share their first digits, the ranges then split
+the period in which the copies were added. The partitions are processed by a pool of forked
+worker processes, each with its own database connection and in a transaction. Every finished
+partition is recorded in a checkpoint file with the number of rows it changed, so that an
+interrupted run can be resumed with --resume and still call finish() for the rows changed before
+it stopped; the progress and throughput are reported as the partitions finish. The checkpoint
+also keeps the common prefix: a resumed run splits the ids as the interrupted one did, even when
+the rows added since share fewer digits.
+
+A command subclasses ParallelCommand, sets model and implements process(queryset, options),
+which handles the rows of one partition and returns the number of rows processed and changed.
+"""
+import json
+import multiprocessing
+import os
+import statistics
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.utils.module_loading import import_string
+
+# Bounds of a primary key range: lower <= pk < upper, None meaning unbounded.
+Partition = namedtuple('Partition', ['key', 'lower', 'upper'])
+
+
+def int_partitions(model, size, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the partitions of size ids covering the primary keys of model. They are aligned on
+    multiples of size, so their keys stay the same when rows are added or removed.
+    """
+    bounds = model._default_manager.using(using).aggregate(lowest=models.Min('pk'), highest=models.Max('pk'))
+    if bounds['lowest'] is None:
+        return []
+    return [
+        Partition(f'{lower}-{lower + size}', lower, lower + size)
+        for lower in range(bounds['lowest'] // size * size, bounds['highest'] + 1, size)
+    ]
+
+
+def uuid_partitions(prefix_length, common_prefix=''):
+    """
+    Returns the 16 ** prefix_length partitions of the UUIDs by the prefix_length hex digits
+    following common_prefix. The first and last partitions are open-ended, so that together they
+    cover all the UUIDs.
+    """
+    shift = 4 * (32 - len(common_prefix) - prefix_length)
+    base = int(common_prefix, 16) << (shift + 4 * prefix_length) if common_prefix else 0
+    count = 16 ** prefix_length
+    return [
+        Partition(f'{common_prefix}{number:0{prefix_length}x}',
+                  uuid.UUID(int=base + (number << shift)) if number else None,
+                  uuid.UUID(int=base + (number + 1 << shift)) if number + 1 < count else None)
+        for number in range(count)
+    ]
+
+
+def common_prefix(model, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the hex digits shared by all the UUID primary keys of model.
+    """
+    ids = model._default_manager.using(using).order_by('pk').values_list('pk', flat=True)
+    lowest = ids.first()
+    if lowest is None:
+        return ''
+    return os.path.commonprefix([lowest.hex, ids.last().hex])
+
+
+def partition_queryset(model, partition, using=DEFAULT_DB_ALIAS):
+    queryset = model._default_manager.using(using)
+    if partition.lower is not None:
+        queryset = queryset.filter(pk__gte=partition.lower)
+    if partition.upper is not None:
+        queryset = queryset.filter(pk__lt=partition.upper)
+    return queryset
+
+
+class Checkpoint:
+    """
+    The partitions done by a run and the number of rows they changed, saved to a JSON file after
+    each of them.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.partitioning = None
+        # The common UUID prefix the partitions were computed after.
+        self.prefix = None
+        self.done = {}
+        self.changed = 0
+        if resume and path and os.path.exists(path):
+            with open(path) as checkpoint:
+                saved = json.load(checkpoint)
+            self.partitioning = saved['partitioning']
+            self.prefix = saved.get('prefix')
+            self.done = saved['done']
+            self.changed = saved.get('changed', 0)
+
+    def start(self, partitioning, prefix=None):
+        """
+        Sets the partitioning of the run, which must be the one of the run resumed.
+        """
+        if self.partitioning is not None and self.partitioning != partitioning:
+            raise CommandError(f'{self.path} was written with the partitioning {self.partitioning}, '
+                               f'not {partitioning}.')
+        self.partitioning, self.prefix = partitioning, prefix
+
+    def mark_done(self, key, processed, changed, seconds):
+        self.done[key] = [processed, changed, seconds]
+        self.changed += changed
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'partitioning': self.partitioning, 'prefix': self.prefix, 'done': self.done,
+                       'changed': self.changed}, checkpoint)
+        # Atomic: an interrupted run leaves the previous checkpoint.
+        os.replace(temporary, self.path)
+
+
+def _process_partition(command_path, partition, options):
+    command = import_string(command_path)()
+    start = time.perf_counter()
+    queryset = partition_queryset(command.model, partition, options['database'])
+    # A partition interrupted halfway changes nothing: it is done again on resume.
+    with transaction.atomic(using=options['database']):
+        processed, changed = command.process(queryset, options)
+    return partition, processed, changed, time.perf_counter() - start
+
+
+class ParallelCommand(BaseCommand):
+    """
+    Base class of the commands processing the rows of model partition by partition in
+    a pool of processes (see the module documentation).
+    """
+    model = None
+    default_partition_size = 10000
+    default_prefix_length = 2
+
+    def process(self, queryset, options):
+        """
+        Handles the rows of the queryset, one partition of the table; returns the number of
+        rows processed and the number of rows changed. Runs in a worker process.
+        """
+        raise NotImplementedError('subclasses of ParallelCommand must provide a process() method')
+
+    def finish(self, changed, options):
+        """
+        Called once all the partitions are processed, with the number of rows changed, those of
+        the runs resumed included.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Number of worker processes; 0 processes the partitions in this process.')
+        if isinstance(self.model._meta.pk, models.UUIDField):
+            parser.add_argument('--prefix-length', type=int, default=self.default_prefix_length,
+                                help='Hex digits of the UUID prefixes: 16 ** prefix length partitions.')
+        else:
+            parser.add_argument('--partition-size', type=int, default=self.default_partition_size,
+                                help='Number of ids per partition.')
+        parser.add_argument('--checkpoint', help='File recording the partitions done.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the partitions done according to the checkpoint file.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def partitions(self, options, prefix=None):
+        """
+        Returns the partitioning, the common UUID prefix (None for integer keys) and the partitions.
+        The prefix of UUID keys is read from the table unless given, e.g. by the checkpoint resumed.
+        """
+        if 'prefix_length' in options:
+            length = options['prefix_length']
+            if prefix is None:
+                prefix = common_prefix(self.model, options['database'])[:32 - length]
+            partitioning = f'uuid:{length}' + (f' after {prefix}' if prefix else '')
+            return partitioning, prefix, uuid_partitions(length, prefix)
+        size = options['partition_size']
+        return f'int:{size}', None, int_partitions(self.model, size, options['database'])
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError('--resume needs a --checkpoint file.')
+        checkpoint = Checkpoint(options['checkpoint'], options['resume'])
+        partitioning, prefix, partitions = self.partitions(options, checkpoint.prefix)
+        checkpoint.start(partitioning, prefix)
+        todo = [partition for partition in partitions if partition.key not in checkpoint.done]
+        if len(todo) < len(partitions):
+            self.stdout.write(f'Resuming: {len(partitions) - len(todo)} of {len(partitions)} partitions done.')
+
+        # Only the options of the command: stdout etc. can't be sent to the workers.
+        worker_options = {name: value for name, value in options.items() if name not in ('stdout', 'stderr')}
+        start = time.perf_counter()
+        durations, processed, changed = [], 0, 0
+        for number, (partition, rows, rows_changed, seconds) in enumerate(
+                self.run_partitions(todo, worker_options), start=1):
+            checkpoint.mark_done(partition.key, rows, rows_changed, seconds)
+            durations.append(seconds)
+            processed += rows
+            changed += rows_changed
+            self.report_progress(number, len(todo), partition, rows, rows_changed, seconds,
+                                 processed, time.perf_counter() - start)
+
+        elapsed = time.perf_counter() - start
+        self.finish(checkpoint.changed, options)
+        if durations:
+            self.stdout.write(
+                f'Partition times: median {statistics.median(durations):.2f}s, max {max(durations):.2f}s; '
+                f'{sum(durations) / max(elapsed, 1e-9):.1f}x parallel speed-up.')
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} rows processed, {changed} changed in {elapsed:.2f}s '
+            f'({processed / max(elapsed, 1e-9):.0f} rows/s).'))
+
+    def run_partitions(self, partitions, options):
+        """
+        Yields (partition, rows processed, rows changed, seconds) as the partitions finish.
+        """
+        command_path = f'{type(self).__module__}.Command'
+        if options['processes'] <= 0:
+            for partition in partitions:
+                yield _process_partition(command_path, partition, options)
+            return
+        # Each forked worker opens its own database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(options['processes'], mp_context=context) as pool:
+            futures = [pool.submit(_process_partition, command_path, partition, options) for partition in partitions]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            except BaseException:
+                # The finished partitions are in the checkpoint: don't wait for the others.
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def report_progress(self, number, total, partition, rows, changed, seconds, processed, elapsed):
+        if self.verbosity < 1:
+            return
+        rate = processed / max(elapsed, 1e-9)
+        remaining = elapsed / number * (total - number)
+        self.stdout.write(
+            f'[{number}/{total}] {partition.key}: {rows} rows, {changed} changed in {seconds:.2f}s; '
+            f'{rate:.0f} rows/s, about {remaining:.0f}s left')
@@ -0,0 +1,89 @@
+"""
+Slim read models of the list pages.
+
+A list page only prints a few columns of each row, the title and author of a book for example.
+Loading model instances instead fetches all the columns (Book.summary is up to 1000 characters),
+builds an instance with its state and field cache for every row and, for book.author, runs one
+more query per row. A row class names the columns its row template uses, and project() makes a
+queryset fetch only these, following the foreign keys in the same query, as instances of the row
+class: named tuples with __slots__ = (), without a __dict__ per row.
+
+The result is still a queryset: it is filtered, counted, paginated, streamed (catalog.streaming)
+and read by in_bulk() (catalog.bitmaps) as before.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db.models.query import ValuesListIterable
+
+from catalog.reversing import url_for
+
+
+class RowIterable(ValuesListIterable):
+    """
+    Yields the rows of a values_list() queryset as row_class instances.
+    """
+    row_class = None
+
+    def __iter__(self):
+        return map(self.row_class._make, super().__iter__())
+
+
+@lru_cache(maxsize=None)
+def _iterable_class(row_class):
+    return type(f'{row_class.__name__}Iterable', (RowIterable,), {'row_class': row_class})
+
+
+def project(queryset, row_class):
+    """
+    Returns queryset fetching only the row_class.lookups columns, as row_class instances.
+    """
+    queryset = queryset.values_list(*row_class.lookups)
+    # Kept by the clones of the queryset (filter(), slicing, using()...).
+    queryset._iterable_class = _iterable_class(row_class)
+    return queryset
+
+
+class BookRow(namedtuple('BookRow', ['id', 'title', 'author_last_name', 'author_first_name'])):
+    """
+    A book of the book list.
+    """
+    __slots__ = ()
+    lookups = ('id', 'title', 'author__last_name', 'author__first_name')
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def author(self):
+        """
+        The name of the author, as str(author), or None.
+        """
+        if self.author_last_name is None:
+            return None
+        return f'{self.author_last_name}, {self.author_first_name}'
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return url_for('book-detail', self.id)
+
+
+class AuthorRow(namedtuple('AuthorRow', ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'])):
+    """
+    An author of the author list.
+    """
+    __slots__ = ()
+    lookups = ('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death')
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return f'{self.last_name}, {self.first_name}'
+
+    def get_absolute_url(self):
+        return url_for('author-detail', self.id)
@@ -0,0 +1,74 @@
+"""
+Rate limits of the expensive pages, kept in the default cache.
+
+Each client (a user, or an IP address for the anonymous users) has a bucket of burst tokens per
+limit, refilled at rate tokens per second; a request takes one token and is refused when the
+bucket is empty. The tokens taken are counted with atomic cache.add()/incr() in slots of
+burst / rate seconds, those of the previous slot being returned linearly over the current one,
+so the refill is continuous without a read-modify-write of the bucket. The counts are shared by
+the worker processes as far as the cache is: with the default per-process memory cache each
+gunicorn worker limits on its own.
+"""
+import math
+import time
+
+from django.core.cache import cache
+
+
+class RateLimit:
+    """
+    A token bucket of burst tokens refilled at rate tokens per second, per client.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.slot_length = burst / rate
+
+    def key(self, client, slot):
+        return f'catalog:ratelimit:{self.name}:{client}:{slot}'
+
+    def hit(self, client, now=None):
+        """
+        Takes a token from the bucket of client. Returns 0 if there was one, else the number of
+        seconds to wait for the next token.
+        """
+        now = time.time() if now is None else now
+        slot, elapsed = divmod(now, self.slot_length)
+        slot = int(slot)
+        key = self.key(client, slot)
+        # Kept until the end of the next slot, where it is the previous slot.
+        cache.add(key, 0, math.ceil(2 * self.slot_length) + 1)
+        try:
+            taken = cache.incr(key)
+        except ValueError:
+            # Evicted in between: let the request through rather than fail it.
+            return 0
+        previous = cache.get(self.key(client, slot - 1), 0)
+        used = taken + previous * (1 - elapsed / self.slot_length)
+        if used <= self.burst:
+            return 0
+        # A refused request doesn't take a token.
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+        return max(1, math.ceil((used - self.burst) / self.rate))
+
+
+def client_id(request, proxies=0):
+    """
+    Identifies the client of request: the user, else the IP address. Behind proxies (the number
+    of proxies adding themselves to X-Forwarded-For, e.g. 1 for the Heroku router), the address
+    is the one the outermost trusted proxy saw.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    address = request.META.get('REMOTE_ADDR', '')
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        if len(forwarded) >= proxies:
+            address = forwarded[-proxies]
+    return f'ip:{address}'
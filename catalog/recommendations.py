@@ -0,0 +1,76 @@
+"""
+"Readers who borrowed this also borrowed" recommendations.
+
+`manage.py build_recommendations` (run nightly) counts, for every pair of books, the readers who
+borrowed both, and stores the top neighbours of every book in the BookRecommendation table.
+The book detail page then only reads these rows.
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from catalog.models import Book, BookInstance, BookRecommendation, LoanEvent
+
+
+def baskets(using=DEFAULT_DB_ALIAS):
+    """
+    Yields the sorted ids of the books borrowed by each reader: the checkouts of the loan log
+    and the current loans. Only one reader's books are in memory at a time.
+    """
+    # The log keeps the ids of deleted books.
+    book_ids = set(Book.objects.using(using).values_list('id', flat=True))
+    borrowings = []
+    for model, kind in ((LoanEvent, {'kind': LoanEvent.CHECKOUT}), (BookInstance, {})):
+        rows = model.objects.using(using).filter(borrower__isnull=False, book__isnull=False, **kind)
+        borrowings.append(rows.values_list('borrower_id', 'book_id').distinct().order_by('borrower_id', 'book_id'))
+    # Both querysets are sorted by reader: merge them while streaming.
+    merged = heapq.merge(*(queryset.iterator() for queryset in borrowings))
+    for _, rows in groupby(merged, key=lambda row: row[0]):
+        yield sorted({book_id for _, book_id in rows if book_id in book_ids})
+
+
+def co_occurrence(baskets, max_basket=500):
+    """
+    Counts the readers of every pair of books borrowed together: (book_id, other_book_id) -> count,
+    with book_id < other_book_id. Only the pairs that occur are stored (a sparse matrix).
+    The baskets of readers with more than max_basket books are skipped: they would add
+    max_basket ** 2 / 2 pairs each while saying little about any book.
+    """
+    pairs = Counter()
+    for basket in baskets:
+        if 1 < len(basket) <= max_basket:
+            pairs.update(combinations(basket, 2))
+    return pairs
+
+
+def top_neighbours(pairs, top=5):
+    """
+    Returns book_id -> [(other_book_id, count), ...], the top most co-borrowed books of each book
+    (ties broken by the lower id).
+    """
+    neighbours = defaultdict(list)
+    for (book_id, other_id), count in pairs.items():
+        neighbours[book_id].append((other_id, count))
+        neighbours[other_id].append((book_id, count))
+    return {
+        book_id: heapq.nsmallest(top, candidates, key=lambda candidate: (-candidate[1], candidate[0]))
+        for book_id, candidates in neighbours.items()
+    }
+
+
+def build(using=DEFAULT_DB_ALIAS, top=5, max_basket=500):
+    """
+    Recomputes the BookRecommendation table. Returns the number of rows written.
+    """
+    neighbours = top_neighbours(co_occurrence(baskets(using), max_basket), top)
+    rows = [
+        BookRecommendation(book_id=book_id, recommended_id=other_id, rank=rank, score=count)
+        for book_id, others in neighbours.items()
+        for rank, (other_id, count) in enumerate(others, start=1)
+    ]
+    with transaction.atomic(using=using):
+        BookRecommendation.objects.using(using).all().delete()
+        BookRecommendation.objects.using(using).bulk_create(rows, batch_size=1000)
+    return len(rows)
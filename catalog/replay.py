@@ -0,0 +1,179 @@
+"""
+Replay of request traces, to reproduce the load of the site locally.
+
+A trace is a JSON lines file with a request per line, such as the 'catalog.profiling' log of
+RequestProfilingMiddleware: its 'method', 'path' and 'query' string, the name of the 'user', the
+'time' it started (seconds since the epoch, or ISO 8601) and its 'total_ms' (or 'duration_ms')
+duration; the other keys are ignored. The requests are named after the URL name of their view
+(e.g. 'book-detail'), and the latencies compared per route. replay() sends them with the spacing
+of the trace divided by a speed-up factor, from a pool of workers: when all the workers are
+busy, the requests start late (lag) rather than the shape of the load changing.
+"""
+import datetime
+import functools
+import json
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.urls import Resolver404, resolve
+
+UNRESOLVED = '(unresolved)'
+
+Request = namedtuple('Request', ['time', 'method', 'url', 'user', 'status', 'recorded_ms', 'route'])
+Result = namedtuple('Result', ['request', 'status', 'seconds', 'lag'])
+
+
+@functools.lru_cache(maxsize=4096)
+def route(path):
+    """
+    Returns the URL name of the view of path (namespaced, e.g. 'admin:catalog_book_changelist').
+    """
+    try:
+        return resolve(path).view_name
+    except Resolver404:
+        return UNRESOLVED
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def read_trace(path, methods=('GET', 'HEAD')):
+    """
+    Yields the requests of the trace at path, those with other methods skipped (writes can't be
+    replayed without their bodies).
+    """
+    with open(path) as trace:
+        for number, line in enumerate(trace, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f'{path}:{number}: not a JSON object') from None
+            # The profiling log also lists its cProfile dumps.
+            if 'path' not in record or 'cprofile' in record:
+                continue
+            method = record.get('method', 'GET').upper()
+            if method not in methods:
+                continue
+            url = record['path'] + (f"?{record['query']}" if record.get('query') else '')
+            yield Request(
+                time=_timestamp(record.get('time')),
+                method=method,
+                url=url,
+                user=record.get('user'),
+                status=record.get('status'),
+                recorded_ms=record.get('total_ms', record.get('duration_ms')),
+                route=route(record['path']),
+            )
+
+
+def schedule(requests, speedup=1.0):
+    """
+    Returns (seconds from the start, request) pairs, in start order. Without the times of the
+    requests, or with a speed-up of 0, all of them start at once (as fast as the workers go).
+    """
+    requests = list(requests)
+    if not speedup or any(request.time is None for request in requests):
+        return [(0.0, request) for request in requests]
+    requests.sort(key=lambda request: request.time)
+    start = requests[0].time if requests else 0
+    return [((request.time - start) / speedup, request) for request in requests]
+
+
+def replay(requests, send, speedup=1.0, workers=8):
+    """
+    Sends the requests with send(request) -> status, on the schedule of the trace, from workers
+    threads (0 sends them one by one in this thread). Yields a Result per request as they finish.
+    """
+    plan = schedule(requests, speedup)
+    start = time.perf_counter()
+
+    def run(offset, request):
+        began = time.perf_counter()
+        status = send(request)
+        return Result(request, status, time.perf_counter() - began, max(0.0, began - start - offset))
+
+    def wait(offset):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    if workers <= 0:
+        for offset, request in plan:
+            wait(offset)
+            yield run(offset, request)
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        futures = []
+        for offset, request in plan:
+            wait(offset)
+            futures.append(pool.submit(run, offset, request))
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of values (fraction 0.5 for the median).
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values), max(1, math.ceil(fraction * len(values)))) - 1]
+
+
+class RouteStats:
+    """
+    The replayed and recorded latencies (ms) of the requests of a route.
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.replayed = []
+        self.recorded = []
+        self.errors = 0
+        self.status_changes = 0
+        self.lag = 0.0
+
+    def add(self, result):
+        self.replayed.append(result.seconds * 1000)
+        if result.request.recorded_ms is not None:
+            self.recorded.append(result.request.recorded_ms)
+        if not isinstance(result.status, int) or result.status >= 500:
+            self.errors += 1
+        elif result.request.status is not None and result.status != result.request.status:
+            self.status_changes += 1
+        self.lag = max(self.lag, result.lag)
+
+    @property
+    def count(self):
+        return len(self.replayed)
+
+    def ratio(self):
+        """
+        The replayed median latency over the recorded one.
+        """
+        if not self.recorded or not percentile(self.recorded, 0.5):
+            return None
+        return percentile(self.replayed, 0.5) / percentile(self.recorded, 0.5)
+
+
+def summarize(results):
+    """
+    Returns the RouteStats of results, the routes taking the most time first.
+    """
+    routes = {}
+    for result in results:
+        stats = routes.get(result.request.route)
+        if stats is None:
+            stats = routes[result.request.route] = RouteStats(result.request.route)
+        stats.add(result)
+    return sorted(routes.values(), key=lambda stats: sum(stats.replayed), reverse=True)
+
@@ -0,0 +1,59 @@
+"""
+Cached URL reversing for the per-row links of the list templates and get_absolute_url().
+
+reverse() walks the URL resolver and matches the arguments against the pattern on every call.
+url_for() reverses a URL name once (per urlconf and script prefix) with placeholder arguments,
+keeps the strings around them, and afterwards only joins strings. Only int and UUID arguments
+take the fast path, other arguments go through reverse().
+"""
+import functools
+import uuid
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+_PLACEHOLDERS = {
+    int: 918273645,
+    uuid.UUID: uuid.UUID('91827364-5918-4273-8645-918273645918'),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _url_pieces(name, kinds, script_prefix, urlconf):
+    """
+    Returns the URL of name split around its arguments (of the types kinds), or None when
+    a placeholder can't be found exactly once.
+    """
+    placeholders = [str(_PLACEHOLDERS[kind]) for kind in kinds]
+    rest = reverse(name, args=[_PLACEHOLDERS[kind] for kind in kinds], urlconf=urlconf)
+    pieces = []
+    for placeholder in placeholders:
+        head, found, rest = rest.partition(placeholder)
+        if not found or placeholder in rest or any(placeholder in piece for piece in pieces):
+            return None
+        pieces.append(head)
+    pieces.append(rest)
+    return tuple(pieces)
+
+
+def url_for(name, *args):
+    """
+    Same as reverse(name, args=args).
+    """
+    kinds = tuple(type(arg) for arg in args)
+    if all(kind in _PLACEHOLDERS for kind in kinds) and all(arg >= 0 for arg in args if type(arg) is int):
+        pieces = _url_pieces(name, kinds, get_script_prefix(), get_urlconf())
+        if pieces is not None:
+            url = [pieces[0]]
+            for arg, piece in zip(args, pieces[1:]):
+                url.append(str(arg))
+                url.append(piece)
+            return ''.join(url)
+    return reverse(name, args=args)
+
+
+@receiver(setting_changed)
+def clear_url_pieces(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        _url_pieces.cache_clear()
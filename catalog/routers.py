@@ -0,0 +1,85 @@
+"""
+Database router sending catalog reads to the read replicas (DATABASE_REPLICAS) and all writes to
+the primary database.
+
+Reads are pinned to the primary inside views that change loans or catalog entries (see
+primary_database and PrimaryDatabaseMixin) and, by catalog.middleware.ReplicaPinningMiddleware,
+during unsafe requests and for REPLICA_STICKY_SECONDS after them, so users read their own writes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARY_DATABASE = DEFAULT_DB_ALIAS
+
+# Apps whose reads may be served by the replicas; sessions, auth etc. always use the primary.
+REPLICATED_APPS = {'catalog'}
+
+_pinned = ContextVar('catalog_primary_pinned', default=False)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def pin_to_primary():
+    """
+    Sends all reads of the block to the primary database.
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def primary_database(view_func):
+    """
+    Decorator for views whose reads must see the latest writes (reads go to the primary).
+    """
+    @wraps(view_func)
+    def wrapped_view(*args, **kwargs):
+        with pin_to_primary():
+            return view_func(*args, **kwargs)
+    return wrapped_view
+
+
+class PrimaryDatabaseMixin:
+    """
+    Class-based view mixin pinning all reads of the view to the primary database.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with pin_to_primary():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Routes reads of the catalog models to a random replica unless pinned to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned() or model._meta.app_label not in REPLICATED_APPS:
+            return PRIMARY_DATABASE
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects are read from the database their instance came from.
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,260 @@
+"""
+Signal receivers of the catalog application.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from catalog import autocomplete, bitmaps, loan_events, loan_policy, pages
+from catalog.loan_summary import apply_deltas, contributions, diff, genre_ids
+from catalog.models import Author, Book, BookInstance, Genre, Language, LoanSummary
+
+
+# The state of a book copy before a save, for the loan log and the LoanSummary deltas.
+
+@receiver(pre_save, sender=BookInstance)
+def remember_previous_copy_state(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    previous = None
+    if not instance._state.adding:
+        previous = BookInstance.objects.using(using).filter(pk=instance.pk).values(
+            'book_id', 'borrower_id', 'status', 'due_back').first()
+    instance._previous_loan_state = previous
+
+
+@receiver(post_save, sender=BookInstance)
+def log_loan_events(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    events = loan_events.changes(getattr(instance, '_previous_loan_state', None), instance)
+    if events:
+        transaction.on_commit(lambda: loan_events.record(events, using), using=using)
+
+
+# LoanSummary maintenance (see catalog.loan_summary).
+
+@receiver(post_save, sender=BookInstance)
+def update_summary_on_copy_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    genres = genre_ids(instance.book_id, using)
+    new_rows = contributions(instance.book_id, instance.borrower_id, instance.status, instance.due_back, genres)
+    old_rows = []
+    previous = getattr(instance, '_previous_loan_state', None)
+    if previous:
+        if previous['book_id'] != instance.book_id:
+            genres = genre_ids(previous['book_id'], using)
+        old_rows = contributions(genre_ids=genres, **previous)
+    apply_deltas(diff(old_rows, new_rows), using)
+
+
+@receiver(post_delete, sender=BookInstance)
+def update_summary_on_copy_delete(sender, instance, using=None, **kwargs):
+    old_rows = contributions(instance.book_id, instance.borrower_id, instance.status, instance.due_back,
+                              genre_ids(instance.book_id, using))
+    apply_deltas(diff(old_rows, []), using)
+
+
+def _copies_by_status(using, **filters):
+    return BookInstance.objects.using(using).filter(**filters).values('status').annotate(copies=Count('id'))
+
+
+@receiver(m2m_changed, sender=Book._meta.get_field('genre').remote_field.through)
+def genre_links_changed(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action == 'pre_clear':
+        # The cleared genres are not known any more after the clear.
+        if reverse:
+            instance._cleared_genre_links = set(instance.book_set.using(using).values_list('pk', flat=True))
+        else:
+            instance._cleared_genre_links = set(instance.genre.using(using).values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = instance._cleared_genre_links
+    if reverse:
+        # genre.book_set.add(...): instance is the genre, pk_set the books.
+        pairs = [(book_id, instance.pk) for book_id in pk_set]
+    else:
+        pairs = [(instance.pk, genre_id) for genre_id in pk_set]
+
+    update_summary_on_genre_links(pairs, 1 if action == 'post_add' else -1, using)
+    _update_bitmap_index(using, bitmaps.index.update_genres, pairs, action == 'post_add')
+
+
+def update_summary_on_genre_links(pairs, sign, using):
+    deltas = defaultdict(int)
+    for book_id, genre_id in pairs:
+        for row in _copies_by_status(using, book_id=book_id):
+            deltas[(LoanSummary.GENRE, str(genre_id), row['status'])] += sign * row['copies']
+    apply_deltas(deltas, using)
+
+
+@receiver(pre_delete, sender=Book)
+def update_summary_on_book_delete(sender, instance, using=None, **kwargs):
+    # The copies of the book are detached by an UPDATE (on_delete=SET_NULL) sending no signal.
+    deltas = defaultdict(int)
+    genres = genre_ids(instance.pk, using)
+    for row in _copies_by_status(using, book=instance):
+        deltas[(LoanSummary.BOOK, str(instance.pk), row['status'])] -= row['copies']
+        for genre_id in genres:
+            deltas[(LoanSummary.GENRE, str(genre_id), row['status'])] -= row['copies']
+    apply_deltas(deltas, using)
+
+
+@receiver(pre_delete, sender=User)
+def update_summary_on_borrower_delete(sender, instance, using=None, **kwargs):
+    LoanSummary.objects.using(using).filter(dimension=LoanSummary.BORROWER, key=str(instance.pk)).delete()
+
+
+@receiver(pre_delete, sender=Genre)
+def update_summary_on_genre_delete(sender, instance, using=None, **kwargs):
+    LoanSummary.objects.using(using).filter(dimension=LoanSummary.GENRE, key=str(instance.pk)).delete()
+
+
+@receiver(post_save, sender=Book)
+def update_summary_book_label(sender, instance, created, raw=False, using=None, **kwargs):
+    if not created and not raw:
+        LoanSummary.objects.using(using).filter(
+            dimension=LoanSummary.BOOK, key=str(instance.pk)).exclude(label=instance.title).update(label=instance.title)
+
+
+@receiver(post_save, sender=Genre)
+def update_summary_genre_label(sender, instance, created, raw=False, using=None, **kwargs):
+    if not created and not raw:
+        LoanSummary.objects.using(using).filter(
+            dimension=LoanSummary.GENRE, key=str(instance.pk)).exclude(label=instance.name).update(label=instance.name)
+
+
+# Bitmap index maintenance (see catalog.bitmaps), once the changes are committed.
+
+def _update_bitmap_index(using, update, *args):
+    if settings.BITMAP_INDEX:
+        transaction.on_commit(lambda: update(*args), using=using)
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def update_bitmap_availability(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    book_ids = {instance.book_id}
+    previous = getattr(instance, '_previous_loan_state', None)
+    if previous and kwargs.get('signal') is post_save:
+        book_ids.add(previous['book_id'])
+    for book_id in book_ids - {None}:
+        _update_bitmap_index(using, bitmaps.index.update_availability, book_id, using)
+
+
+@receiver(pre_save, sender=Book)
+def remember_previous_language(sender, instance, raw=False, using=None, **kwargs):
+    if settings.BITMAP_INDEX and not raw and not instance._state.adding:
+        instance._previous_language_id = Book.objects.using(using).filter(pk=instance.pk).values_list(
+            'language_id', flat=True).first()
+
+
+@receiver(post_save, sender=Book)
+def update_bitmap_book(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        _update_bitmap_index(using, bitmaps.index.update_book, instance.pk, instance.language_id,
+                             getattr(instance, '_previous_language_id', None))
+
+
+@receiver(post_delete, sender=Book)
+def update_bitmap_book_delete(sender, instance, using=None, **kwargs):
+    _update_bitmap_index(using, bitmaps.index.remove_book, instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def update_bitmap_name(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        _update_bitmap_index(using, bitmaps.index.update_name, sender, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def update_bitmap_name_delete(sender, instance, using=None, **kwargs):
+    _update_bitmap_index(using, bitmaps.index.update_name, sender, instance.pk, None)
+
+
+# Autocomplete indexes maintenance (see catalog.autocomplete), once the changes are committed.
+
+def _update_autocomplete(using, kind, pk, label=None):
+    transaction.on_commit(lambda: autocomplete.index.update(kind, pk, label), using=using)
+
+
+@receiver(post_save, sender=Book)
+def update_autocomplete_book(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        _update_autocomplete(using, 'books', instance.pk, instance.title)
+
+
+@receiver(post_save, sender=Author)
+def update_autocomplete_author(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        _update_autocomplete(using, 'authors', instance.pk, str(instance))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def update_autocomplete_delete(sender, instance, using=None, **kwargs):
+    _update_autocomplete(using, 'books' if sender is Book else 'authors', instance.pk)
+
+
+# Cached book pages (see catalog.pages), dropped once the changes are committed.
+
+def _invalidate_book_pages(using, book_ids):
+    book_ids = set(book_ids) - {None}
+    if settings.BOOK_PAGE_CACHE_TIMEOUT and book_ids:
+        transaction.on_commit(lambda: pages.invalidate_books(book_ids), using=using)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_page(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        _invalidate_book_pages(using, [instance.pk])
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_book_page_of_copy(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_previous_loan_state', None) or {}
+        _invalidate_book_pages(using, [instance.book_id, previous.get('book_id')])
+
+
+@receiver(m2m_changed, sender=Book._meta.get_field('genre').remote_field.through)
+def invalidate_book_page_genres(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _invalidate_book_pages(using, [instance.pk])
+    else:
+        _invalidate_book_pages(using, pk_set or getattr(instance, '_cleared_genre_links', ()))
+
+
+@receiver(post_save, sender=Author)
+def invalidate_book_pages_of_author(sender, instance, created, raw=False, using=None, **kwargs):
+    if settings.BOOK_PAGE_CACHE_TIMEOUT and not created and not raw:
+        _invalidate_book_pages(using, instance.book_set.using(using).values_list('pk', flat=True))
+
+
+# Loan policy (see catalog.loan_policy): its rules name genres, languages and groups.
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+@receiver(post_delete, sender=Group)
+def invalidate_loan_policy(sender, instance, raw=False, using=None, **kwargs):
+    if settings.LOAN_POLICY.get('rules') and not raw:
+        transaction.on_commit(loan_policy.policy.invalidate, using=using)
@@ -0,0 +1,153 @@
+"""
+Slow query log.
+
+When SLOW_QUERY_THRESHOLD_MS is set, every database connection gets an execute wrapper (installed
+from CatalogConfig.ready()) that appends queries slower than the threshold to SLOW_QUERY_LOG as
+JSON lines: the normalized SQL fingerprint, the call stack into catalog code, the templates being
+rendered and the EXPLAIN plan. `manage.py slow_queries` reports them grouped by fingerprint.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+CATALOG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_local = threading.local()
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Normalizes an SQL statement so queries differing only in their parameters group together.
+    """
+    sql = sql.replace('%s', '?')
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def catalog_stack():
+    """
+    Returns the call stack restricted to the catalog code (outermost call first).
+    """
+    stack = []
+    for frame in traceback.extract_stack():
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(CATALOG_DIR) and filename != os.path.abspath(__file__):
+            stack.append(f'{os.path.relpath(filename, os.path.dirname(CATALOG_DIR))}:{frame.lineno} in {frame.name}')
+    return stack
+
+
+def rendering_templates():
+    """
+    Returns the names of the templates being rendered (outermost first), found in the call stack.
+    """
+    names = []
+    frame = sys._getframe()
+    while frame is not None:
+        if frame.f_code.co_name in ('render', '_render'):
+            template = frame.f_locals.get('self')
+            if isinstance(template, Template) and template.name and template.name not in names:
+                names.append(template.name)
+        frame = frame.f_back
+    return names[::-1]
+
+
+def explain(connection, sql, params):
+    """
+    Returns the query plan of a SELECT statement as a list of lines.
+    """
+    prefix = connection.ops.explain_query_prefix()
+    _local.explaining = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN failed: {error}']
+    finally:
+        _local.explaining = False
+
+
+class SlowQueryLog:
+    """
+    Database execute wrapper appending queries slower than the threshold to the log file.
+    """
+
+    def __init__(self, threshold_ms, path, explain=True):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.explain = explain
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            self.record(context['connection'], sql, params, many, duration)
+        return result
+
+    def record(self, connection, sql, params, many, duration):
+        entry = {
+            'time': time.time(),
+            'alias': connection.alias,
+            'duration_ms': round(duration * 1000, 3),
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'stack': catalog_stack(),
+            'templates': rendering_templates(),
+            'plan': [],
+        }
+        if self.explain and not many and sql.lstrip()[:6].upper() == 'SELECT':
+            entry['plan'] = explain(connection, sql, params)
+        line = json.dumps(entry, default=str) + '\n'
+        # A single write in append mode, so concurrent workers do not interleave lines.
+        with open(self.path, 'a') as fp:
+            fp.write(line)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """
+    connection_created receiver adding the slow query wrapper to a new connection.
+    """
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if not threshold:
+        return
+    if any(isinstance(wrapper, SlowQueryLog) for wrapper in connection.execute_wrappers):
+        return
+    # Inserted first: the execute_wrapper() context managers of the request pop the last wrapper.
+    connection.execute_wrappers.insert(
+        0, SlowQueryLog(threshold, settings.SLOW_QUERY_LOG, settings.SLOW_QUERY_EXPLAIN))
+
+
+def install():
+    connection_created.connect(install_wrapper, dispatch_uid='catalog.slow_queries')
+
+
+def read_log(path):
+    """
+    Yields the entries of a slow query log file.
+    """
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
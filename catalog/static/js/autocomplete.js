@@ -0,0 +1,47 @@
+// Typeahead of the inputs with a data-autocomplete-url attribute (catalog/forms.py widgets):
+// fills their datalist from /catalog/autocomplete/ and, for the selects, stores the id of the
+// chosen suggestion in the hidden input named by data-autocomplete-target.
+(function () {
+    'use strict';
+
+    function attach(input) {
+        var list = document.getElementById(input.getAttribute('list'));
+        var target = document.getElementById(input.dataset.autocompleteTarget);
+        var timer = null;
+        var ids = {};
+
+        function select() {
+            if (target) {
+                target.value = ids.hasOwnProperty(input.value) ? ids[input.value] : '';
+            }
+        }
+
+        function suggest() {
+            var url = input.dataset.autocompleteUrl + '?kind=' + encodeURIComponent(input.dataset.autocompleteKind) +
+                '&q=' + encodeURIComponent(input.value);
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    list.innerHTML = '';
+                    ids = {};
+                    data.results.forEach(function (result) {
+                        var option = document.createElement('option');
+                        option.value = result.text;
+                        ids[result.text] = result.id;
+                        list.appendChild(option);
+                    });
+                    select();
+                });
+        }
+
+        input.addEventListener('input', function () {
+            select();
+            clearTimeout(timer);
+            timer = setTimeout(suggest, 100);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('input[data-autocomplete-url]').forEach(attach);
+    });
+})();
@@ -0,0 +1,89 @@
+"""
+Streamed rendering of the list pages, enabled by settings.STREAMING_LISTS.
+
+The page is rendered once with a placeholder instead of its rows, and sent as a
+StreamingHttpResponse: the part before the placeholder (header, sidebar, filters) goes out
+first, then the rows, rendered from the view's row_template_name and fetched from the database
+in chunks of stream_chunk_size, then the rest of the page. The browser starts loading the
+stylesheets and drawing the page while the rows are still being read.
+
+Once the first chunk is sent the status can't change any more: an error in a row template
+truncates the page instead of showing the error page.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.template import loader
+from django.template.context import make_context
+from django.utils.safestring import mark_safe
+
+# Unlikely to appear in a rendered page; the template prints it where the rows go.
+ROWS_PLACEHOLDER = mark_safe('<!--streamed-rows-5b0f1d9e-->')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingListMixin:
+    """
+    ListView mixin streaming the rows of the page when settings.STREAMING_LISTS is on.
+
+    The list template includes row_template_name in its loop, and prints streamed_rows (when
+    set) instead of the loop; row_context_name is the name of the loop variable.
+    """
+    row_template_name = None
+    row_context_name = 'object'
+    stream_chunk_size = 100
+
+    def streaming(self):
+        return settings.STREAMING_LISTS and self.row_template_name is not None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.streaming():
+            page = context['page_obj']
+            has_rows = page.paginator.count if page is not None else bool(context['object_list'])
+            # The rows themselves are only read while the response is sent.
+            context['streamed_rows'] = ROWS_PLACEHOLDER if has_rows else ''
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.streaming():
+            return super().render_to_response(context, **response_kwargs)
+        template = loader.select_template(self.get_template_names())
+        # Rendered now, so errors outside the rows still give a proper error page.
+        head, _, tail = template.render(context, self.request).partition(ROWS_PLACEHOLDER)
+        response_kwargs.setdefault('content_type', self.content_type)
+        return StreamingHttpResponse(self._stream(head, tail, context), **response_kwargs)
+
+    def _rows(self, object_list):
+        if isinstance(object_list, QuerySet):
+            # Bind the database now: the rows are read after the view (and e.g. the primary
+            # database pinning of catalog.middleware.ReplicaPinningMiddleware) has returned.
+            object_list = object_list.using(object_list.db)
+            if not object_list._prefetch_related_lookups:
+                return object_list.iterator(chunk_size=self.stream_chunk_size)
+        return object_list
+
+    def _stream(self, head, tail, context):
+        yield head
+        if context.get('streamed_rows'):
+            row_template = loader.get_template(self.row_template_name).template
+            row_context = make_context(context, self.request)
+            # Bound once: the context processors run once, not for every row.
+            with row_context.bind_template(row_template):
+                for chunk in _chunks(self._rows(context['object_list']), self.stream_chunk_size):
+                    parts = []
+                    for row in chunk:
+                        with row_context.push(**{self.row_context_name: row}):
+                            parts.append(row_template.render(row_context))
+                    yield ''.join(parts)
+        yield tail
@@ -0,0 +1,180 @@
+"""
+Background task queue kept in the database (the Task table), without a separate broker.
+
+Functions decorated with @task are queued with func.enqueue(*args, **kwargs) (the arguments must
+be JSON serializable) and run by `manage.py run_worker`. A task is queued in the transaction of
+the caller: the workers only see it once it is committed, and never if it is rolled back.
+
+The workers claim the tasks with SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, so they never
+wait on each other; on other databases a conditional UPDATE makes sure that a task is claimed
+once. Failed tasks are retried with an exponential backoff, up to max_attempts times. The
+periodic tasks of settings.TASK_SCHEDULE are queued by the worker once per period.
+"""
+import datetime
+import logging
+import os
+import random
+import socket
+import traceback
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from catalog.models import Task
+
+logger = logging.getLogger('catalog.tasks')
+
+# Upper bound of the delay between two attempts, in seconds.
+MAX_RETRY_DELAY = 60 * 60
+
+
+def task(func=None, *, max_attempts=5, retry_delay=30):
+    """
+    Decorator making a module-level function a task, queued with func.enqueue(*args, **kwargs).
+    A failed task is run again after retry_delay seconds, doubled after every attempt.
+    """
+    def decorate(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        func.retry_delay = retry_delay
+        func.enqueue = lambda *args, **kwargs: enqueue(func, args, kwargs)
+        return func
+    return decorate if func is None else decorate(func)
+
+
+def enqueue(func, args=(), kwargs=None, run_at=None, using=DEFAULT_DB_ALIAS):
+    """
+    Queues a call of the task func, to run as soon as possible or from run_at on.
+    """
+    return Task.objects.using(using).create(
+        name=func.task_name, args=list(args), kwargs=kwargs or {}, run_at=run_at or timezone.now(),
+        max_attempts=func.max_attempts)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, using=DEFAULT_DB_ALIAS):
+    """
+    Marks the next task due as running by worker and returns it, or None if there is none.
+    """
+    now = timezone.now()
+    due = Task.objects.using(using).filter(status=Task.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    mark_running = {'status': Task.RUNNING, 'locked_by': worker, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            pk = due.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            Task.objects.using(using).filter(pk=pk).update(**mark_running)
+        return Task.objects.using(using).get(pk=pk)
+    # No transaction (SQLite can't upgrade a read to a write lock while another process writes):
+    # the workers may race for the same rows and the loser tries the next one.
+    for pk in due.values_list('pk', flat=True)[:5]:
+        if Task.objects.using(using).filter(pk=pk, status=Task.QUEUED).update(**mark_running):
+            return Task.objects.using(using).get(pk=pk)
+    return None
+
+
+def retry_delay(func, attempts):
+    """
+    Returns the delay before the next attempt of a task failed attempts times, with some jitter
+    so that tasks failing together (e.g. while the mail server is down) are not retried together.
+    """
+    delay = min(getattr(func, 'retry_delay', 30) * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run(task, using=DEFAULT_DB_ALIAS):
+    """
+    Runs a claimed task and records the outcome. Returns True if it succeeded. The outcome is
+    dropped if the claim was lost meanwhile: requeue_stale() gave up on this attempt.
+    """
+    # The attempt number tells the claims apart: a stale run must not finish the next attempt.
+    tasks = Task.objects.using(using).filter(pk=task.pk, status=Task.RUNNING, attempts=task.attempts)
+    func = None
+    try:
+        func = import_string(task.name)
+        if not hasattr(func, 'enqueue'):
+            # Only the functions decorated with @task can be run from the table.
+            raise ImportError(f'{task.name} is not a task.')
+        func(*task.args, **task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if func is not None and hasattr(func, 'enqueue') and task.attempts < task.max_attempts:
+            logger.warning('Task %s (%s) failed, attempt %d of %d', task.pk, task.name, task.attempts,
+                           task.max_attempts, exc_info=True)
+            recorded = tasks.update(status=Task.QUEUED, run_at=now + retry_delay(func, task.attempts), locked_by='',
+                                    locked_at=None, last_error=error)
+        else:
+            logger.error('Task %s (%s) failed', task.pk, task.name, exc_info=True)
+            recorded = tasks.update(status=Task.FAILED, finished=now, last_error=error)
+        if not recorded:
+            logger.warning('Task %s (%s) attempt %d was given up, failure dropped', task.pk, task.name, task.attempts)
+        return False
+    if not tasks.update(status=Task.DONE, finished=timezone.now()):
+        logger.warning('Task %s (%s) attempt %d was given up, result dropped', task.pk, task.name, task.attempts)
+        return False
+    return True
+
+
+def run_next(worker, using=DEFAULT_DB_ALIAS):
+    """
+    Claims and runs the next task due. Returns None if there was none, else whether it succeeded.
+    """
+    task = claim(worker, using)
+    if task is None:
+        return None
+    return run(task, using)
+
+
+def schedule(now=None, using=DEFAULT_DB_ALIAS):
+    """
+    Queues the current run of every periodic task of settings.TASK_SCHEDULE, unless already queued.
+    The periods start at multiples of their length since the epoch (midnight UTC for a day).
+    Returns the number of tasks queued.
+    """
+    now = now or timezone.now()
+    runs = []
+    for name, entry in settings.TASK_SCHEDULE.items():
+        func = import_string(entry['task'])
+        period = int(now.timestamp() // entry['every'])
+        runs.append(Task(
+            name=func.task_name, args=list(entry.get('args', ())), kwargs=entry.get('kwargs', {}),
+            max_attempts=func.max_attempts, key=f'{name}:{period}',
+            run_at=datetime.datetime.fromtimestamp(period * entry['every'], tz=datetime.timezone.utc)))
+    if not runs:
+        return 0
+    keys = [run.key for run in runs]
+    existing = Task.objects.using(using).filter(key__in=keys).count()
+    # The unique key makes concurrent workers queue each run once.
+    Task.objects.using(using).bulk_create(runs, ignore_conflicts=True)
+    return Task.objects.using(using).filter(key__in=keys).count() - existing
+
+
+def requeue_stale(timeout, using=DEFAULT_DB_ALIAS):
+    """
+    Queues again the tasks running for longer than timeout (a timedelta), whose worker is
+    presumably dead, or marks them failed if they have no attempts left. Returns their number.
+    Should the worker finish after all, run() drops its outcome.
+    """
+    now = timezone.now()
+    stale = Task.objects.using(using).filter(status=Task.RUNNING, locked_at__lt=now - timeout)
+    error = f'Worker did not finish the task within {timeout}.'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(status=Task.FAILED, finished=now, last_error=error)
+    requeued = stale.update(status=Task.QUEUED, run_at=now, locked_by='', locked_at=None, last_error=error)
+    return failed + requeued
+
+
+def purge(older_than, using=DEFAULT_DB_ALIAS):
+    """
+    Deletes the tasks done more than older_than (a timedelta) ago. Failed tasks are kept.
+    """
+    deleted, _ = Task.objects.using(using).filter(
+        status=Task.DONE, finished__lt=timezone.now() - older_than).delete()
+    return deleted
@@ -0,0 +1,41 @@
+"""
+Background tasks of the catalog, run by `manage.py run_worker` (see catalog.taskqueue).
+"""
+from itertools import groupby
+
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from catalog import loan_policy, loan_summary, recommendations
+from catalog.models import BookInstance
+from catalog.taskqueue import task
+
+
+@task
+def refresh_loan_summary(full=False):
+    loan_summary.refresh(full=full)
+
+
+@task(max_attempts=2, retry_delay=600)
+def build_recommendations(top=5, max_basket=500):
+    recommendations.build(top=top, max_basket=max_basket)
+
+
+@task
+def send_overdue_notices():
+    """
+    Sends one email per borrower listing the copies they should have returned.
+    With the queued email backend every message is then a task of its own.
+    """
+    overdue = BookInstance.objects.alias(overdue=loan_policy.policy.overdue()).filter(
+        status__exact='o', overdue=True, borrower__isnull=False,
+    ).exclude(borrower__email='').select_related('book', 'borrower').order_by('borrower_id', 'due_back')
+    messages = []
+    for _, copies in groupby(overdue.iterator(), key=lambda bookinst: bookinst.borrower_id):
+        copies = list(copies)
+        borrower = copies[0].borrower
+        body = render_to_string('catalog/email/overdue_notice.txt', {'borrower': borrower, 'copies': copies})
+        messages.append(EmailMessage('Overdue books', body, to=[borrower.email]))
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
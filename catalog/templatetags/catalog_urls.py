@@ -0,0 +1,13 @@
+from django import template
+
+from catalog import reversing
+
+register = template.Library()
+
+
+@register.simple_tag
+def url_for(name, *args):
+    """
+    Like {% url name arg ... %} with positional arguments, cached (see catalog.reversing).
+    """
+    return reversing.url_for(name, *args)
@@ -0,0 +1,129 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from catalog import autocomplete
+from catalog.forms import BookForm
+from catalog.models import Author, Book
+from catalog.tests.utils import plain_static_files
+
+
+class PrefixIndexTest(SimpleTestCase):
+
+    def test_search_by_prefix_of_any_word(self):
+        index = autocomplete.PrefixIndex(every_word=True)
+        index.load([(1, 'The Count of Monte Cristo'), (2, 'Monte  Carlo'), (3, 'Counting Stars')])
+        self.assertEqual(index.search('monte'), [(2, 'Monte  Carlo'), (1, 'The Count of Monte Cristo')])
+        self.assertEqual(index.search('COUNT'), [(1, 'The Count of Monte Cristo'), (3, 'Counting Stars')])
+        self.assertEqual(index.search('count', limit=1), [(1, 'The Count of Monte Cristo')])
+        self.assertEqual(index.search('monte carlo'), [(2, 'Monte  Carlo')])
+        self.assertEqual(index.search(' '), [])
+
+    def test_incremental_updates(self):
+        index = autocomplete.PrefixIndex()
+        index.load([(1, 'Smith, John')])
+        index.add(2, 'Smyth, Jane')
+        self.assertEqual([pk for pk, _ in index.search('sm')], [1, 2])
+        index.add(1, 'Doe, John')  # Renamed.
+        self.assertEqual(index.search('sm'), [(2, 'Smyth, Jane')])
+        index.remove(2)
+        self.assertEqual(index.search('sm'), [])
+        self.assertEqual(list(index.items()), [(1, 'Doe, John')])
+
+    def test_changes_merged_into_the_arrays(self):
+        index = autocomplete.PrefixIndex(every_word=True)
+        index.load([(1, 'War and Peace')])
+        with mock.patch.object(autocomplete.PrefixIndex, 'MAX_CHANGES', 2):
+            index.add(2, 'Peace Talks')
+            index.add(3, 'Peaceful Warrior')
+            self.assertEqual((len(index.ids), index.changes, index.removed), (3, [], set()))
+            index.add(1, 'War')
+            self.assertEqual(index.search('peace'), [(2, 'Peace Talks'), (3, 'Peaceful Warrior')])
+            self.assertEqual(index.search('war'), [(1, 'War'), (3, 'Peaceful Warrior')])
+
+    def test_prefixes_longer_than_the_sorted_heads(self):
+        index = autocomplete.PrefixIndex()
+        with mock.patch.object(autocomplete.PrefixIndex, 'SORT_LENGTH', 4):
+            index.load([(1, 'Chronicles of Narnia'), (2, 'Chronicles of Amber'), (3, 'Chronology')])
+            self.assertEqual(index.search('chronicles of a'), [(2, 'Chronicles of Amber')])
+            self.assertEqual([pk for pk, _ in index.search('chron')], [1, 2, 3])  # Ties in id order.
+
+    def test_lookups_are_fast(self):
+        index = autocomplete.PrefixIndex(every_word=True)
+        index.load((num, f'Book number {num} of the series') for num in range(20000))
+        start = time.perf_counter()
+        for num in range(100):
+            index.search(f'number {num}')
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+
+class AutocompleteViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Alexandre', last_name='Dumas')
+        cls.book = Book.objects.create(title='The Count of Monte Cristo', summary='Summary', isbn='ABCDEFG',
+                                       author=cls.author)
+
+    def setUp(self):
+        patcher = mock.patch.object(autocomplete, 'index', autocomplete.Autocomplete())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lookup(self, **params):
+        return self.client.get(reverse('autocomplete'), params).json()['results']
+
+    def test_lookup_books_and_authors(self):
+        self.assertEqual(self.lookup(q='monte'), [{'id': self.book.pk, 'text': 'The Count of Monte Cristo'}])
+        self.assertEqual(self.lookup(q='dum', kind='author'), [{'id': self.author.pk, 'text': 'Dumas, Alexandre'}])
+        self.assertEqual(self.lookup(q='alex', kind='author'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.lookup(q='x')  # Builds the index.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Twenty Years After'
+            self.book.save()
+            Author.objects.create(first_name='Victor', last_name='Hugo')
+            self.author.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup(q='twenty'), [{'id': self.book.pk, 'text': 'Twenty Years After'}])
+            self.assertEqual(self.lookup(q='monte'), [])
+            self.assertEqual([result['text'] for result in self.lookup(q='', kind='author')], [])
+            self.assertEqual([result['text'] for result in self.lookup(q='h', kind='author')], ['Hugo, Victor'])
+            self.assertEqual(self.lookup(q='d', kind='author'), [])
+
+
+@plain_static_files
+class AutocompleteWidgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [Author.objects.create(first_name='John', last_name=f'Smith {num}') for num in range(20)]
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.authors[3])
+
+    def test_book_form_renders_only_the_selected_author(self):
+        html = BookForm(instance=self.book).as_table()
+        self.assertIn('value="Smith 3, John"', html)
+        self.assertIn(f'name="author" id="id_author_value" value="{self.authors[3].pk}"', html)
+        self.assertNotIn('Smith 4', html)
+        self.assertIn('data-autocomplete-kind="book"', html)
+        self.assertIn('js/autocomplete', str(BookForm().media))
+
+    def test_book_form_accepts_an_author_id(self):
+        form = BookForm(data={'title': 'New', 'author': self.authors[5].pk, 'summary': 'Summary', 'isbn': '123'},
+                        instance=self.book)
+        self.assertEqual(form.errors.get('author'), None)
+        self.assertEqual(form.cleaned_data['author'], self.authors[5])
+
+    def test_create_pages_use_the_widgets(self):
+        user = User.objects.create_user(username='staff', password='12345')
+        user.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.login(username='staff', password='12345')
+        response = self.client.get(reverse('book-create'))
+        self.assertContains(response, 'data-autocomplete-target="id_author_value"')
+        self.assertContains(response, 'js/autocomplete')
+        response = self.client.get(reverse('author-create'))
+        self.assertContains(response, 'data-autocomplete-kind="author"')
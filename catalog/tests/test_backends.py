@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog.backends.pool import ConnectionPool, get_pool
+from catalog.backends.sqlite3.base import DatabaseWrapper
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.db_name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.db_name)
+
+    def make_wrapper(self, alias, pool_size):
+        settings_dict = dict(connection.settings_dict, NAME=self.db_name, CONN_MAX_AGE=0,
+                             POOL={'MAX_SIZE': pool_size, 'TIMEOUT': 5})
+        return DatabaseWrapper(settings_dict, alias=alias)
+
+    def simulate_requests(self, alias, pool_size, threads=8, requests_per_thread=25):
+        """
+        Each thread has its own connection wrapper, like Django's per-thread connections, and closes
+        it at the end of every request (CONN_MAX_AGE = 0).
+        """
+        errors = []
+
+        def worker():
+            wrapper = self.make_wrapper(alias, pool_size)
+            try:
+                for _ in range(requests_per_thread):
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                        self.assertEqual(cursor.fetchone(), (1,))
+                    wrapper.close_if_unusable_or_obsolete()
+                    wrapper.close()
+            except Exception as error:
+                errors.append(error)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_pool_reuses_connections(self):
+        connect = mock.Mock(wraps=DatabaseWrapper.Database.connect)
+        with mock.patch.object(DatabaseWrapper.Database, 'connect', connect):
+            self.simulate_requests('pool_test_unpooled', pool_size=0)
+            unpooled_connects = connect.call_count
+            connect.reset_mock()
+            self.simulate_requests('pool_test_pooled', pool_size=4)
+            pooled_connects = connect.call_count
+
+        pool = get_pool('pool_test_pooled', 4, 5)
+        self.addCleanup(pool.close_all)
+        self.assertEqual(unpooled_connects, 8 * 25)
+        self.assertLessEqual(pooled_connects, 4)
+        self.assertEqual(pool.created, pooled_connects)
+        self.assertEqual(pool.created + pool.reused, 8 * 25)
+
+    def test_pool_size_is_bounded(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        first = pool.acquire(object)
+        with self.assertRaises(Exception):
+            pool.acquire(object)
+        pool.release(first)
+        self.assertIs(pool.acquire(object), first)
+
+    def test_unusable_connections_are_replaced(self):
+        pool = ConnectionPool(max_size=2)
+        broken = mock.Mock()
+        pool.release(pool.acquire(lambda: broken))
+        fresh = pool.acquire(mock.Mock, check=lambda conn: conn is not broken)
+        self.assertIsNot(fresh, broken)
+        broken.close.assert_called_once_with()
+
+
+class SQLiteTuningTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = dict(connection.settings_dict, NAME=os.path.join(directory.name, 'tuned.sqlite3'),
+                             PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000},
+                             TRANSACTION_MODE='IMMEDIATE')
+        self.wrapper = DatabaseWrapper(settings_dict, alias='tuning_test')
+        self.addCleanup(self.wrapper.close)
+
+    def test_pragmas_applied_on_connect(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone(), ('wal',))
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone(), (1,))
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone(), (5000,))
+
+    def test_atomic_blocks_begin_immediate(self):
+        # What transaction.atomic() calls to open the transaction on SQLite.
+        with CaptureQueriesContext(self.wrapper) as queries:
+            self.wrapper._start_transaction_under_autocommit()
+        self.wrapper.rollback()
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
@@ -0,0 +1,140 @@
+import re
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import bitmaps, facets
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.utils import plain_static_files
+
+
+class BitmapFunctionsTest(TestCase):
+
+    def test_from_ids_and_back(self):
+        book_ids = [0, 3, 63, 64, 65, 200, 1000]
+        bitmap = bitmaps.from_ids(book_ids)
+        self.assertEqual(bitmap, sum(1 << book_id for book_id in book_ids))
+        self.assertEqual(bitmaps.popcount(bitmap), 7)
+        self.assertEqual(bitmaps.ids(bitmap), book_ids)
+        self.assertEqual(bitmaps.ids(bitmap, offset=2, limit=3), [63, 64, 65])
+        self.assertEqual(bitmaps.ids(bitmap, offset=6), [1000])
+        self.assertEqual(bitmaps.ids(bitmap, offset=7), [])
+        self.assertEqual(bitmaps.ids(0), [])
+
+    def test_set_bits(self):
+        bitmap = bitmaps.from_ids([1, 8, 70])
+        self.assertEqual(bitmaps.ids(bitmaps.set_bits(bitmap, {8: False, 9: True, 300: True, 70: True})),
+                         [1, 9, 70, 300])
+        self.assertEqual(bitmaps.set_bits(bitmap, {}), bitmap)
+        self.assertEqual(bitmaps.set_bits(0, {5: False}), 0)
+
+
+@plain_static_files
+@override_settings(BITMAP_INDEX=True)
+class BitmapIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.other_author = Author.objects.create(first_name='Jane', last_name='Doe')
+        cls.english = Language.objects.create(name='English')
+        cls.french = Language.objects.create(name='French')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.books = []
+        for num in range(12):
+            book = Book.objects.create(title=f'Book {num}', summary='Summary', isbn='ABCDEFG',
+                                       author=cls.author if num % 4 else cls.other_author,
+                                       language=cls.english if num % 3 else cls.french)
+            book.genre.set([genre for genre, step in ((cls.fantasy, 2), (cls.poetry, 3)) if num % step == 0])
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a' if num % 5 == 0 else 'o')
+            cls.books.append(book)
+
+    def setUp(self):
+        patcher = mock.patch.object(bitmaps, 'index', bitmaps.BitmapIndex())
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index.build()
+
+    def selections(self):
+        return [
+            '',
+            f'genre={self.fantasy.pk}',
+            f'genre={self.fantasy.pk}&genre={self.poetry.pk}',
+            f'genre={self.poetry.pk}&language={self.english.pk}',
+            f'language={self.french.pk}&available=1',
+            f'author={self.other_author.pk}&genre={self.fantasy.pk}',
+        ]
+
+    def assertMatchesDatabase(self):
+        for query in self.selections():
+            selected = facets.parse(QueryDict(query))
+            expected = facets.filter_books(Book.objects.all(), selected)
+            self.assertEqual(bitmaps.ids(self.index.match(selected)),
+                             sorted(expected.values_list('id', flat=True)), query)
+            counts = facets.counts(selected)
+            del counts['author']
+            self.assertEqual(self.index.counts(selected), counts, query)
+
+    def test_filters_and_counts_match_the_database(self):
+        self.assertMatchesDatabase()
+
+    def test_signals_keep_the_index_current(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[1].genre.add(self.poetry)
+            self.fantasy.book_set.remove(self.books[2])
+            self.books[6].genre.clear()
+            self.books[4].language = self.french
+            self.books[4].save()
+            copy = self.books[3].bookinstance_set.get()
+            copy.status = 'a'
+            copy.save()
+            self.books[0].bookinstance_set.get().delete()
+            self.books[11].delete()
+            Book.objects.create(title='New', summary='Summary', isbn='ABCDEFG', language=self.english)
+            self.poetry.name = 'Verse'
+            self.poetry.save()
+        self.assertTrue(self.index.built)
+        self.assertMatchesDatabase()
+
+    def test_changes_applied_on_next_use(self):
+        available = self.index.available
+        with self.captureOnCommitCallbacks(execute=True):
+            for copy in BookInstance.objects.filter(book__in=self.books[:6]):
+                copy.status = 'a'
+                copy.save()
+        # Queued by the signals, without reading the copies.
+        self.assertIs(self.index.available, available)
+        with self.assertNumQueries(1):
+            self.index.ensure_current()
+        self.assertTrue(self.index.built)
+        self.assertEqual(bitmaps.ids(self.index.available),
+                         sorted({book.pk for book in self.books[:6]} | {self.books[10].pk}))
+        self.assertMatchesDatabase()
+
+    def test_other_process_changes_trigger_a_rebuild(self):
+        cache.incr(bitmaps.VERSION_KEY)  # Done by a signal in another worker.
+        Book.objects.filter(pk=self.books[0].pk).update(language=self.english)
+        self.index.ensure_current()
+        self.assertMatchesDatabase()
+
+    def test_book_list_fetches_one_page(self):
+        query = {'genre': [self.fantasy.pk, self.poetry.pk]}
+        with self.settings(BITMAP_INDEX=False):
+            expected = self.client.get(reverse('books'), query)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books'), query)
+        self.assertEqual(list(response.context['book_list']), list(expected.context['book_list']))
+        self.assertEqual(response.context['paginator'].count, expected.context['paginator'].count)
+        self.assertEqual(response.context['facets'], expected.context['facets'])
+        book_queries = [query['sql'] for query in queries if 'FROM "catalog_book"' in query['sql']]
+        # No COUNT(*) of the filtered books, and only the rows of the page are fetched.
+        self.assertFalse([sql for sql in book_queries if 'COUNT(*)' in sql])
+        page_ids = [re.search(r'"catalog_book"\."id" IN \(([\d, ]+)\)', sql) for sql in book_queries]
+        page_ids = [match.group(1) for match in page_ids if match]
+        self.assertEqual(page_ids, [', '.join(str(book.pk) for book in response.context['book_list'])])
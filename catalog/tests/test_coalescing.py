@@ -0,0 +1,139 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import coalescing, pages
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.pages import book_detail_key
+from catalog.tests.utils import plain_static_files
+
+
+class GetOrComputeTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'page'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescing.get_or_compute('key', compute, 60)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['page'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('key'), 'page')
+
+    def test_waits_for_another_process(self):
+        # Another process holds the lock, and caches the value while we wait.
+        cache.add('key:lock', 1, 10)
+        threading.Timer(0.1, lambda: cache.set('key', 'theirs')).start()
+        self.assertEqual(coalescing.get_or_compute('key', lambda: 'ours', 60, poll_interval=0.01), 'theirs')
+
+    def test_computes_when_the_other_process_is_gone(self):
+        cache.add('key:lock', 1, 10)
+        threading.Timer(0.1, lambda: cache.delete('key:lock')).start()
+        self.assertEqual(coalescing.get_or_compute('key', lambda: 'ours', 60, poll_interval=0.01), 'ours')
+
+    def test_failure_is_not_cached(self):
+        def fail():
+            raise ValueError('database is down')
+
+        with self.assertRaises(ValueError):
+            coalescing.get_or_compute('key', fail, 60)
+        self.assertIsNone(cache.get('key:lock'))
+        self.assertEqual(coalescing.get_or_compute('key', lambda: 'page', 60), 'page')
+
+    def test_waiting_threads_get_the_failure(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            time.sleep(0.1)
+            raise ValueError('database is down')
+
+        errors = []
+
+        def get():
+            try:
+                coalescing.get_or_compute('key', fail, 60, lock_timeout=0.01)
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Not computed again by the others, though the leader took longer than lock_timeout.
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 4)
+
+
+@plain_static_files
+@override_settings(BOOK_PAGE_CACHE_TIMEOUT=60)
+class BookPageCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self):
+        return self.client.get(reverse('book-detail', args=[self.book.pk]))
+
+    def test_cached_once(self):
+        self.assertContains(self.get(), 'Book Title')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get()
+        self.assertContains(response, 'Smith, John')
+        # Only the book itself, for the 404 and the title.
+        self.assertEqual(len(queries), 1)
+
+    def test_changes_invalidate_the_page(self):
+        self.get()
+        self.copy.imprint = 'Second imprint'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.copy.save()
+        self.assertContains(self.get(), 'Second imprint')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.genre.add(Genre.objects.create(name='Poetry'))
+        self.assertContains(self.get(), 'Poetry')
+        self.author.last_name = 'Smythe'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        self.assertContains(self.get(), 'Smythe, John')
+
+    def test_staff_page_is_cached_separately(self):
+        librarian = User.objects.create_user(username='librarian', password='12345', is_staff=True)
+        self.copy.borrower = librarian
+        self.copy.save()
+        self.assertNotContains(self.get(), 'Loaned by')
+        self.client.force_login(librarian)
+        self.assertContains(self.get(), 'Loaned by')
+        self.assertIsNotNone(cache.get(book_detail_key(self.book.pk, True)))
+
+    def test_fragment_knows_only_whether_staff(self):
+        # Cached for all the staff: nothing else of the user is rendered.
+        with mock.patch('catalog.pages.render_to_string', return_value='page') as render:
+            pages.book_detail(self.book, [], True)
+        self.assertEqual(render.call_args[0][1], {'book': self.book, 'also_borrowed': [], 'is_staff': True})
@@ -0,0 +1,99 @@
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import facets
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class FacetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.smith = Author.objects.create(first_name='John', last_name='Smith')
+        cls.doe = Author.objects.create(first_name='Jane', last_name='Doe')
+        cls.english = Language.objects.create(name='English')
+        cls.french = Language.objects.create(name='French')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+
+        def book(title, author, language, genres, available=False):
+            book = Book.objects.create(title=title, summary='Summary', isbn='ABCDEFG', author=author,
+                                       language=language)
+            book.genre.set(genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a' if available else 'o')
+            return book
+
+        cls.book1 = book('Book 1', cls.smith, cls.english, [cls.fantasy, cls.poetry], available=True)
+        cls.book2 = book('Book 2', cls.smith, cls.french, [cls.fantasy])
+        cls.book3 = book('Book 3', cls.doe, cls.english, [cls.poetry], available=True)
+        cls.book4 = book('Book 4', cls.doe, None, [])
+
+    def select(self, query):
+        return facets.parse(QueryDict(query))
+
+    def test_parse_ignores_invalid_values(self):
+        self.assertEqual(self.select('genre=1&genre=x&available=2&language=3'),
+                         {'genre': {1}, 'language': {3}, 'author': set(), 'available': set()})
+
+    def test_filters_and_facets_or_values(self):
+        selected = self.select(f'genre={self.fantasy.pk}&genre={self.poetry.pk}&language={self.english.pk}')
+        self.assertEqual(set(facets.filter_books(Book.objects.all(), selected)), {self.book1, self.book3})
+        selected = self.select(f'genre={self.fantasy.pk}&available=1')
+        self.assertEqual(list(facets.filter_books(Book.objects.all(), selected)), [self.book1])
+
+    def test_counts_in_two_queries(self):
+        # One for the genres, languages and availability, one for the authors.
+        with self.assertNumQueries(2):
+            counts = facets.counts(self.select(''))
+        self.assertEqual(counts, {
+            'genre': {self.fantasy.pk: ('Fantasy', 2), self.poetry.pk: ('Poetry', 2)},
+            'language': {self.english.pk: ('English', 2), self.french.pk: ('French', 1)},
+            'author': {self.smith.pk: ('Smith, John', 2), self.doe.pk: ('Doe, Jane', 2)},
+            'available': {1: ('Available', 2)},
+        })
+
+    def test_counts_reflect_the_other_facets(self):
+        counts = facets.counts(self.select(f'genre={self.fantasy.pk}&language={self.english.pk}'))
+        # Genres are counted among the English books, languages among the fantasy books.
+        self.assertEqual(counts['genre'], {self.fantasy.pk: ('Fantasy', 1), self.poetry.pk: ('Poetry', 2)})
+        self.assertEqual(counts['language'], {self.english.pk: ('English', 1), self.french.pk: ('French', 1)})
+        self.assertEqual(counts['author'], {self.smith.pk: ('Smith, John', 1)})
+        self.assertEqual(counts['available'], {1: ('Available', 1)})
+
+    @override_settings(FACET_AUTHOR_LIMIT=1)
+    def test_authors_limited_to_those_of_most_books(self):
+        Book.objects.create(title='Book 5', summary='Summary', isbn='ABCDEFG', author=self.doe)
+        lee = Author.objects.create(first_name='Ann', last_name='Lee')
+        Book.objects.create(title='Book 6', summary='Summary', isbn='ABCDEFG', author=lee)
+        self.assertEqual(facets.counts(self.select(''), only=['author']),
+                         {'author': {self.doe.pk: ('Doe, Jane', 3)}})
+        # The selected authors are kept.
+        selected = self.select(f'author={lee.pk}')
+        counts = facets.counts(selected, only=['author'])
+        self.assertEqual(counts['author'], {lee.pk: ('Lee, Ann', 1), self.doe.pk: ('Doe, Jane', 3)})
+        author_options = facets.options(selected, {**facets.counts(selected), **counts})[2][1]
+        self.assertEqual([(option['label'], option['selected']) for option in author_options],
+                         [('Doe, Jane', False), ('Lee, Ann', True)])
+
+    def test_book_list_view(self):
+        response = self.client.get(reverse('books'), {'genre': self.poetry.pk, 'available': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({book.pk for book in response.context['book_list']}, {self.book1.pk, self.book3.pk})
+        genre_title, genre_options = response.context['facets'][0]
+        self.assertEqual(genre_title, 'Genre')
+        self.assertEqual([(option['label'], option['count'], option['selected']) for option in genre_options],
+                         [('Fantasy', 1, False), ('Poetry', 2, True)])
+        # Clicking the selected genre removes it from the filters.
+        self.assertEqual(genre_options[1]['query'], 'available=1')
+        self.assertEqual(response.context['filter_query'], f'genre={self.poetry.pk}&available=1')
+
+    def test_pagination_keeps_filters(self):
+        response = self.client.get(reverse('books'), {'language': self.english.pk})
+        self.assertFalse(response.context['is_paginated'])
+        Book.objects.bulk_create([Book(title=f'Extra {num}', summary='Summary', isbn='ABCDEFG',
+                                       language=self.english) for num in range(4)])
+        response = self.client.get(reverse('books'), {'language': self.english.pk})
+        self.assertContains(response, f'?language={self.english.pk}&page=2')
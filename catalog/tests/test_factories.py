@@ -0,0 +1,76 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog import loan_summary, pages
+from catalog.factories import LibraryFactory, seed_library
+from catalog.models import Author, Book, BookInstance, LoanSummary
+
+TODAY = datetime.date(2024, 6, 1)
+
+
+class LibraryFactoryTest(SimpleTestCase):
+
+    def test_same_seed_same_library(self):
+        def library(seed):
+            factory = LibraryFactory(seed, TODAY)
+            books = [(book.title, book.isbn, book.author_id, book.language_id, genres)
+                     for book, genres in factory.books(50, [1, 2, 3], [1, 2], [1, 2, 3, 4])]
+            # The copies of two batches are those of one.
+            copies = [*factory.copies([1, 2], 3, [7, 8]), *factory.copies([3], 3, [7, 8])]
+            return books, [(copy.id, copy.book_id, copy.status, copy.due_back, copy.borrower_id) for copy in copies]
+
+        self.assertEqual(library(1), library(1))
+        self.assertNotEqual(library(1), library(2))
+        books, copies = library(1)
+        self.assertEqual(len(copies), 9)
+        self.assertTrue(all(1 <= len(genres) <= 3 for *_, genres in books))
+        self.assertTrue(all(due_back for _, _, status, due_back, _ in copies if status == 'o'))
+
+
+class SeedLibraryTest(TestCase):
+
+    def test_seed(self):
+        counts = seed_library(25, 2, authors=4, users=3, batch_size=10, today=TODAY)
+        self.assertEqual({kind: counts[kind] for kind in ('authors', 'users', 'books', 'copies')},
+                         {'authors': 4, 'users': 3, 'books': 25, 'copies': 50})
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertEqual(Book.genre.through.objects.count(), counts['genre links'])
+        self.assertFalse(Book.objects.filter(genre__isnull=True).exists())
+        self.assertEqual(BookInstance.objects.filter(book__isnull=True).count(), 0)
+        self.assertFalse(Book.objects.filter(author__isnull=True).exists())
+        self.assertEqual(Author.objects.count(), 4)
+        borrowers = set(BookInstance.objects.filter(status='o').values_list('borrower__username', flat=True))
+        self.assertTrue(borrowers <= {f'seed0-reader{num}' for num in range(3)})
+        self.assertTrue(User.objects.get(username='seed0-reader0').check_password('password'))
+        # The signals were bypassed, the summary kept current batch by batch.
+        self.assertEqual(loan_summary.compute(), self.summary())
+        # Over the rows of a previous library.
+        cache.set(pages.INDEX_COUNTS_KEY, (1, 1, 1, 1))
+        seed_library(15, 3, authors=2, users=2, seed=1, batch_size=10, today=TODAY)
+        self.assertEqual(loan_summary.compute(), self.summary())
+        self.assertIsNone(cache.get(pages.INDEX_COUNTS_KEY))
+
+    def summary(self):
+        return {(row.dimension, row.key, row.status): (row.label, row.count) for row in LoanSummary.objects.all()}
+
+    def test_queries_per_batch_not_per_row(self):
+        seed_library(1, 1, authors=1, users=1, today=TODAY, refresh_summary=False)
+        with CaptureQueriesContext(connection) as queries:
+            seed_library(200, 5, authors=1, users=1, seed=1, batch_size=100, today=TODAY, refresh_summary=False)
+        # 200 books, 1000 copies and their genre links in 2 batches.
+        self.assertLess(len(queries), 50)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('seed_library', books=12, copies_per_book=2, batch_size=5, stdout=out)
+        self.assertIn('12 of 12 books written', out.getvalue())
+        self.assertIn('12 books, ', out.getvalue())
+        self.assertIn('24 copies added', out.getvalue())
+        self.assertEqual(BookInstance.objects.count(), 24)
@@ -0,0 +1,52 @@
+import datetime
+import time
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.ids import new_copy_id, uuid7
+from catalog.models import Author, Book, BookInstance
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class OrderedUUIDTest(TestCase):
+
+    def test_uuid7_layout(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertTrue(before <= value.int >> 80 <= after)
+
+    def test_uuid7_ordered(self):
+        values = [uuid7() for _ in range(10000)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), len(values))
+        # Also in their text form, the one of SQLite and of the URLs.
+        self.assertEqual([value.hex for value in values], sorted(value.hex for value in values))
+
+    def test_default_follows_setting(self):
+        self.assertEqual(new_copy_id().version, 4)
+        with override_settings(ORDERED_UUIDS=True):
+            self.assertEqual(new_copy_id().version, 7)
+
+    @override_settings(ORDERED_UUIDS=True)
+    def test_renewal_urls_of_both_kinds(self):
+        librarian = User.objects.create_user(username='librarian', password='12345')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        book = Book.objects.create(title='Book', summary='Summary', isbn='ABCDEFG',
+                                   author=Author.objects.create(first_name='John', last_name='Smith'))
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        random_copy = BookInstance.objects.create(id=uuid.uuid4(), book=book, imprint='Imprint', status='o',
+                                                  due_back=due_back)
+        ordered_copy = BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=due_back)
+        self.assertEqual(ordered_copy.id.version, 7)
+
+        self.client.force_login(librarian)
+        for copy in (random_copy, ordered_copy):
+            response = self.client.get(reverse('renew-book-librarystaff', args=[copy.pk]))
+            self.assertEqual(response.status_code, 200)
@@ -0,0 +1,108 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import loan_events
+from catalog.models import Author, Book, BookInstance, LoanEvent
+
+
+class LoanEventTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.other_reader = User.objects.create_user(username='other', password='12345')
+        cls.staff = User.objects.create_user(username='staff', password='12345')
+        cls.staff.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.other_book = Book.objects.create(title='Another Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+    def save(self, copy, **changes):
+        for name, value in changes.items():
+            setattr(copy, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.save()
+
+    def kinds(self):
+        return list(LoanEvent.objects.values_list('kind', flat=True))
+
+    def test_checkout_renew_and_return(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.save(copy, status='o', borrower=self.reader, due_back=self.due_back)
+        self.save(copy, due_back=self.due_back + datetime.timedelta(weeks=1))
+        self.save(copy, imprint='New imprint')  # Not a loan change.
+        self.save(copy, borrower=self.other_reader)
+        self.save(copy, status='a', borrower=None, due_back=None)
+        self.assertEqual(self.kinds(), ['checkout', 'renew', 'return', 'checkout', 'return'])
+
+        first, last = LoanEvent.objects.first(), LoanEvent.objects.last()
+        self.assertEqual((first.copy_id, first.book_id, first.borrower_id), (copy.pk, self.book.pk, self.reader.pk))
+        self.assertEqual(last.borrower_id, self.other_reader.pk)
+
+    def test_rolled_back_changes_are_not_logged(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        copy.status = 'o'
+        copy.save()  # The callbacks of the (test) transaction are discarded.
+        self.assertEqual(self.kinds(), [])
+
+    def test_buffered_events_are_written_in_bulk(self):
+        copies = [BookInstance.objects.create(book=self.book, imprint='Imprint', status='a') for _ in range(3)]
+        # The count inside the block, then a single INSERT.
+        with self.assertNumQueries(2):
+            with loan_events.buffered():
+                for copy in copies:
+                    loan_events.record(loan_events.changes(
+                        {'book_id': self.book.pk, 'borrower_id': None, 'status': 'a', 'due_back': None},
+                        BookInstance(pk=copy.pk, book=self.book, status='o', borrower=self.reader)))
+                self.assertEqual(LoanEvent.objects.count(), 0)
+        self.assertEqual(self.kinds(), ['checkout'] * 3)
+
+    def test_events_are_append_only(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.save(copy, status='o')
+        event = LoanEvent.objects.get()
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_circulation_by_month(self):
+        now = timezone.now()
+        last_month = now - datetime.timedelta(days=40)
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        LoanEvent.objects.bulk_create([
+            LoanEvent(created=last_month, kind=LoanEvent.CHECKOUT, copy_id=copy.pk, book=self.book),
+            LoanEvent(created=now, kind=LoanEvent.RENEW, copy_id=copy.pk, book=self.book),
+            LoanEvent(created=now, kind=LoanEvent.RETURN, copy_id=copy.pk, book=self.book),
+            LoanEvent(created=now, kind=LoanEvent.CHECKOUT, copy_id=copy.pk, book=self.other_book),
+        ])
+        rows = list(loan_events.circulation_by_month())
+        self.assertEqual([(row['title'], row['checkouts'], row['renewals'], row['returns']) for row in rows], [
+            ('Book Title', 1, 0, 0),
+            ('Another Title', 1, 0, 0),
+            ('Book Title', 0, 1, 1),
+        ])
+        self.assertEqual(len(list(loan_events.circulation_by_month(start=now - datetime.timedelta(days=1)))), 2)
+
+    def test_circulation_csv_is_streamed(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.save(copy, status='o')
+        self.client.login(username='staff', password='12345')
+        response = self.client.get(reverse('circulation-csv'))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'month,book_id,title,checkouts,renewals,returns')
+        self.assertEqual(lines[1], f'{timezone.localtime():%Y-%m},{self.book.pk},Book Title,1,0,0')
+
+    def test_renewal_view_logs_event(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                           due_back=datetime.date.today())
+        self.client.login(username='staff', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('renew-book-librarystaff', kwargs={'pk': copy.pk}),
+                             {'renewal_date': self.due_back})
+        event = LoanEvent.objects.get()
+        self.assertEqual((event.kind, event.due_back), (LoanEvent.RENEW, self.due_back))
@@ -0,0 +1,119 @@
+import datetime
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.forms import RenewBookForm
+from catalog.loan_policy import DEFAULT_PERIOD, Period, policy
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.tests.utils import plain_static_files
+
+RULES = {
+    'default': {'renewal_days': 21, 'max_renewal_days': 28, 'grace_days': 0},
+    'rules': [
+        {'group': 'Staff', 'max_renewal_days': 56},
+        {'genre': ['Reference', 'Atlas'], 'renewal_days': 7, 'max_renewal_days': 7},
+        {'language': 'Latin', 'grace_days': 3},
+    ],
+}
+
+
+@plain_static_files
+@override_settings(LOAN_POLICY=RULES)
+class LoanPolicyTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.reference = Genre.objects.create(name='Reference')
+        cls.latin = Language.objects.create(name='Latin')
+        cls.staff = Group.objects.create(name='Staff')
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.librarian = User.objects.create_user(username='librarian', password='12345')
+        cls.librarian.groups.add(cls.staff)
+        cls.novel = Book.objects.create(title='Novel', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.dictionary = Book.objects.create(title='Dictionary', summary='Summary', isbn='ABCDEFH', author=author,
+                                             language=cls.latin)
+        cls.dictionary.genre.add(cls.reference)
+        cls.grammar = Book.objects.create(title='Grammar', summary='Summary', isbn='ABCDEFI', author=author,
+                                          language=cls.latin)
+        cls.today = datetime.date.today()
+        cls.copies = {
+            (book.title, borrower.username): BookInstance.objects.create(
+                book=book, borrower=borrower, imprint='Imprint', status='o',
+                due_back=cls.today - datetime.timedelta(days=2))
+            for book in (cls.novel, cls.dictionary, cls.grammar) for borrower in (cls.reader, cls.librarian)
+        }
+
+    def setUp(self):
+        cache.clear()
+        policy.built = False
+
+    def test_first_matching_rule_applies(self):
+        policy.ensure_current()
+        staff, reference, latin, default = policy.periods
+        self.assertEqual(default, DEFAULT_PERIOD)
+        self.assertEqual(reference, Period(7, 7, 0))
+        self.assertEqual(policy.period_for(), default)
+        self.assertEqual(policy.period_for(language_id=self.latin.pk), latin)
+        self.assertEqual(policy.period_for([self.reference.pk], self.latin.pk), reference)
+        self.assertEqual(policy.period_for([self.reference.pk], self.latin.pk, [self.staff.pk]), staff)
+        self.assertEqual(policy.period_of(self.copies['Dictionary', 'reader']), reference)
+
+    def test_lookups_need_no_query(self):
+        policy.ensure_current()
+        with self.assertNumQueries(0):
+            policy.period_for([self.reference.pk], self.latin.pk, [self.staff.pk])
+
+    def test_bulk_periods_match_single_ones(self):
+        queryset = BookInstance.objects.all()
+        policy.ensure_current()
+        with self.assertNumQueries(3):
+            periods = policy.periods_of(queryset)
+        self.assertEqual(periods, {copy.pk: policy.period_of(copy) for copy in queryset})
+
+    def test_sql_expressions_match_python(self):
+        copies = BookInstance.objects.annotate(
+            renewal_days=policy.renewal_days(), max_renewal_days=policy.max_renewal_days(),
+            overdue=policy.overdue(),
+        )
+        for copy in copies:
+            period = policy.period_of(copy)
+            self.assertEqual((copy.renewal_days, copy.max_renewal_days), period[:2])
+            self.assertEqual(copy.overdue, period.is_overdue(copy.due_back, self.today))
+        # The Latin grammar has 3 days of grace, unless the borrower is staff.
+        not_overdue = {(copy.book.title, copy.borrower.username) for copy in copies if not copy.overdue}
+        self.assertEqual(not_overdue, {('Grammar', 'reader')})
+
+    def test_is_overdue_uses_the_annotation(self):
+        copy = BookInstance.objects.annotate(overdue=policy.overdue()).get(pk=self.copies['Grammar', 'reader'].pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(copy.is_overdue)
+        self.assertFalse(BookInstance.objects.get(pk=copy.pk).is_overdue)
+        self.assertTrue(self.copies['Novel', 'reader'].is_overdue)
+
+    def test_renaming_a_genre_recompiles(self):
+        policy.ensure_current()
+        atlas = Genre.objects.create(name='Maps')
+        with self.captureOnCommitCallbacks(execute=True):
+            atlas.name = 'Atlas'
+            atlas.save()
+        self.assertEqual(policy.period_for([atlas.pk]).max_renewal_days, 7)
+
+    def test_form_validates_the_period(self):
+        form = RenewBookForm(period=Period(7, 10, 0))
+        self.assertEqual(form.fields['renewal_date'].help_text, 'Enter a date between now and 10 days (default 7).')
+        form = RenewBookForm(data={'renewal_date': self.today + datetime.timedelta(days=11)}, period=Period(7, 10, 0))
+        self.assertEqual(form.errors['renewal_date'], ['Invalid date - renewal more than 10 days ahead'])
+
+    def test_renewal_view_uses_the_period_of_the_copy(self):
+        self.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.force_login(self.librarian)
+        copy = self.copies['Dictionary', 'reader']
+        response = self.client.get(reverse('renew-book-librarystaff', args=[copy.pk]))
+        self.assertEqual(response.context['form'].initial['renewal_date'], self.today + datetime.timedelta(days=7))
+        response = self.client.post(reverse('renew-book-librarystaff', args=[copy.pk]),
+                                    {'renewal_date': self.today + datetime.timedelta(days=8)})
+        self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 1 week ahead')
@@ -0,0 +1,115 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import loan_summary
+from catalog.models import Author, Book, BookInstance, Genre, LoanSummary
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class LoanSummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.staff = User.objects.create_user(username='staff', password='12345')
+        cls.staff.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.book.genre.add(cls.fantasy)
+        cls.other_book = Book.objects.create(title='Other Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.yesterday = datetime.date.today() - datetime.timedelta(days=1)
+
+    def stored(self):
+        return {(row.dimension, row.key, row.status): (row.label, row.count)
+                for row in LoanSummary.objects.filter(count__gt=0)}
+
+    def assertSummaryConsistent(self):
+        self.assertEqual(self.stored(), loan_summary.compute())
+
+    def test_checkout_renew_and_return(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.other_book, imprint='Imprint', status='a')
+        self.assertSummaryConsistent()
+
+        copy.status, copy.borrower, copy.due_back = 'o', self.reader, self.yesterday
+        copy.save()
+        self.assertSummaryConsistent()
+        self.assertEqual(self.stored()[(LoanSummary.BORROWER, str(self.reader.pk), 'o')], ('reader', 1))
+
+        copy.due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        copy.save()
+        self.assertSummaryConsistent()
+
+        copy.status, copy.borrower, copy.due_back = 'a', None, None
+        copy.save()
+        self.assertSummaryConsistent()
+
+        copy.delete()
+        self.assertSummaryConsistent()
+
+    def test_genre_and_book_changes(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                    due_back=self.yesterday)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.book.genre.add(self.poetry)
+        self.assertSummaryConsistent()
+        self.fantasy.book_set.remove(self.book)
+        self.assertSummaryConsistent()
+        self.book.genre.clear()
+        self.assertSummaryConsistent()
+
+        self.book.genre.add(self.fantasy)
+        self.book.title = 'New Title'
+        self.book.save()
+        self.assertSummaryConsistent()
+        self.book.delete()
+        self.assertSummaryConsistent()
+
+    def test_refresh_after_bulk_update(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.update(status='m')  # Sends no signal.
+        self.assertNotEqual(self.stored(), loan_summary.compute())
+
+        out = StringIO()
+        call_command('refresh_loan_summary', stdout=out)
+        self.assertSummaryConsistent()
+        self.assertIn('loan summary rows written', out.getvalue())
+
+        call_command('refresh_loan_summary', full=True, stdout=StringIO())
+        self.assertSummaryConsistent()
+
+    def test_report_reads_summary(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                    due_back=self.yesterday)
+        self.client.login(username='staff', password='12345')
+        with self.assertNumQueries(8):
+            # Session, user, user and group permissions, then the four reads of LoanSummary.
+            response = self.client.get(reverse('loan-summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/loan_summary.html')
+        self.assertEqual(response.context['overdue_by_day'][0].count, 1)
+        self.assertEqual(response.context['availability_by_genre'],
+                         [{'genre': 'Fantasy', 'available': 0, 'on_loan': 1, 'total': 1}])
+        self.assertContains(response, 'reader: 1')
+
+    def test_report_counts_the_grace_days(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                    due_back=self.yesterday)
+        self.client.login(username='staff', password='12345')
+        with self.settings(LOAN_POLICY={'default': {'grace_days': 2}}):
+            response = self.client.get(reverse('loan-summary'))
+        self.assertEqual(list(response.context['overdue_by_day']), [])
+        self.assertContains(response, 'There are no overdue loans.')
+
+    def test_report_requires_permission(self):
+        self.client.login(username='reader', password='12345')
+        response = self.client.get(reverse('loan-summary'))
+        self.assertEqual(response.status_code, 403)
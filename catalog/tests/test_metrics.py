@@ -0,0 +1,141 @@
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import coalescing, metrics
+from catalog.models import Author, Book, BookInstance
+from catalog.tests.utils import plain_static_files
+
+
+class RegistryTest(SimpleTestCase):
+
+    def test_counter_and_histogram_exposition(self):
+        registry = metrics.Registry(directory='')
+        counter = metrics.Counter('test_total', 'A counter.', ['kind'], registry=registry)
+        histogram = metrics.Histogram('test_seconds', 'A histogram.', buckets=(0.1, 1), registry=registry)
+
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        lines = registry.exposition().splitlines()
+        self.assertIn('# TYPE test_total counter', lines)
+        self.assertIn('test_total{kind="a"} 3', lines)
+        self.assertIn('test_seconds_bucket{le="1"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count 2', lines)
+        self.assertIn('test_seconds_sum 5.5', lines)
+
+    def test_unknown_labels_rejected(self):
+        registry = metrics.Registry(directory='')
+        counter = metrics.Counter('test_total', 'A counter.', ['kind'], registry=registry)
+        with self.assertRaises(ValueError):
+            counter.inc(other='a')
+
+    def test_samples_summed_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Two registries sharing a directory stand in for two gunicorn workers.
+            workers = [metrics.Registry(directory=directory, flush_interval=60, ident=f'worker-{num}')
+                       for num in range(2)]
+            counters = [metrics.Counter('test_total', 'A counter.', registry=registry) for registry in workers]
+            counters[0].inc(3)
+            counters[1].inc(4)
+            counters[1].inc(1)
+
+            # The last increment of worker 1 is not flushed yet (flush interval), until it is scraped.
+            self.assertIn('test_total 7', workers[0].exposition().splitlines())
+            self.assertIn('test_total 8', workers[1].exposition().splitlines())
+            self.assertIn('test_total 8', workers[0].exposition().splitlines())
+
+    def test_samples_of_dead_processes_archived(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = metrics.Registry(directory=directory, flush_interval=0)
+            counter = metrics.Counter('test_total', 'A counter.', registry=registry)
+            counter.inc(2)
+            # Workers gone since (no process has a pid above 2**22: the Linux maximum).
+            for pid in (2 ** 22 + 1, 2 ** 22 + 2):
+                with open(os.path.join(directory, f'{pid}-1000.json'), 'w') as fp:
+                    fp.write('[["test_total", [], 5]]')
+            # The counter doesn't go down once their files are gone.
+            self.assertIn('test_total 12', registry.exposition().splitlines())
+            self.assertIn('test_total 12', registry.exposition().splitlines())
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                             sorted([metrics.ARCHIVE, os.path.basename(registry._filename())]))
+
+    def test_last_samples_written_without_another_sample(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = metrics.Registry(directory=directory, flush_interval=0.05, ident='worker')
+            counter = metrics.Counter('test_total', 'A counter.', registry=registry)
+            counter.inc()
+            counter.inc()
+            path = os.path.join(directory, 'worker.json')
+            with open(path) as fp:
+                self.assertEqual(json.load(fp), [['test_total', [], 1]])
+            time.sleep(0.2)
+            with open(path) as fp:
+                self.assertEqual(json.load(fp), [['test_total', [], 2]])
+
+
+@plain_static_files
+class MetricsViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='testuser1', password='12345')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        today = datetime.date.today()
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                    due_back=today - datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                    due_back=today + datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='staff', password='12345', is_staff=True))
+
+    def test_restricted_to_staff_and_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_request_latency_by_url_name(self):
+        self.client.get(reverse('books'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertIn('catalog_request_duration_seconds_count{url_name="books",method="GET"} 1', lines)
+        self.assertTrue(any(line.startswith('catalog_db_queries_total{url_name="books"}') for line in lines))
+
+    def test_loan_gauges(self):
+        lines = self.client.get(reverse('metrics')).content.decode().splitlines()
+        self.assertIn('catalog_loans_active 2', lines)
+        self.assertIn('catalog_loans_overdue 1', lines)
+
+    def test_cache_hit_ratio(self):
+        metrics.CACHE_REQUESTS.inc(cache='pages', result='hit')
+        metrics.CACHE_REQUESTS.inc(3, cache='pages', result='miss')
+        lines = self.client.get(reverse('metrics')).content.decode().splitlines()
+        self.assertIn('catalog_cache_hit_ratio{cache="pages"} 0.25', lines)
+
+    @override_settings(INDEX_COUNTS_CACHE_TIMEOUT=60)
+    def test_cached_parts_counted(self):
+        for _ in range(4):
+            self.client.get(reverse('index'))
+        coalescing.get_or_compute('key', lambda: 'value', 60, name='other')
+        lines = self.client.get(reverse('metrics')).content.decode().splitlines()
+        self.assertIn('catalog_cache_requests_total{cache="index-counts",result="hit"} 3', lines)
+        self.assertIn('catalog_cache_hit_ratio{cache="index-counts"} 0.75', lines)
+        self.assertIn('catalog_cache_requests_total{cache="other",result="miss"} 1', lines)
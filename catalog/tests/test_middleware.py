@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import tempfile
+
+import brotli
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class RequestProfilingMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_num in range(3):
+            Book.objects.create(title=f'Book {book_num}', summary='Summary', isbn='ABCDEFG', author=author)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+    def test_server_timing_header(self):
+        with self.assertLogs('catalog.profiling', level='INFO') as logs:
+            response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        server_timing = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+            self.assertIn(metric, server_timing)
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], reverse('books'))
+        self.assertIsNone(record['user'])
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertIn(f'desc="{record["queries"]} queries', server_timing)
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse('books'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_cprofile_dump_for_slow_requests(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=1.0,
+                                   REQUEST_PROFILING_CPROFILE_THRESHOLD_MS=0.001,
+                                   REQUEST_PROFILING_DUMP_DIR=dump_dir):
+                with self.assertLogs('catalog.profiling', level='INFO'):
+                    self.client.get(reverse('books'))
+            dumps = os.listdir(dump_dir)
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].endswith('-GET-catalogbooks.prof'))
+
+
+class StaticAssetsTest(TestCase):
+    """
+    The collected static files, fingerprinted and compressed into a temporary STATIC_ROOT.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(static_root.cleanup)
+        settings = override_settings(
+            STATIC_ROOT=static_root.name,
+            STATICFILES_STORAGE='whitenoise.storage.CompressedManifestStaticFilesStorage',
+        )
+        settings.enable()
+        cls.addClassCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_pages_announce_the_stylesheets(self):
+        response = self.client.get(reverse('index'))
+        bootstrap = staticfiles_storage.url('vendor/bootstrap/css/bootstrap.min.css')
+        self.assertRegex(bootstrap, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertIn(f'<{bootstrap}>; rel=preload; as=style', response['Link'])
+        self.assertContains(response, f'href="{bootstrap}"')
+        self.assertNotContains(response, 'https://')
+
+        response = self.client.get(reverse('autocomplete'), {'q': 'x'})
+        self.assertFalse(response.has_header('Link'))
+
+    def test_fingerprinted_assets_are_precompressed_and_immutable(self):
+        url = staticfiles_storage.url('vendor/bootstrap/css/bootstrap.min.css')
+        for encoding in ('br', 'gzip'):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertLess(int(response['Content-Length']), 40000)
+
+
+@plain_static_files
+@override_settings(COMPRESSION_MIN_LENGTH=1024)
+class CompressionMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(13):
+            Author.objects.create(first_name=f'Christian {author_num}', last_name=f'Surname {author_num}')
+
+    def test_gzip(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.client.get(reverse('authors')).content)
+
+    def test_brotli(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.client.get(reverse('authors')).content)
+
+    @override_settings(STREAMING_LISTS=True)
+    def test_streamed_responses(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn(b'Surname 1', brotli.decompress(b''.join(response.streaming_content)))
+
+    def test_small_responses_are_not_compressed(self):
+        with override_settings(COMPRESSION_MIN_LENGTH=100000):
+            response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'Surname 1', response.content)
+
+    def test_not_accepted(self):
+        response = self.client.get(reverse('authors'))
+        self.assertFalse(response.has_header('Content-Encoding'))
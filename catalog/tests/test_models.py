@@ -114,7 +114,7 @@ class BookModelTest(TestCase):
         genre2 = Genre.objects.create(name='Historical novel')
         genre_objects_for_book = Genre.objects.all()
         language = Language.objects.create(name='French')
-        Book.objects.create(
+        book = Book.objects.create(
             title='The Count of Monte Cristo',
             author=author,
             summary='A romantic novel about a prisoner of the castle If',
@@ -122,7 +122,7 @@ class BookModelTest(TestCase):
             #genre=test_genre,
             language=language,
         )
-        Book.genre = genre_objects_for_book
+        book.genre.set(genre_objects_for_book)
 
     # Label tests
     def test_title_lable(self):
@@ -0,0 +1,177 @@
+import datetime
+import json
+import os
+import tempfile
+import uuid
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from catalog import loan_summary, pages
+from catalog.models import Author, Book, BookInstance, LoanSummary
+from catalog.parallel import common_prefix, int_partitions, partition_queryset, uuid_partitions
+
+
+class PartitionTest(TestCase):
+
+    def test_uuid_partitions_cover_every_id(self):
+        partitions = uuid_partitions(1)
+        self.assertEqual(len(partitions), 16)
+        self.assertEqual(partitions[0].lower, None)
+        self.assertEqual(partitions[1].lower, uuid.UUID('10000000-0000-0000-0000-000000000000'))
+        self.assertEqual(partitions[-1].upper, None)
+
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book', summary='Summary', isbn='ABCDEFG', author=author)
+        copies = [BookInstance.objects.create(book=book, imprint='Imprint') for _ in range(40)]
+        found = []
+        for partition in uuid_partitions(1):
+            ids = list(partition_queryset(BookInstance, partition).values_list('id', flat=True))
+            self.assertTrue(all(str(copy_id).startswith(partition.key) for copy_id in ids))
+            found.extend(ids)
+        self.assertCountEqual(found, [copy.id for copy in copies])
+
+    def test_uuid_partitions_after_common_prefix(self):
+        partitions = uuid_partitions(1, '0192')
+        self.assertEqual([partition.key for partition in partitions[:2]], ['01920', '01921'])
+        self.assertEqual(partitions[1].lower, uuid.UUID('01921000-0000-0000-0000-000000000000'))
+        self.assertEqual(partitions[14].upper, uuid.UUID('0192f000-0000-0000-0000-000000000000'))
+        self.assertEqual((partitions[0].lower, partitions[-1].upper), (None, None))
+
+    def test_ordered_ids_are_split_by_time(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book', summary='Summary', isbn='ABCDEFG', author=author)
+        BookInstance.objects.create(id=uuid.UUID('01920000-0000-7000-8000-000000000000'), book=book, imprint='Imprint')
+        BookInstance.objects.create(id=uuid.UUID('019fffff-0000-7000-8000-000000000000'), book=book, imprint='Imprint')
+        self.assertEqual(common_prefix(BookInstance), '019')
+
+    def test_int_partitions_are_aligned(self):
+        self.assertEqual(int_partitions(Book, 10), [])
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        books = [Book.objects.create(title='Book', summary='Summary', isbn='ABCDEFG', author=author) for _ in range(25)]
+        lowest = books[0].pk
+        partitions = int_partitions(Book, 10)
+        self.assertEqual(partitions[0].lower, lowest // 10 * 10)
+        self.assertEqual(sum(partition_queryset(Book, partition).count() for partition in partitions), 25)
+        self.assertEqual(partitions[0].key, f'{partitions[0].lower}-{partitions[0].lower + 10}')
+
+
+class ParallelCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='  The   Book ', summary='Summary\n', isbn='ABCDEFG', author=author)
+        Book.objects.create(title='Clean', summary='Summary', isbn='ABCDEFG', author=author)
+        reader = User.objects.create_user(username='reader', password='12345')
+        today = datetime.date.today()
+        # Ids without a common prefix: 16 partitions with --prefix-length 1.
+        cls.lost = BookInstance.objects.create(id=uuid.UUID(int=1), book=cls.book, imprint='Imprint', status='o',
+                                               due_back=today)
+        cls.returned = BookInstance.objects.create(id=uuid.uuid4(), book=cls.book, imprint='Imprint', status='a',
+                                                   borrower=reader, due_back=today)
+        cls.on_loan = BookInstance.objects.create(id=uuid.UUID(int=2 ** 128 - 1), book=cls.book, imprint='Imprint',
+                                                  status='o', borrower=reader, due_back=today)
+
+    def summary(self):
+        return {(row.dimension, row.key, row.status): (row.label, row.count)
+                for row in LoanSummary.objects.filter(count__gt=0)}
+
+    def call(self, name, **options):
+        out = StringIO()
+        call_command(name, processes=0, stdout=out, **options)
+        return out.getvalue()
+
+    @override_settings(BOOK_PAGE_CACHE_TIMEOUT=60)
+    def test_fix_loan_status(self):
+        cache.set(pages.book_detail_key(self.book.pk, True), 'stale page')
+        cache.set(pages.INDEX_COUNTS_KEY, 'stale counts')
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.call('fix_loan_status', prefix_length=1)
+        self.assertIn('3 rows processed, 2 changed', output)
+        self.assertIn('[16/16]', output)
+        self.lost.refresh_from_db()
+        self.returned.refresh_from_db()
+        self.on_loan.refresh_from_db()
+        self.assertEqual((self.lost.status, self.lost.due_back), ('a', None))
+        self.assertEqual((self.returned.borrower, self.returned.due_back), (None, None))
+        self.assertEqual(self.on_loan.status, 'o')
+        self.assertIsNotNone(self.on_loan.borrower)
+        self.assertIsNone(cache.get(pages.book_detail_key(self.book.pk, True)))
+        self.assertIsNone(cache.get(pages.INDEX_COUNTS_KEY))
+
+    def test_dry_run(self):
+        output = self.call('fix_loan_status', prefix_length=1, dry_run=True)
+        self.assertIn('2 changed', output)
+        self.lost.refresh_from_db()
+        self.assertEqual(self.lost.status, 'o')
+
+    @override_settings(BOOK_PAGE_CACHE_TIMEOUT=60)
+    def test_clean_book_titles(self):
+        cache.set(pages.book_detail_key(self.book.pk, False), 'stale page')
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.call('clean_book_titles', partition_size=1)
+        self.assertIn('2 rows processed, 1 changed', output)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.summary), ('The Book', 'Summary'))
+        # As the signals would have: the summary labels are renamed and the page dropped.
+        self.assertEqual(set(LoanSummary.objects.filter(dimension=LoanSummary.BOOK).values_list('label', flat=True)),
+                         {'The Book'})
+        self.assertIsNone(cache.get(pages.book_detail_key(self.book.pk, False)))
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            self.call('fix_loan_status', prefix_length=1, checkpoint=path, dry_run=True)
+            with open(path) as checkpoint:
+                saved = json.load(checkpoint)
+            self.assertEqual(saved['partitioning'], 'uuid:1')
+            self.assertEqual(len(saved['done']), 16)
+
+            # Pretend that the run stopped after the first partition.
+            with open(path, 'w') as checkpoint:
+                json.dump({'partitioning': 'uuid:1', 'done': {'0': [0, 0, 0.1]}}, checkpoint)
+            output = self.call('fix_loan_status', prefix_length=1, checkpoint=path, resume=True)
+            self.assertIn('Resuming: 1 of 16 partitions done.', output)
+            self.assertIn('[15/15]', output)
+
+            with self.assertRaisesMessage(CommandError, 'partitioning uuid:1'):
+                self.call('fix_loan_status', prefix_length=2, checkpoint=path, resume=True)
+
+    def test_resume_keeps_the_common_prefix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            # Written when all the ids started with 0192; those added since don't.
+            with open(path, 'w') as checkpoint:
+                json.dump({'partitioning': 'uuid:1 after 0192', 'prefix': '0192', 'done': {'01920': [0, 0, 0.1]},
+                           'changed': 0}, checkpoint)
+            output = self.call('fix_loan_status', prefix_length=1, checkpoint=path, resume=True)
+            self.assertIn('Resuming: 1 of 16 partitions done.', output)
+            self.assertIn('] 0192f: ', output)
+            with open(path) as checkpoint:
+                saved = json.load(checkpoint)
+            self.assertEqual((saved['partitioning'], saved['prefix']), ('uuid:1 after 0192', '0192'))
+            self.assertEqual(len(saved['done']), 16)
+
+    def test_resume_finishes_the_changes_of_the_interrupted_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            # The interrupted run fixed every copy (bypassing the signals) but recorded one partition only.
+            BookInstance.objects.filter(pk=self.lost.pk).update(status='a', due_back=None)
+            BookInstance.objects.filter(pk=self.returned.pk).update(borrower=None, due_back=None)
+            with open(path, 'w') as checkpoint:
+                json.dump({'partitioning': 'uuid:1', 'done': {'0': [1, 1, 0.1]}, 'changed': 1}, checkpoint)
+            self.assertNotEqual(loan_summary.compute(), self.summary())
+
+            output = self.call('fix_loan_status', prefix_length=1, checkpoint=path, resume=True)
+            self.assertIn(' rows processed, 0 changed', output)
+            # finish() refreshed the summary all the same.
+            self.assertEqual(loan_summary.compute(), self.summary())
+            with open(path) as checkpoint:
+                self.assertEqual(json.load(checkpoint)['changed'], 1)
@@ -0,0 +1,59 @@
+import datetime
+
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.projections import AuthorRow, BookRow, project
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class ProjectionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith',
+                                           date_of_birth=datetime.date(1900, 1, 2))
+        for book_num in range(6):
+            Book.objects.create(title=f'Book {book_num}', summary='Summary ' * 100, isbn='ABCDEFG',
+                                author=cls.author)
+        cls.anonymous = Book.objects.create(title='Anonymous', summary='Summary', isbn='ABCDEFG')
+
+    def test_rows_only_fetch_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(project(Book.objects.order_by('pk'), BookRow))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('summary', queries[0]['sql'])
+        self.assertIsInstance(rows[0], BookRow)
+        self.assertFalse(hasattr(rows[0], '__dict__'))
+        self.assertEqual(rows[0].author, str(self.author))
+        self.assertIsNone(rows[-1].author)
+
+    def test_queryset_methods_keep_the_rows(self):
+        books = project(Book.objects.all(), BookRow)
+        self.assertIsInstance(books.filter(author=self.author).using('default')[:2][0], BookRow)
+        self.assertEqual(books.in_bulk([self.anonymous.pk])[self.anonymous.pk].title, 'Anonymous')
+        self.assertEqual(books.count(), 7)
+
+    def test_rows_render_like_the_models(self):
+        for book in Book.objects.all():
+            row = project(Book.objects.filter(pk=book.pk), BookRow).get()
+            self.assertEqual(render_to_string('catalog/rows/book.html', {'book': row}),
+                             render_to_string('catalog/rows/book.html', {'book': book}))
+        row = project(Author.objects.all(), AuthorRow).get()
+        self.assertEqual(render_to_string('catalog/rows/author.html', {'author': row}),
+                         render_to_string('catalog/rows/author.html', {'author': self.author}))
+
+    def test_book_list_page_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        book_queries = [query['sql'] for query in queries if 'FROM "catalog_book"' in query['sql']
+                        and 'COUNT' not in query['sql']]
+        # The page with its authors, not one more query per book.
+        self.assertEqual(len(book_queries), 1)
+        self.assertContains(response, str(self.author))
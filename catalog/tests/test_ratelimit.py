@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.ratelimit import RateLimit, client_id
+from catalog.tests.utils import plain_static_files
+
+
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.limit = RateLimit('test', rate=1, burst=3)
+
+    def test_burst_then_refused(self):
+        self.assertEqual([self.limit.hit('ip:1', now=100.0) for _ in range(4)], [0, 0, 0, 1])
+        # The other clients have their own bucket.
+        self.assertEqual(self.limit.hit('ip:2', now=100.0), 0)
+
+    def test_tokens_come_back_at_rate(self):
+        for _ in range(3):
+            self.limit.hit('ip:1', now=98.9)
+        # 3 tokens taken at the end of the slot 96-99: they come back over the next slot.
+        self.assertEqual(self.limit.hit('ip:1', now=99.5), 1)
+        self.assertEqual(self.limit.hit('ip:1', now=100.5), 0)
+        self.assertNotEqual(self.limit.hit('ip:1', now=100.5), 0)
+        self.assertEqual([self.limit.hit('ip:1', now=106.0) for _ in range(3)], [0, 0, 0])
+
+    def test_refused_requests_take_no_token(self):
+        for _ in range(10):
+            self.limit.hit('ip:1', now=102.9)
+        # 3 tokens taken in the previous slot, 2 of them back.
+        self.assertEqual(self.limit.hit('ip:1', now=107.0), 0)
+
+    def test_client_id(self):
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_X_FORWARDED_FOR='10.0.0.1, 192.168.1.1', REMOTE_ADDR='10.1.1.1')
+        self.assertEqual(client_id(request), 'ip:10.1.1.1')
+        self.assertEqual(client_id(request, proxies=1), 'ip:192.168.1.1')
+        request.user = User(pk=7, username='reader')
+        self.assertEqual(client_id(request), 'user:7')
+
+
+@plain_static_files
+@override_settings(RATE_LIMIT=True, RATE_LIMITS={'books': (0.01, 2), 'admin:*_changelist': (0.01, 1)})
+class RateLimitMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limited_pages(self):
+        statuses = [self.client.get(reverse('books')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get(reverse('books'))
+        self.assertGreater(int(response['Retry-After']), 0)
+        # The other pages are not limited.
+        self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
+
+    def test_admin_changelists_share_a_limit(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse('admin:catalog_book_changelist')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:catalog_author_changelist')).status_code, 429)
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
+
+    def test_disabled_by_default(self):
+        with self.settings(RATE_LIMIT=False):
+            statuses = {self.client.get(reverse('books')).status_code for _ in range(3)}
+        self.assertEqual(statuses, {200})
@@ -0,0 +1,66 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog import recommendations
+from catalog.models import Author, Book, BookInstance, BookRecommendation, LoanEvent
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+class RecommendationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = [Book.objects.create(title=f'Book {num}', summary='Summary', isbn='ABCDEFG', author=author)
+                     for num in range(4)]
+        cls.readers = [User.objects.create_user(username=f'reader{num}', password='12345') for num in range(3)]
+
+    def borrow(self, reader, *books):
+        LoanEvent.objects.bulk_create([
+            LoanEvent(kind=LoanEvent.CHECKOUT, copy_id='d5e5c4b6-43b6-4b0b-9d9e-2b5b0f5e6e11', book=book,
+                      borrower=reader)
+            for book in books
+        ])
+
+    def test_co_occurrence_counts_pairs(self):
+        pairs = recommendations.co_occurrence([[1, 2, 3], [1, 2], [4], [1, 2, 3, 4]], max_basket=3)
+        self.assertEqual(pairs, {(1, 2): 2, (1, 3): 1, (2, 3): 1})
+        self.assertEqual(recommendations.top_neighbours(pairs, top=1), {1: [(2, 2)], 2: [(1, 2)], 3: [(1, 1)]})
+
+    def test_build_from_loan_log_and_current_loans(self):
+        book0, book1, book2, book3 = self.books
+        self.borrow(self.readers[0], book0, book1, book2)
+        self.borrow(self.readers[1], book0, book1)
+        BookInstance.objects.create(book=book2, imprint='Imprint', status='o', borrower=self.readers[1])
+        self.borrow(self.readers[2], book3)
+
+        out = StringIO()
+        call_command('build_recommendations', top=2, stdout=out)
+        self.assertIn('6 recommendations written', out.getvalue())
+        self.assertEqual(
+            [(row.recommended, row.score) for row in book0.recommendations.all()], [(book1, 2), (book2, 2)])
+        self.assertEqual(
+            [(row.recommended, row.score) for row in book2.recommendations.all()], [(book0, 2), (book1, 2)])
+        self.assertFalse(book3.recommendations.exists())
+
+        # Rebuilding replaces the rows.
+        call_command('build_recommendations', top=1, stdout=out)
+        self.assertEqual(BookRecommendation.objects.count(), 3)
+
+    def test_detail_page_reads_recommendations_in_one_query(self):
+        response = self.client.get(self.books[0].get_absolute_url())
+        self.assertNotContains(response, 'also borrowed')
+
+        BookRecommendation.objects.create(book=self.books[0], recommended=self.books[1], rank=1, score=2)
+        BookRecommendation.objects.create(book=self.books[0], recommended=self.books[2], rank=2, score=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.books[0].get_absolute_url())
+        self.assertEqual(sum('catalog_bookrecommendation' in query['sql'] for query in queries), 1)
+        self.assertContains(response, 'Readers who borrowed this also borrowed')
+        self.assertContains(response, f'<a href="{self.books[1].get_absolute_url()}">Book 1</a>', html=True)
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from catalog import replay
+from catalog.models import Author, Book
+from catalog.tests.utils import plain_static_files
+
+
+class ScheduleTest(SimpleTestCase):
+
+    def request(self, time, route='books'):
+        return replay.Request(time, 'GET', '/', None, 200, 10.0, route)
+
+    def test_spacing_divided_by_the_speedup(self):
+        plan = replay.schedule([self.request(105.0), self.request(100.0), self.request(101.0)], speedup=2)
+        self.assertEqual([offset for offset, _ in plan], [0.0, 0.5, 2.5])
+
+    def test_untimed_requests_start_at_once(self):
+        plan = replay.schedule([self.request(100.0), self.request(None)])
+        self.assertEqual([offset for offset, _ in plan], [0.0, 0.0])
+        self.assertEqual([offset for offset, _ in replay.schedule([self.request(100.0), self.request(101.0)], 0)],
+                         [0.0, 0.0])
+
+    def test_summarize(self):
+        results = [replay.Result(self.request(100.0), 200, seconds, 0.0) for seconds in (0.01, 0.02, 0.03, 0.04)]
+        results.append(replay.Result(self.request(100.0, route='index'), 500, 0.001, 0.0))
+        books, index = replay.summarize(results)
+        self.assertEqual((books.route, books.count, books.errors), ('books', 4, 0))
+        self.assertAlmostEqual(replay.percentile(books.replayed, 0.5), 20.0)
+        self.assertAlmostEqual(replay.percentile(books.replayed, 0.95), 40.0)
+        self.assertAlmostEqual(books.ratio(), 2.0)
+        self.assertEqual(index.errors, 1)
+
+
+@plain_static_files
+class ReplayRequestsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        User.objects.create_user(username='reader', password='12345')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.trace = os.path.join(directory.name, 'trace.jsonl')
+        records = [
+            # The profiling log format.
+            {'time': 1000.0, 'method': 'GET', 'path': reverse('books'), 'query': 'page=1', 'user': None,
+             'status': 200, 'queries': 2, 'total_ms': 12.5},
+            {'time': 1000.1, 'method': 'GET', 'path': reverse('my-borrowed'), 'user': 'reader', 'status': 200,
+             'total_ms': 8.0},
+            {'time': 1000.1, 'method': 'GET', 'path': reverse('my-borrowed'), 'user': 'nobody', 'status': 200},
+            {'time': 1000.2, 'method': 'GET', 'path': reverse('book-detail', args=[self.book.pk]),
+             'status': 200, 'duration_ms': 20.0},
+            {'time': 1000.2, 'method': 'POST', 'path': reverse('book-create'), 'status': 302},
+            {'time': '1970-01-01T00:16:40.300+00:00', 'path': '/missing/', 'status': 404},
+            {'method': 'GET', 'path': reverse('books'), 'cprofile': '/tmp/profile.prof'},
+        ]
+        with open(self.trace, 'w') as trace:
+            trace.write('\n'.join(json.dumps(record) for record in records) + '\n')
+
+    def test_read_trace(self):
+        requests = list(replay.read_trace(self.trace))
+        self.assertEqual([request.route for request in requests],
+                         ['books', 'my-borrowed', 'my-borrowed', 'book-detail', replay.UNRESOLVED])
+        self.assertEqual(requests[0].url, f'{reverse("books")}?page=1')
+        self.assertEqual([request.recorded_ms for request in requests], [12.5, 8.0, None, 20.0, None])
+        self.assertAlmostEqual(requests[-1].time, 1000.3)
+
+    def test_replay_report(self):
+        out = StringIO()
+        call_command('replay_requests', self.trace, speedup=0, workers=0, stdout=out)
+        out = out.getvalue()
+        self.assertIn('1 of the 2 users of the trace are unknown here', out)
+        lines = {line.split()[0]: line.split() for line in out.splitlines() if line.split()}
+        self.assertEqual(lines['books'][1:3], ['1', '0'])
+        # The anonymous request is redirected to the login page.
+        self.assertEqual(lines['my-borrowed'][1:3], ['2', '0'])
+        self.assertIn('1 requests with another status than recorded', out)
+        self.assertEqual(lines['book-detail'][6], '20.0')
+        self.assertEqual(lines['(unresolved)'][6:], ['-', '-', '-'])
+        self.assertIn('5 requests replayed, 0 errors.', out)
@@ -0,0 +1,37 @@
+import uuid
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse, set_script_prefix
+
+from catalog import reversing
+from catalog.models import Author, Book
+
+
+class UrlForTest(SimpleTestCase):
+
+    def tearDown(self):
+        set_script_prefix('/')
+
+    def test_same_as_reverse(self):
+        copy_id = uuid.uuid4()
+        for name, args in (('index', ()), ('book-detail', (7,)), ('author-update', (12,)),
+                           ('renew-book-librarystaff', (copy_id,)), ('login', ())):
+            self.assertEqual(reversing.url_for(name, *args), reverse(name, args=args))
+        self.assertEqual(Book(pk=918273645).get_absolute_url(), '/catalog/book/918273645')
+        self.assertEqual(Author(pk=3).get_absolute_url(), '/catalog/author/3')
+
+    def test_script_prefix_is_part_of_the_cache_key(self):
+        self.assertEqual(reversing.url_for('book-detail', 1), '/catalog/book/1')
+        set_script_prefix('/library/')
+        self.assertEqual(reversing.url_for('book-detail', 1), '/library/catalog/book/1')
+
+    def test_other_arguments_use_reverse(self):
+        self.assertEqual(reversing.url_for('book-detail', '5'), '/catalog/book/5')
+        with self.assertRaisesMessage(Exception, 'Reverse'):
+            reversing.url_for('book-detail', -1)
+
+    def test_cache_cleared_with_the_urlconf(self):
+        self.assertEqual(reversing.url_for('book-detail', 1), '/catalog/book/1')
+        with override_settings(ROOT_URLCONF='catalog.urls'):
+            self.assertEqual(reversing.url_for('book-detail', 1), '/book/1')
+        self.assertEqual(reversing.url_for('book-detail', 1), '/catalog/book/1')
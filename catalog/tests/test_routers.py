@@ -0,0 +1,112 @@
+import datetime
+import os
+import tempfile
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import autocomplete, bitmaps, facets
+from catalog.models import Author, Book, BookInstance, Language
+from catalog.routers import ReplicaRouter, pin_to_primary
+from catalog.tests.utils import plain_static_files
+
+REPLICA = 'replica_test'
+
+
+@plain_static_files
+class ReplicaRouterTest(TestCase):
+    """
+    The primary is the test database of 'default', the replica a second SQLite file holding
+    different rows, so the tests can tell which database answered.
+    """
+    # The replica alias is only added to the connections in setUpClass().
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[REPLICA] = dict(connections.databases['default'], NAME=cls.replica_name, TEST={})
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        os.remove(cls.replica_name)
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Primary Book', summary='Summary', isbn='ABCDEFG', author=author)
+        replica_author = Author.objects.using(REPLICA).create(first_name='Jane', last_name='Doe')
+        Book.objects.using(REPLICA).create(title='Replica Book', summary='Summary', isbn='ABCDEFG',
+                                           author=replica_author)
+
+        cls.staff = User.objects.create_user(username='staff', password='12345')
+        cls.staff.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o', borrower=cls.staff,
+                                               due_back=datetime.date.today())
+
+    def test_router_without_replicas(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Book), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_catalog_reads_go_to_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Book), REPLICA)
+        self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_write(Book), 'default')
+        self.assertFalse(router.allow_migrate(REPLICA, 'catalog'))
+        with pin_to_primary():
+            self.assertEqual(router.db_for_read(Book), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_read_only_views_use_replica(self):
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Replica Book')
+        self.assertNotContains(response, 'Primary Book')
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_SECONDS=15)
+    def test_reads_stick_to_primary_after_post(self):
+        self.client.login(username='staff', password='12345')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        response = self.client.post(reverse('renew-book-librarystaff', kwargs={'pk': self.copy.pk}),
+                                    {'renewal_date': renewal_date})
+        self.assertRedirects(response, reverse('all-borrowed'))
+        self.assertEqual(response.cookies['primary_db_pin']['max-age'], 15)
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.due_back, renewal_date)
+
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Primary Book')
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_mutation_views_read_from_primary(self):
+        self.client.login(username='staff', password='12345')
+        response = self.client.get(reverse('renew-book-librarystaff', kwargs={'pk': self.copy.pk}))
+        self.assertContains(response, 'Renew: Primary Book')
+        response = self.client.get(reverse('book-update', kwargs={'pk': self.book.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_facets_and_indexes_read_from_replica(self):
+        selected = {facet: set() for facet in facets.FACETS}
+        self.assertEqual([label for label, _ in facets.counts(selected, only=['author'])['author'].values()],
+                         ['Doe, Jane'])
+        autocomplete.index.invalidate()
+        self.addCleanup(autocomplete.index.invalidate)
+        self.assertEqual([label for _, label in autocomplete.index.search('books', 'book')], ['Replica Book'])
+        bitmaps.index.invalidate()
+        self.addCleanup(bitmaps.index.invalidate)
+        Language.objects.using(REPLICA).create(name='Latin')
+        bitmaps.index.ensure_current()
+        self.assertEqual(list(bitmaps.index.language_names.values()), ['Latin'])
+        with pin_to_primary():
+            self.assertEqual([label for label, _ in facets.counts(selected, only=['author'])['author'].values()],
+                             ['Smith, John'])
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase
+
+from catalog.models import BookInstance
+from catalog.slow_queries import SlowQueryLog, fingerprint, read_log
+
+
+class FingerprintTest(SimpleTestCase):
+
+    def test_parameters_are_normalized(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND  b = 42 AND c IN (%s, %s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)',
+        )
+
+    def test_identifiers_with_digits_are_kept(self):
+        self.assertEqual(fingerprint('SELECT "t1"."id" FROM "t1" LIMIT 10'), 'SELECT "t1"."id" FROM "t1" LIMIT ?')
+
+
+class SlowQueryLogTest(TestCase):
+
+    def setUp(self):
+        handle, self.log_path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.log_path)
+
+    def test_slow_queries_are_recorded_with_plan_and_stack(self):
+        with connection.execute_wrapper(SlowQueryLog(0, self.log_path)):
+            list(BookInstance.objects.filter(status__exact='o'))
+            list(BookInstance.objects.filter(status__exact='a'))
+
+        entries = list(read_log(self.log_path))
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['fingerprint'], entries[1]['fingerprint'])
+        self.assertIn('"catalog_bookinstance"."status" = ?', entries[0]['fingerprint'])
+        self.assertTrue(any('catalog_bookinstance' in line for line in entries[0]['plan']))
+        self.assertTrue(entries[0]['stack'][-1].startswith(os.path.join('catalog', 'tests', 'test_slow_queries.py')))
+
+    def test_templates_are_recorded(self):
+        template = Template('{% for copy in copies %}{{ copy }}{% endfor %}')
+        template.name = 'copies.html'
+        with connection.execute_wrapper(SlowQueryLog(0, self.log_path)):
+            template.render(Context({'copies': BookInstance.objects.all()}))
+
+        entries = list(read_log(self.log_path))
+        self.assertEqual(entries[0]['templates'], ['copies.html'])
+
+    def test_fast_queries_are_not_recorded(self):
+        with connection.execute_wrapper(SlowQueryLog(60 * 1000, self.log_path)):
+            list(BookInstance.objects.all())
+        self.assertEqual(list(read_log(self.log_path)), [])
+
+    def test_report_groups_by_fingerprint(self):
+        with connection.execute_wrapper(SlowQueryLog(0, self.log_path)):
+            for status in 'moar':
+                list(BookInstance.objects.filter(status__exact=status))
+
+        out = StringIO()
+        call_command('slow_queries', log=self.log_path, table='catalog_bookinstance', stdout=out)
+        output = out.getvalue()
+        self.assertIn('count=4', output)
+        self.assertIn('table scan: catalog_bookinstance', output)
+        self.assertIn('1 fingerprints, 4 slow queries.', output)
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.urls import resolve, reverse
+
+from catalog.lazyviews import LazyModule, LazyView, load_all
+
+
+def imported_modules(*args, **environ):
+    """
+    Returns the modules imported by `manage.py *args`, from the report of python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', *args], cwd=settings.BASE_DIR,
+        env={**os.environ, **environ}, capture_output=True, text=True, check=True)
+    # "import time: self [us] | cumulative | imported package" lines.
+    return {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines()
+            if line.startswith('import time:')}
+
+
+class StartupImportsTest(SimpleTestCase):
+
+    def test_commands_do_not_import_the_views(self):
+        modules = imported_modules('check')
+        self.assertNotIn('catalog.views', modules)
+        self.assertNotIn('catalog.forms', modules)
+        self.assertIn('django.contrib.admin.sites', modules)
+
+    def test_worker_processes_can_skip_the_admin(self):
+        modules = imported_modules('check', DJANGO_ADMIN='')
+        self.assertFalse([module for module in modules if module.startswith('django.contrib.admin')])
+        self.assertNotIn('catalog.admin', modules)
+
+
+class LazyViewTest(SimpleTestCase):
+
+    def test_view_is_imported_on_first_call(self):
+        view = LazyModule('catalog.views').AuthorListView.as_view(paginate_by=3)
+        self.assertIsNone(view._view)
+        self.assertEqual(view.view_initkwargs, {'paginate_by': 3})
+        self.assertEqual(view.view_class.__name__, 'AuthorListView')
+
+    def test_resolved_like_the_view(self):
+        match = resolve(reverse('books'))
+        self.assertIsInstance(match.func, LazyView)
+        self.assertEqual(match._func_path, 'catalog.views.BookListView')
+        self.assertEqual(match.view_name, 'books')
+
+    def test_load_all(self):
+        self.assertGreater(load_all(), 10)
+        callback = resolve(reverse('metrics')).func
+        self.assertIsNotNone(callback._view)
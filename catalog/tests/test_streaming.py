@@ -0,0 +1,90 @@
+import datetime
+import re
+
+from django.contrib.auth.models import Permission, User
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+from catalog.views import AuthorListView
+from catalog.tests.utils import plain_static_files
+
+
+def normalize(content):
+    return re.sub(r'\s+', ' ', content.decode())
+
+
+@plain_static_files
+class StreamingListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(13):
+            Author.objects.create(first_name=f'Christian {author_num}', last_name=f'Surname {author_num}')
+        cls.librarian = User.objects.create_user(username='librarian', password='12345', is_staff=True)
+        cls.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG',
+                                   author=Author.objects.first())
+        for copy_num in range(5):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=cls.librarian,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=copy_num))
+
+    def get(self, name, **params):
+        self.client.force_login(self.librarian)
+        return self.client.get(reverse(name), params)
+
+    def test_disabled_by_default(self):
+        response = self.get('authors')
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    def test_streamed_pages_are_the_same(self):
+        for name in ('books', 'authors', 'my-borrowed', 'all-borrowed'):
+            with self.subTest(name=name):
+                expected = self.get(name).content
+                with override_settings(STREAMING_LISTS=True):
+                    response = self.get(name)
+                self.assertIsInstance(response, StreamingHttpResponse)
+                self.assertEqual(normalize(b''.join(response.streaming_content)), normalize(expected))
+
+    @override_settings(STREAMING_LISTS=True)
+    def test_top_of_the_page_is_sent_before_the_rows_are_read(self):
+        response = self.get('authors')
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            head = next(chunks)
+        self.assertIn(b'<h1>Author List</h1>', head)
+        self.assertNotIn(b'Surname', head)
+        with self.assertNumQueries(1):
+            rows = next(chunks)
+        self.assertEqual(rows.count(b'<li>'), 10)
+
+    @override_settings(STREAMING_LISTS=True)
+    def test_rows_are_sent_in_chunks(self):
+        self.client.force_login(self.librarian)
+        chunk_size = AuthorListView.stream_chunk_size
+        try:
+            AuthorListView.stream_chunk_size = 4
+            response = self.client.get(reverse('authors'))
+            chunks = list(response.streaming_content)
+        finally:
+            AuthorListView.stream_chunk_size = chunk_size
+        # The top of the page, 4 + 4 + 2 rows, the rest of the page.
+        self.assertEqual([chunk.count(b'<li>') for chunk in chunks[1:-1]], [4, 4, 2])
+
+    @override_settings(STREAMING_LISTS=True)
+    def test_empty_list(self):
+        BookInstance.objects.all().delete()
+        response = self.get('all-borrowed')
+        self.assertContains(response, 'There are no books borrowed.')
+
+    def test_loan_rows_read_with_their_book_and_borrower(self):
+        self.client.force_login(self.librarian)
+        for name in ('my-borrowed', 'all-borrowed'):
+            for streaming in (False, True):
+                with self.subTest(name=name, streaming=streaming), override_settings(STREAMING_LISTS=streaming):
+                    # Session, user, 2 for the permissions, count, rows: not one query per row.
+                    with self.assertNumQueries(6):
+                        response = self.client.get(reverse(name))
+                        if streaming:
+                            b''.join(response.streaming_content)
@@ -0,0 +1,203 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import taskqueue
+from catalog.models import Author, Book, BookInstance, Task
+from catalog.tests.utils import plain_static_files
+
+calls = []
+
+
+@taskqueue.task
+def record(value, twice=False):
+    calls.append(value * 2 if twice else value)
+
+
+@taskqueue.task(max_attempts=2, retry_delay=10)
+def fail():
+    raise RuntimeError('Mail server down')
+
+
+def not_a_task():
+    calls.append('not a task')
+
+
+class TaskQueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        task = record.enqueue(21, twice=True)
+        self.assertEqual((task.name, task.args, task.kwargs), ('catalog.tests.test_taskqueue.record', [21], {'twice': True}))
+        self.assertIs(taskqueue.run_next('worker'), True)
+        self.assertEqual(calls, [42])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.locked_by), (Task.DONE, 1, 'worker'))
+        self.assertIsNotNone(task.finished)
+        self.assertIsNone(taskqueue.run_next('worker'))
+
+    def test_tasks_run_in_order_when_due(self):
+        later = taskqueue.enqueue(record, ['later'], run_at=timezone.now() + datetime.timedelta(hours=1))
+        record.enqueue('first')
+        record.enqueue('second')
+        while taskqueue.run_next('worker') is not None:
+            pass
+        self.assertEqual(calls, ['first', 'second'])
+        later.refresh_from_db()
+        self.assertEqual(later.status, Task.QUEUED)
+
+    def test_claimed_tasks_are_not_claimed_again(self):
+        record.enqueue('once')
+        self.assertIsNotNone(taskqueue.claim('worker-1'))
+        self.assertIsNone(taskqueue.claim('worker-2'))
+
+    def test_retries_with_backoff(self):
+        task = fail.enqueue()
+        with self.assertLogs('catalog.tasks', level='WARNING'):
+            self.assertIs(taskqueue.run_next('worker'), False)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn('Mail server down', task.last_error)
+        self.assertGreater(task.run_at, timezone.now() + datetime.timedelta(seconds=7))
+        self.assertIsNone(taskqueue.run_next('worker'))
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        with self.assertLogs('catalog.tasks', level='ERROR'):
+            taskqueue.run_next('worker')
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_retry_delay_doubles(self):
+        delays = [taskqueue.retry_delay(fail, attempts).total_seconds() for attempts in (1, 2, 3)]
+        for delay, expected in zip(delays, (10, 20, 40)):
+            self.assertTrue(expected * 0.8 <= delay <= expected * 1.2)
+        self.assertLessEqual(taskqueue.retry_delay(fail, 30).total_seconds(), taskqueue.MAX_RETRY_DELAY * 1.2)
+
+    def test_only_decorated_functions_run(self):
+        task = Task.objects.create(name='catalog.tests.test_taskqueue.not_a_task')
+        with self.assertLogs('catalog.tasks', level='ERROR'):
+            self.assertIs(taskqueue.run_next('worker'), False)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(calls, [])
+
+    @override_settings(TASK_SCHEDULE={'hourly': {'task': 'catalog.tests.test_taskqueue.record', 'every': 3600,
+                                                 'args': ['tick']}})
+    def test_periodic_tasks_are_queued_once_per_period(self):
+        now = timezone.now()
+        self.assertEqual(taskqueue.schedule(now), 1)
+        self.assertEqual(taskqueue.schedule(now), 0)
+        task = Task.objects.get()
+        self.assertLessEqual(task.run_at, now)
+        self.assertEqual(task.args, ['tick'])
+        self.assertEqual(taskqueue.schedule(now + datetime.timedelta(hours=1)), 1)
+
+    def test_stale_tasks_are_queued_again(self):
+        task = record.enqueue('lost')
+        taskqueue.claim('dead-worker')
+        Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - datetime.timedelta(hours=2))
+        self.assertEqual(taskqueue.requeue_stale(datetime.timedelta(hours=1)), 1)
+        self.assertIs(taskqueue.run_next('worker'), True)
+        self.assertEqual(calls, ['lost'])
+
+    def test_stale_run_does_not_finish_the_next_attempt(self):
+        task = record.enqueue('slow')
+        stale = taskqueue.claim('slow-worker')
+        Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - datetime.timedelta(hours=2))
+        taskqueue.requeue_stale(datetime.timedelta(hours=1))
+        current = taskqueue.claim('worker')
+        self.assertIs(taskqueue.run(stale), False)  # The slow worker finishes after all.
+        self.assertEqual(Task.objects.get(pk=task.pk).status, Task.RUNNING)
+        self.assertIs(taskqueue.run(current), True)
+        self.assertEqual((Task.objects.get(pk=task.pk).status, calls), (Task.DONE, ['slow', 'slow']))
+
+    def test_purge(self):
+        record.enqueue('old')
+        taskqueue.run_next('worker')
+        self.assertEqual(taskqueue.purge(datetime.timedelta(days=7)), 0)
+        Task.objects.update(finished=timezone.now() - datetime.timedelta(days=8))
+        self.assertEqual(taskqueue.purge(datetime.timedelta(days=7)), 1)
+
+
+@override_settings(EMAIL_BACKEND='catalog.mail.QueuedEmailBackend',
+                   QUEUED_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class QueuedEmailTest(TestCase):
+
+    def test_mail_is_sent_by_the_worker(self):
+        message = mail.EmailMultiAlternatives('Subject', 'Body', 'library@example.com', ['reader@example.com'])
+        message.attach_alternative('<p>Body</p>', 'text/html')
+        message.attach('card.bin', b'\x00\x01', 'application/octet-stream')
+        message.send()
+        self.assertEqual(mail.outbox, [])
+
+        self.assertIs(taskqueue.run_next('worker'), True)
+        sent, = mail.outbox
+        self.assertEqual((sent.subject, sent.body, sent.to), ('Subject', 'Body', ['reader@example.com']))
+        self.assertEqual(sent.alternatives, [('<p>Body</p>', 'text/html')])
+        self.assertEqual(sent.attachments, [('card.bin', b'\x00\x01', 'application/octet-stream')])
+
+    def test_password_reset_returns_before_sending(self):
+        User.objects.create_user(username='reader', email='reader@example.com', password='12345')
+        response = self.client.post(reverse('password_reset'), {'email': 'reader@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.get().name, 'catalog.mail.send_email')
+
+    def test_overdue_notices(self):
+        from catalog import tasks
+
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='12345')
+        book = Book.objects.create(title='Overdue Book', summary='Summary', isbn='ABCDEFG',
+                                   author=Author.objects.create(first_name='John', last_name='Smith'))
+        for days in (-3, -1, 5):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=reader,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=days))
+        self.assertEqual(tasks.send_overdue_notices(), 1)
+        while taskqueue.run_next('worker') is not None:
+            pass
+        sent, = mail.outbox
+        self.assertEqual(sent.to, ['reader@example.com'])
+        self.assertEqual(sent.body.count('Overdue Book'), 2)
+
+
+@plain_static_files
+class LoanSummaryRefreshTest(TestCase):
+
+    def test_recount_is_queued(self):
+        librarian = User.objects.create_user(username='librarian', password='12345')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.force_login(librarian)
+        response = self.client.post(reverse('loan-summary-refresh'))
+        self.assertRedirects(response, reverse('loan-summary') + '?refresh=queued')
+        task = Task.objects.get()
+        self.assertEqual((task.name, task.kwargs), ('catalog.tasks.refresh_loan_summary', {'full': True}))
+        self.assertContains(self.client.get(response.url), 'A recount is queued')
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get(reverse('loan-summary-refresh')).status_code, 405)
+
+
+class RunWorkerCommandTest(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(TASK_SCHEDULE={})
+    def test_burst(self):
+        for value in range(3):
+            record.enqueue(value)
+        fail.enqueue()
+        out = StringIO()
+        with self.assertLogs('catalog.tasks', level='WARNING'):
+            call_command('run_worker', processes=0, burst=True, stdout=out)
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertIn('3 tasks done, 1 failed', out.getvalue())
+        self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 1)
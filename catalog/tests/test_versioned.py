@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from catalog.versioned import VersionedIndex
+
+
+class Counter(VersionedIndex):
+    version_key = 'catalog:test-counter-version'
+
+    def __init__(self):
+        super().__init__()
+        self.builds = 0
+
+    def build(self, using=None):
+        version = self.read_version()
+        with self._lock:
+            self.builds += 1
+            self.value = 0
+            self.loaded(version)
+
+
+class VersionedIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.index = Counter()
+
+    def test_built_once_until_changed_elsewhere(self):
+        self.index.ensure_current()
+        self.index.ensure_current()
+        self.assertEqual(self.index.builds, 1)
+        cache.incr(Counter.version_key)  # Done by another process.
+        self.index.ensure_current()
+        self.assertEqual(self.index.builds, 2)
+
+    def test_own_updates_keep_the_index_current(self):
+        self.index.ensure_current()
+        self.index._apply(lambda: setattr(self.index, 'value', 1))
+        self.index.ensure_current()
+        self.assertEqual((self.index.builds, self.index.value), (1, 1))
+        # Missed a change of another process: built again.
+        cache.incr(Counter.version_key)
+        self.index._apply(lambda: setattr(self.index, 'value', 2))
+        self.assertFalse(self.index.built)
+        self.index.ensure_current()
+        self.assertEqual((self.index.builds, self.index.value), (2, 0))
+
+    def test_invalidate(self):
+        self.index.ensure_current()
+        other = Counter()
+        other.ensure_current()
+        self.index.invalidate()
+        other.ensure_current()
+        self.assertEqual(other.builds, 2)
@@ -5,7 +5,9 @@ from django.urls import reverse
 from django.contrib.auth.models import User, Permission
 from catalog.models import Author, BookInstance, Book, Genre, Language
 import uuid
+from catalog.tests.utils import plain_static_files
 
+@plain_static_files
 class AuthorListViewTest(TestCase):
 
     @classmethod
@@ -44,6 +46,7 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(len(response.context['author_list']) == 3)
 
 
+@plain_static_files
 class LoanedBookInstancesByUserListViewTest(TestCase):
 
     def setUp(self):
@@ -59,7 +62,7 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
         test_language = Language.objects.create(name='English')
         test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=test_author, language=test_language)
         genre_objects_for_book = Genre.objects.all()
-        test_book.genre = genre_objects_for_book
+        test_book.genre.set(genre_objects_for_book)
         test_book.save()
 
         # Создание 30 объектов BookInstance
@@ -147,6 +150,7 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
 
 
 
+@plain_static_files
 class RenewBookInstancesViewTest(TestCase):
 
     def setUp(self):
@@ -166,7 +170,7 @@ class RenewBookInstancesViewTest(TestCase):
         test_language = Language.objects.create(name='English')
         test_book = Book.objects.create(title='Book Title', summary='My Book Summary', isbn='ABCDEFG', author=test_author, language=test_language)
         genre_objects_for_book = Genre.objects.all()
-        test_book.genre = genre_objects_for_book
+        test_book.genre.set(genre_objects_for_book)
         test_book.save()
 
         # Создание объекта BookInstance для пользователя test_user1
@@ -244,6 +248,7 @@ class RenewBookInstancesViewTest(TestCase):
         self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
 
 
+@plain_static_files
 class AuthorCreateModelTest(TestCase):
     def setUp(self):
         test_user1 = User.objects.create_user(username='testuser1', password='12345')
@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import pages
+from catalog.management.commands.warm_cache import default_urls
+from catalog.models import Author, Book, BookInstance
+from catalog.tests.utils import plain_static_files
+
+
+@plain_static_files
+@override_settings(BOOK_PAGE_CACHE_TIMEOUT=60, INDEX_COUNTS_CACHE_TIMEOUT=60)
+class WarmCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = [Book.objects.create(title=f'Book {num}', summary='Summary', isbn='ABCDEFG', author=author)
+                     for num in range(10)]
+        # Book 3 has the most copies, then book 7.
+        for book, copies in ((cls.books[3], 3), (cls.books[7], 2), (cls.books[0], 1)):
+            for _ in range(copies):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def warm_cache(self, *args, **options):
+        out, err = StringIO(), StringIO()
+        call_command('warm_cache', *args, threads=0, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_default_urls(self):
+        urls = default_urls(list_pages=5, top_books=2)
+        # 10 books, 4 per page: 3 pages; 1 author: 1 page.
+        self.assertEqual(urls, [
+            reverse('index'), reverse('books'), f'{reverse("books")}?page=2', f'{reverse("books")}?page=3',
+            reverse('authors'),
+            reverse('book-detail', args=[self.books[3].pk]), reverse('book-detail', args=[self.books[7].pk]),
+        ])
+
+    def test_fills_the_cache(self):
+        out, err = self.warm_cache(top_books=2)
+        self.assertEqual(err, '')
+        self.assertIn('7 pages warmed, 0 failed.', out)
+        self.assertIn('Cache fill: home page counts cached, 2 of 2 book pages cached', out)
+        self.assertIsNotNone(cache.get(pages.book_detail_key(self.books[3].pk, False)))
+
+    def test_given_urls(self):
+        out, err = self.warm_cache(reverse('authors'), '/catalog/missing/')
+        self.assertIn('1 pages warmed, 1 failed.', out)
+        self.assertEqual(err, '/catalog/missing/: 404\n')
@@ -0,0 +1,5 @@
+from django.test import override_settings
+
+# The templates name the static files through STATICFILES_STORAGE: the manifest storage used in
+# production needs a `collectstatic` run, the tests rendering pages use the plain file names.
+plain_static_files = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
@@ -1,23 +1,29 @@
 from django.urls import path
-from . import views
-from django.conf.urls import url
+from catalog.lazyviews import LazyModule
+
+# The views are imported on their first request (see catalog.lazyviews).
+views = LazyModule('catalog.views')
 
 
 urlpatterns = [
-    url(r'^$', views.index, name='index'),
-    url(r'^books/$', views.BookListView.as_view(), name='books'),
-    url(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
-    url(r'^authors/$', views.AuthorListView.as_view(), name='authors'),
-    url(r'^author/(?P<pk>\d+)$', views.AuthorDetailView.as_view(), name='author-detail'),
-    url(r'^mybooks/$', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
-    url(r'^borrowed/$', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),
-    url(r'^book/(?P<pk>[-\w]+)/renew/$', views.renew_book_librarystaff, name='renew-book-librarystaff'),
-    url(r'^author/create/$', views.AuthorCreate.as_view(), name='author-create'),
-    url(r'^author/(?P<pk>\d+)/update/$', views.AuthorUpdate.as_view(), name='author-update'),
-    url(r'^author/(?P<pk>\d+)/delete/$', views.AuthorDelete.as_view(), name='author-delete'),
-    url(r'^book/create/$', views.BookCreate.as_view(), name='book-create'),
-    url(r'^book/(?P<pk>\d+)/update/$', views.BookUpdate.as_view(), name='book-update'),
-    url(r'^book/(?P<pk>\d+)/delete/$', views.BookDelete.as_view(), name='book-delete'),
+    path('', views.index, name='index'),
+    path('books/', views.BookListView.as_view(), name='books'),
+    path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('authors/', views.AuthorListView.as_view(), name='authors'),
+    path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+    path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
+    path('borrowed/', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),
+    path('reports/loans/', views.loan_summary_report, name='loan-summary'),
+    path('reports/loans/refresh/', views.loan_summary_refresh, name='loan-summary-refresh'),
+    path('reports/circulation.csv', views.circulation_report_csv, name='circulation-csv'),
+    path('book/<uuid:pk>/renew/', views.renew_book_librarystaff, name='renew-book-librarystaff'),
+    path('author/create/', views.AuthorCreate.as_view(), name='author-create'),
+    path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author-update'),
+    path('author/<int:pk>/delete/', views.AuthorDelete.as_view(), name='author-delete'),
+    path('book/create/', views.BookCreate.as_view(), name='book-create'),
+    path('book/<int:pk>/update/', views.BookUpdate.as_view(), name='book-update'),
+    path('book/<int:pk>/delete/', views.BookDelete.as_view(), name='book-delete'),
+    path('autocomplete/', views.autocomplete_lookup, name='autocomplete'),
 
 ]
 
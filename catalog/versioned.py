@@ -0,0 +1,77 @@
+"""
+In-memory structures built from the database once per process (the bitmap index, the autocomplete
+indexes, the compiled loan policy) and kept current across processes.
+
+A version number in the default cache counts the changes: a process builds its structure with
+the version read before the data, and builds it again on next use when the version moved, i.e.
+when another process (gunicorn worker) changed the data. A change made in this process is applied
+to its own structure and bumps the version; the structure stays current unless another process
+bumped it meanwhile. The version only reaches the other processes with a cache they share.
+"""
+import threading
+
+from django.core.cache import cache
+
+
+class VersionedIndex:
+    """
+    Base class of the structures: subclasses set version_key and implement build().
+    """
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self.version = None
+
+    def build(self, using=None):
+        """
+        Loads the structure from the database using, by default the one the router chooses. Reads
+        read_version() first and passes it to loaded() once done.
+        """
+        raise NotImplementedError('subclasses of VersionedIndex must provide a build() method')
+
+    def read_version(self):
+        # Read before the data: a change made meanwhile triggers another build.
+        return cache.get_or_set(self.version_key, 0, None)
+
+    def loaded(self, version):
+        """
+        Marks the structure built at version; called by build() holding the lock.
+        """
+        self.version = version
+        self.built = True
+
+    def ensure_current(self):
+        """
+        Builds the structure if it was never built or was changed by another process.
+        """
+        if not self.built or cache.get(self.version_key) != self.version:
+            self.build()
+
+    def invalidate(self):
+        """
+        Makes every process build its structure again on next use, e.g. after changes bypassing
+        the signals (QuerySet.update(), bulk_create(), bulk_update()).
+        """
+        with self._lock:
+            self.built = False
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                pass
+
+    def _apply(self, update):
+        """
+        Applies an update to this structure (if built) and bumps the shared version.
+        """
+        with self._lock:
+            if self.built:
+                update()
+            try:
+                version = cache.incr(self.version_key)
+            except ValueError:
+                version = None
+            if version is None or self.version is None or version != self.version + 1:
+                self.built = False
+            self.version = version
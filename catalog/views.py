@@ -1,13 +1,22 @@
+import csv
 import datetime
+import hmac
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.views import generic
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
-from .models import Book, Author, BookInstance, Genre
-from catalog.forms import RenewBookForm
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from .models import Book, Author, BookInstance, LoanSummary
+from catalog.forms import AuthorForm, BookForm, RenewBookForm
+from catalog import autocomplete, bitmaps, facets, loan_events, loan_policy, metrics, pages, tasks
+from catalog.projections import AuthorRow, BookRow, project
+from catalog.routers import PrimaryDatabaseMixin, primary_database
+from catalog.streaming import StreamingListMixin
 
 
 # Create your views here.
@@ -16,13 +25,9 @@ def index(request):
     """
     Функция отоброжения для домашней страницы сайта.
     """
-    # Генерация "количества" некоторых главных объектов
-    num_books = Book.objects.count() # Метод all() применён по умолчанию
-    num_instances = BookInstance.objects.count()
-    # Доступные книги (статус = 'а')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()
-    num_genres = Genre.objects.count()
+    # Генерация "количества" некоторых главных объектов (catalog.pages)
+    with metrics.VIEW_SECTION.time(section='index-counts'):
+        counts = pages.index_counts()
     #num_books_with_word = Book.objects.filter(title__contains='war').count()  # Количество книг содержащих слово 'war'
 
 
@@ -34,19 +39,39 @@ def index(request):
     return render(
         request,
         'index.html',
-        context={'num_books': num_books,
-                 'num_instances': num_instances,
-                 'num_instances_available': num_instances_available,
-                 'num_authors': num_authors,
-                 'num_genres': num_genres,
+        context={**counts,
                  #'num_books_with_word': num_books_with_word,
                  'num_visits': num_visits},
     )
 
 
-class BookListView(generic.ListView):
+class BookListView(StreamingListMixin, generic.ListView):
     model = Book
     paginate_by = 4
+    row_template_name = 'catalog/rows/book.html'
+    row_context_name = 'book'
+
+    def get_queryset(self):
+        # Faceted filters from the query string (see catalog.facets).
+        self.selected_facets = facets.parse(self.request.GET)
+        # Only the columns of the row template (catalog.projections).
+        books = project(super().get_queryset(), BookRow)
+        if settings.BITMAP_INDEX:
+            # Filtered in memory, only the rows of the page are fetched.
+            bitmaps.index.ensure_current()
+            return bitmaps.BitmapBookList(bitmaps.index.match(self.selected_facets), books)
+        return facets.filter_books(books, self.selected_facets)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if settings.BITMAP_INDEX:
+            facet_counts = bitmaps.index.counts(self.selected_facets)
+            facet_counts.update(facets.counts(self.selected_facets, only=['author']))
+        else:
+            facet_counts = facets.counts(self.selected_facets)
+        context['facets'] = facets.options(self.selected_facets, facet_counts)
+        context['filter_query'] = facets.query_string(self.selected_facets)
+        return context
     # Можно использовать атрибуты для изменения поведения по умолчанию, например:
     # context_object_name = 'my_book_list'  # Ваше собственное имя переменной контекста в шаблоне
     # queryset = Book.objects.filter(title__icontains='war')[:5]  # Получение 5 книг, содержащих слово 'war' в заголовке
@@ -67,6 +92,16 @@ class BookListView(generic.ListView):
 class BookDetailView(generic.DetailView):
     model = Book
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Precomputed by `manage.py build_recommendations`.
+        context['also_borrowed'] = self.object.recommendations.select_related('recommended')
+        if settings.BOOK_PAGE_CACHE_TIMEOUT:
+            # Rendered once for all the requests until the book changes (catalog.pages).
+            context['book_detail'] = pages.book_detail(self.object, context['also_borrowed'],
+                                                       self.request.user.is_staff)
+        return context
+
     # 1 вариант - добавить атрибут, определяющий order_by()
     # queryset = Book.objects.filter('last_name')
     # 2 вариант - метод, определяющий order_by()
@@ -75,28 +110,36 @@ class BookDetailView(generic.DetailView):
     # Выбрал третий вариант с добавлением атрибута внутри Meta-класса Author
 
 
-class AuthorListView(generic.ListView):
+class AuthorListView(StreamingListMixin, generic.ListView):
     model = Author
     paginate_by = 10
+    row_template_name = 'catalog/rows/author.html'
+    row_context_name = 'author'
+
+    def get_queryset(self):
+        return project(super().get_queryset(), AuthorRow)
 
 
 class AuthorDetailView(generic.DetailView):
     model = Author
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, StreamingListMixin, generic.ListView):
     """
     Generic class-based view listing books on loan to current user.
     """
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    row_template_name = 'catalog/rows/bookinstance_borrowed_user.html'
+    row_context_name = 'bookinst'
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').select_related(
+            'book').annotate(overdue=loan_policy.policy.overdue()).order_by('due_back')
 
 
-class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
+class LoanedBooksAllListView(PermissionRequiredMixin, StreamingListMixin, generic.ListView):
     """
     Generic class-based view listing books on loan. Only visible to users with can_mark_returned permission.
     """
@@ -104,26 +147,112 @@ class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
     permission_required = 'catalog.can_mark_returned'
     template_name = 'catalog/bookinstance_list_borrowed_all.html'
     paginate_by = 10
+    row_template_name = 'catalog/rows/bookinstance_borrowed_all.html'
+    row_context_name = 'bookinst'
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        # The rows show the title and the borrower: joined rather than queried for each row.
+        return BookInstance.objects.filter(status__exact='o').select_related('book', 'borrower').annotate(
+            overdue=loan_policy.policy.overdue()).order_by('due_back')
+
+
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def loan_summary_report(request):
+    """
+    View function for the staff loan dashboard, reading only the LoanSummary aggregates.
+    """
+    # The counts by due date don't tell the copies apart: the grace days of the default period.
+    overdue_before = loan_policy.policy.default.overdue_before(datetime.date.today()).isoformat()
+    on_loan = LoanSummary.objects.filter(status__exact='o', count__gt=0)
+
+    genres = {}
+    for row in LoanSummary.objects.filter(dimension=LoanSummary.GENRE, count__gt=0):
+        genres.setdefault(row.label, {})[row.status] = row.count
+    availability_by_genre = [
+        {'genre': genre, 'available': counts.get('a', 0), 'on_loan': counts.get('o', 0), 'total': sum(counts.values())}
+        for genre, counts in sorted(genres.items())
+    ]
+
+    context = {
+        'top_borrowers': on_loan.filter(dimension=LoanSummary.BORROWER).order_by('-count', 'label')[:20],
+        'top_books': on_loan.filter(dimension=LoanSummary.BOOK).order_by('-count', 'label')[:20],
+        'overdue_by_day': on_loan.filter(dimension=LoanSummary.DUE_DATE, key__lt=overdue_before).order_by('key'),
+        'availability_by_genre': availability_by_genre,
+        'refresh_queued': 'refresh' in request.GET,
+    }
+    return render(request, 'catalog/loan_summary.html', context)
+
+
+@require_POST
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def loan_summary_refresh(request):
+    """
+    Queues a full recount of the loan summary (run by the task worker) and returns at once.
+    """
+    tasks.refresh_loan_summary.enqueue(full=True)
+    return HttpResponseRedirect(reverse('loan-summary') + '?refresh=queued')
+
 
+class _Echo:
+    """
+    File-like object returning what is written, to stream the lines of a csv.writer.
+    """
+
+    def write(self, value):
+        return value
 
 
+def _parse_month(value):
+    """
+    Returns the first moment of a month given as YYYY-MM, or None.
+    """
+    try:
+        month = datetime.datetime.strptime(value, '%Y-%m')
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(month)
+
 
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
+def circulation_report_csv(request):
+    """
+    View function streaming the circulation per title per month as CSV, optionally
+    limited to the months ?start=YYYY-MM up to (excluding) ?end=YYYY-MM.
+    """
+    start, end = _parse_month(request.GET.get('start')), _parse_month(request.GET.get('end'))
+    writer = csv.writer(_Echo())
+
+    def rows():
+        yield writer.writerow(['month', 'book_id', 'title', 'checkouts', 'renewals', 'returns'])
+        for row in loan_events.circulation_by_month(start=start, end=end):
+            yield writer.writerow([row['month'].strftime('%Y-%m'), row['book_id'], row['title'],
+                                   row['checkouts'], row['renewals'], row['returns']])
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="circulation.csv"'
+    return response
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+@primary_database
 def renew_book_librarystaff(request, pk):
     """
     View function for renewing a specific BookInstance by library staff.
     """
     book_instance = get_object_or_404(BookInstance, pk=pk)
+    period = loan_policy.policy.period_of(book_instance)
 
     # If this is a POST request then process the Form data
     if request.method == 'POST':
 
         # Create a form instance and populate it with data from the request (binding):
-        form = RenewBookForm(request.POST)
+        form = RenewBookForm(request.POST, period=period)
 
         # Check if the form is valid
         if form.is_valid():
@@ -136,8 +265,8 @@ def renew_book_librarystaff(request, pk):
 
     # If this is GET (or any other method) create the default form
     else:
-        proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
-        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date})
+        proposed_renewal_date = period.proposed_renewal(datetime.date.today())
+        form = RenewBookForm(initial={'renewal_date': proposed_renewal_date}, period=period)
 
     context = {
         'form': form,
@@ -147,37 +276,63 @@ def renew_book_librarystaff(request, pk):
     return render(request, 'catalog/book_renew_librarystaff.html', context)
 
 
-class AuthorCreate(PermissionRequiredMixin, CreateView):
+class AuthorCreate(PermissionRequiredMixin, PrimaryDatabaseMixin, CreateView):
     model = Author
-    fields = '__all__'
+    form_class = AuthorForm
     initial = {'date_of_death': '05/11/2021'}
     permission_required = 'catalog.can_mark_returned'
 
 
-class AuthorUpdate(PermissionRequiredMixin, UpdateView):
+class AuthorUpdate(PermissionRequiredMixin, PrimaryDatabaseMixin, UpdateView):
     model = Author
-    fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
+    form_class = AuthorForm
     permission_required = 'catalog.can_mark_returned'
 
 
-class AuthorDelete(PermissionRequiredMixin, DeleteView):
+class AuthorDelete(PermissionRequiredMixin, PrimaryDatabaseMixin, DeleteView):
     model = Author
     success_url = reverse_lazy('authors')
     permission_required = 'catalog.can_mark_returned'
 
-class BookCreate(PermissionRequiredMixin, CreateView):
+class BookCreate(PermissionRequiredMixin, PrimaryDatabaseMixin, CreateView):
     model = Book
-    fields = '__all__'
+    form_class = BookForm
     permission_required = 'catalog.can_mark_returned'
 
 
-class BookUpdate(PermissionRequiredMixin, UpdateView):
+class BookUpdate(PermissionRequiredMixin, PrimaryDatabaseMixin, UpdateView):
     model = Book
-    fields = '__all__'
+    form_class = BookForm
     permission_required = 'catalog.can_mark_returned'
 
 
-class BookDelete(PermissionRequiredMixin, DeleteView):
+class BookDelete(PermissionRequiredMixin, PrimaryDatabaseMixin, DeleteView):
     model = Book
     success_url = reverse_lazy('books')
-    permission_required = 'catalog.can_mark_returned'
\ No newline at end of file
+    permission_required = 'catalog.can_mark_returned'
+
+
+def autocomplete_lookup(request):
+    """
+    View function returning the books (?kind=book, default) or authors (?kind=author)
+    whose name starts with ?q=, as JSON: {"results": [{"id": ..., "text": ...}, ...]}.
+    """
+    kind = 'authors' if request.GET.get('kind') == 'author' else 'books'
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    results = autocomplete.index.search(kind, request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'id': pk, 'text': label} for pk, label in results]})
+
+
+def prometheus_metrics(request):
+    """
+    View function exposing the catalog metrics in the Prometheus text format, to the staff users
+    and the scrapers sending settings.METRICS_TOKEN.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (request.user.is_staff or token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.REGISTRY.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
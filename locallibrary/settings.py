@@ -47,13 +47,26 @@ INSTALLED_APPS = [
     'catalog.apps.CatalogConfig',
 ]
 
+# Processes serving no pages (run_worker, the maintenance commands) start faster without the
+# admin: DJANGO_ADMIN='' drops the app and its URLs.
+ADMIN_ENABLED = bool(os.environ.get('DJANGO_ADMIN', True))
+if not ADMIN_ENABLED:
+    INSTALLED_APPS.remove('django.contrib.admin')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.CompressionMiddleware',
+    'catalog.middleware.MetricsMiddleware',
+    'catalog.middleware.RequestProfilingMiddleware',
+    'catalog.middleware.ReplicaPinningMiddleware',
+    'catalog.middleware.LoanEventMiddleware',
+    'catalog.middleware.StaticPreloadMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalog.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,10 +155,168 @@ LOGIN_REDIRECT_URL = '/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Background tasks (catalog.taskqueue), run by `python manage.py run_worker`. With
+# DJANGO_QUEUED_EMAIL set, mail is queued by the views and delivered by the worker with
+# QUEUED_EMAIL_BACKEND. Periodic tasks: name -> dotted path of the task, period in seconds and
+# optional args/kwargs; a daily task runs once per day from midnight UTC on.
+QUEUED_EMAIL_BACKEND = EMAIL_BACKEND
+if os.environ.get('DJANGO_QUEUED_EMAIL'):
+    EMAIL_BACKEND = 'catalog.mail.QueuedEmailBackend'
+TASK_SCHEDULE = {
+    'build-recommendations': {'task': 'catalog.tasks.build_recommendations', 'every': 24 * 60 * 60},
+    # 'overdue-notices': {'task': 'catalog.tasks.send_overdue_notices', 'every': 24 * 60 * 60},
+}
+# Running tasks are presumed lost (their worker was killed) after TASK_TIMEOUT seconds, and
+# queued again; finished tasks are deleted after TASK_RESULT_TTL seconds.
+TASK_TIMEOUT = int(os.environ.get('DJANGO_TASK_TIMEOUT', 60 * 60))
+TASK_RESULT_TTL = int(os.environ.get('DJANGO_TASK_RESULT_TTL', 7 * 24 * 60 * 60))
+
 # Heroku: Update database configuration from $DATABASE_URL.
-db_from_env = dj_database_url.config(conn_max_age=500)
+db_from_env = dj_database_url.config(conn_max_age=int(os.environ.get('DJANGO_CONN_MAX_AGE', 500)))
 DATABASES['default'].update(db_from_env)
 
+# Read replicas: comma separated database URLs in $DJANGO_DATABASE_REPLICA_URLS. The
+# catalog.routers.ReplicaRouter sends catalog reads to them, all writes go to 'default'.
+DATABASE_REPLICA_URLS = [url for url in os.environ.get('DJANGO_DATABASE_REPLICA_URLS', '').split(',') if url]
+DATABASE_REPLICAS = []
+for replica_number, replica_url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    replica = dj_database_url.parse(replica_url, conn_max_age=DATABASES['default'].get('CONN_MAX_AGE', 0))
+    # Tests read the replicas through the test database of 'default'.
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{replica_number}'] = replica
+    DATABASE_REPLICAS.append(f'replica_{replica_number}')
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+# Seconds during which a client reads from the primary after a write (read-your-writes).
+REPLICA_STICKY_SECONDS = int(os.environ.get('DJANGO_REPLICA_STICKY_SECONDS', 15))
+
+# The catalog backends (catalog.backends) extend the Django ones with:
+# - CONN_HEALTH_CHECKS: persistent connections are checked before being reused by a request;
+# - POOL: an in-process connection pool shared by the threads of a worker (MAX_SIZE 0 disables it).
+#   With the pool, set DJANGO_CONN_MAX_AGE=0 so connections go back to the pool after each request;
+# - pgbouncer in transaction pooling mode: server-side cursors (QuerySet.iterator()) are disabled.
+for database in DATABASES.values():
+    database['ENGINE'] = {
+        'django.db.backends.sqlite3': 'catalog.backends.sqlite3',
+        'django.db.backends.postgresql': 'catalog.backends.postgresql',
+        'django.db.backends.postgresql_psycopg2': 'catalog.backends.postgresql',
+    }.get(database['ENGINE'], database['ENGINE'])
+    database['CONN_HEALTH_CHECKS'] = bool(os.environ.get('DJANGO_CONN_HEALTH_CHECKS', True))
+    database['POOL'] = {
+        'MAX_SIZE': int(os.environ.get('DJANGO_DATABASE_POOL_SIZE', 0)),
+        'TIMEOUT': float(os.environ.get('DJANGO_DATABASE_POOL_TIMEOUT', 30)),
+    }
+    if os.environ.get('DJANGO_PGBOUNCER_TRANSACTION_MODE'):
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    # SQLite production profile for concurrent gunicorn workers, enabled by $DJANGO_SQLITE_TUNING:
+    # WAL journal, relaxed fsync, memory-mapped reads, a 64MB page cache, waiting up to 5s for
+    # the write lock and taking it at the start of atomic blocks (BEGIN IMMEDIATE).
+    if database['ENGINE'] == 'catalog.backends.sqlite3' and os.environ.get('DJANGO_SQLITE_TUNING'):
+        database['PRAGMAS'] = {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        }
+        database['TRANSACTION_MODE'] = 'IMMEDIATE'
+
 # Simplified static file serving.
 # https://warehouse.python.org/project/whitenoise/
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
\ No newline at end of file
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic fingerprints the files (served by whitenoise with "Cache-Control: immutable"
+# and a 10 years max-age) and writes .gz and, with the Brotli package installed, .br copies.
+# Stylesheets announced to the browser by catalog.middleware.StaticPreloadMiddleware:
+STATIC_PRELOAD = [
+    ('vendor/bootstrap/css/bootstrap.min.css', 'style'),
+    ('css/styles.css', 'style'),
+]
+
+# Compression of the responses (catalog.middleware.CompressionMiddleware): Brotli or gzip, for the
+# text responses of at least COMPRESSION_MIN_LENGTH bytes and the streamed ones. The CSRF tokens
+# in the pages are masked differently in every response, so compression doesn't reveal them (BREACH).
+RESPONSE_COMPRESSION = bool(os.environ.get('DJANGO_RESPONSE_COMPRESSION', True))
+COMPRESSION_MIN_LENGTH = int(os.environ.get('DJANGO_COMPRESSION_MIN_LENGTH', 1024))
+
+# Streamed rendering of the list pages (catalog.streaming): the top of the page is sent before the
+# rows are read. Disabled by default: errors while rendering the rows truncate the page.
+STREAMING_LISTS = bool(os.environ.get('DJANGO_STREAMING_LISTS', False))
+
+# Seconds the main part of the book pages and the counts of the home page are cached
+# (catalog.pages), 0 disables the cache. Fill them after a deploy with `manage.py warm_cache`.
+BOOK_PAGE_CACHE_TIMEOUT = int(os.environ.get('DJANGO_BOOK_PAGE_CACHE_TIMEOUT', 0))
+INDEX_COUNTS_CACHE_TIMEOUT = int(os.environ.get('DJANGO_INDEX_COUNTS_CACHE_TIMEOUT', 0))
+
+# Rate limits of the expensive pages (catalog.middleware.RateLimitMiddleware), disabled by default:
+# URL name pattern -> (requests per second, burst), per user or per IP address. Counted in the
+# default cache: set CACHES to a cache shared by the workers (memcached, redis) to limit across
+# them. DJANGO_RATE_LIMIT_PROXIES is the number of proxies in front of the site adding the
+# client address to X-Forwarded-For (1 on Heroku).
+RATE_LIMIT = bool(os.environ.get('DJANGO_RATE_LIMIT', False))
+RATE_LIMITS = {
+    'books': (2, 20),
+    'my-borrowed': (1, 10),
+    'all-borrowed': (1, 10),
+    'admin:*_changelist': (1, 10),
+}
+RATE_LIMIT_PROXIES = int(os.environ.get('DJANGO_RATE_LIMIT_PROXIES', 0))
+
+# Request profiling (catalog.middleware.RequestProfilingMiddleware), disabled by default.
+# Sampled requests get a Server-Timing header and a JSON line in the 'catalog.profiling' log;
+# requests slower than the cProfile threshold (ms, 0 disables cProfile) are dumped to the dump dir.
+REQUEST_PROFILING = bool(os.environ.get('DJANGO_REQUEST_PROFILING', False))
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_REQUEST_PROFILING_SAMPLE_RATE', 1.0))
+REQUEST_PROFILING_CPROFILE_THRESHOLD_MS = float(os.environ.get('DJANGO_REQUEST_PROFILING_CPROFILE_THRESHOLD_MS', 0))
+REQUEST_PROFILING_DUMP_DIR = os.environ.get('DJANGO_REQUEST_PROFILING_DUMP_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Metrics exported on /metrics (catalog.metrics), to the staff users and to the scrapers sending
+# DJANGO_METRICS_TOKEN as a bearer token. With several gunicorn workers set DJANGO_METRICS_DIR to
+# a directory shared by the workers so the samples of all workers are summed up.
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('DJANGO_METRICS_FLUSH_INTERVAL', 1.0))
+
+# Slow query log (catalog.slow_queries), disabled while the threshold is 0.
+# Report with `python manage.py slow_queries`.
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('DJANGO_SLOW_QUERY_THRESHOLD_MS', 0))
+SLOW_QUERY_LOG = os.environ.get('DJANGO_SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.jsonl'))
+SLOW_QUERY_EXPLAIN = bool(os.environ.get('DJANGO_SLOW_QUERY_EXPLAIN', True))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'catalog': {
+            'handlers': ['console'],
+            'level': os.environ.get('DJANGO_CATALOG_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+# Time-ordered (version 7) UUIDs for the new book copies (catalog.ids): inserts append to the end
+# of the primary key index instead of random places. The ids then reveal when a copy was added.
+ORDERED_UUIDS = bool(os.environ.get('DJANGO_ORDERED_UUIDS', False))
+
+# Number of authors listed in the author facet of the book list (catalog.facets): those of the
+# most books, besides the selected ones.
+FACET_AUTHOR_LIMIT = int(os.environ.get('DJANGO_FACET_AUTHOR_LIMIT', 20))
+
+# In-memory bitmap index of the books per genre, language and availability (catalog.bitmaps),
+# answering the faceted filters of the book list. Costs about (highest book id / 8) bytes per
+# genre and language in every process.
+BITMAP_INDEX = bool(os.environ.get('DJANGO_BITMAP_INDEX', False))
+
+# Loan policy (catalog.loan_policy): the periods of a loan in days (the renewal proposed, the
+# longest renewal, the delay before a copy is overdue), and rules overriding them for the books
+# of some genres or languages, or the borrowers of some groups, by name. The first rule matching
+# a copy applies, e.g. {'genre': ['Reference'], 'renewal_days': 7, 'max_renewal_days': 7} or
+# {'group': 'Staff', 'max_renewal_days': 56}.
+LOAN_POLICY = {
+    'default': {'renewal_days': 21, 'max_renewal_days': 28, 'grace_days': 0},
+    'rules': [],
+}
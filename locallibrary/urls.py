@@ -13,22 +13,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path
 from django.urls import include
 from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
+from catalog.lazyviews import LazyView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     # Используйте inclide() чтобы добавлять URL из каталога приложения
     path('catalog/', include('catalog.urls')),
     path('', RedirectView.as_view(url='/catalog/', permanent=True)),
+    path('metrics', LazyView('catalog.views.prometheus_metrics'), name='metrics'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 # Используйте static() чтобы добавить соотношения для статических файлов
 # Только на период разработки
 
+# Not loaded by the worker processes (settings.ADMIN_ENABLED).
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
 
 # Add Django site authentication url (for login, logout, password managment)
 urlpatterns += [
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_wsgi_application()
+
+# Import the views now rather than on their first request (catalog.lazyviews): with
+# gunicorn --preload this runs once in the master process, and the forked workers share the code.
+from catalog.lazyviews import load_all  # noqa: E402
+
+load_all()